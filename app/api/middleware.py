@@ -0,0 +1,97 @@
+import json
+from starlette.exceptions import HTTPException
+from app.core.tracing import start_trace
+
+class BodySizeLimitMiddleware:
+    """Reject request bodies over a byte budget while they stream in.
+
+    Requests that declare a too-large Content-Length are refused before any
+    body is read; chunked uploads are cut off as soon as they cross the limit,
+    so multipart parsing never spools an oversized file.
+    """
+
+    def __init__(self, app, max_body_bytes: int):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_body_bytes:
+            await self._reject(send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    # Raised inside body parsing; FastAPI re-raises HTTPException untouched
+                    raise HTTPException(status_code=413, detail=self._detail())
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    def _detail(self) -> str:
+        return f"Request body exceeds {self.max_body_bytes} bytes"
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": self._detail()}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+class TracingMiddleware:
+    """Trace requests under path_prefix: Server-Timing, X-Token-Usage (and X-Single-Flight) headers plus one JSON log line each.
+
+    Stages are recorded by app.core.tracing.stage() calls inside the pipeline;
+    the header is built when the response starts, after get_answer has returned.
+    """
+
+    def __init__(self, app, path_prefix: str = "/api"):
+        self.app = app
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        trace = start_trace(headers.get(b"x-request-id", b"").decode("latin-1") or None)
+        status = None
+
+        async def traced_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", trace.server_timing().encode("latin-1")),
+                    (b"x-request-id", trace.request_id.encode("latin-1")),
+                ]
+                if trace.usage:
+                    message["headers"].append((b"x-token-usage", trace.usage_header().encode("latin-1")))
+                if trace.attrs.get("coalesced"):
+                    # Answered by an identical request's pipeline run (app/core/singleflight.py)
+                    message["headers"].append((b"x-single-flight", b"joined"))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, traced_send)
+        finally:
+            trace.log(method=scope["method"], path=scope["path"], status=status)
@@ -1,63 +1,136 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
+from contextvars import copy_context
 from typing import Optional, Dict, Any
-import base64
+from app.core.images import ImageRejected, decode_image_base64, read_image_upload
 from app.core.rag import RAGEngine
-from app.core.gemini import GeminiProcessor
+from app.core.registry import CorpusLoadError, CorpusRegistry, UnknownCorpus
+from app.core.singleflight import SingleFlight, question_key
+from app.core.tracing import current_trace
 from app.models.schemas import QuestionResponse, QuestionRequest
 
 router = APIRouter()
-rag_engine = RAGEngine()
-gemini_processor = GeminiProcessor()
+
+def get_registry(request: Request) -> CorpusRegistry:
+    """Return the corpus registry, or 503 while the default engine is still loading."""
+    state = request.app.state.engine_state
+    if not state.ready:
+        raise HTTPException(
+            status_code=503,
+            detail=f"RAG engine not ready ({state.status})",
+            headers={"Retry-After": "5"},
+        )
+    return state.registry
+
+def get_flights(request: Request) -> SingleFlight:
+    return request.app.state.engine_state.flights
+
+async def select_engine(registry: CorpusRegistry, corpus: Optional[str]) -> RAGEngine:
+    """The engine for the requested corpus (default if None); the first request to a corpus loads it."""
+    trace = current_trace()
+    if trace is not None and corpus:
+        trace.attrs["corpus"] = corpus
+    try:
+        return await run_in_threadpool(registry.get, corpus)
+    except UnknownCorpus:
+        raise HTTPException(status_code=404, detail=f"Unknown corpus {corpus!r}")
+    except CorpusLoadError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+
+async def answer(flights: SingleFlight, rag_engine: RAGEngine, question: str, image_bytes: Optional[bytes]) -> Dict[str, Any]:
+    async def run() -> Dict[str, Any]:
+        # Get answer using RAG; the pipeline blocks on upstream calls, so keep it off the event loop
+        # (copy_context carries the request trace into the worker thread)
+        answer, links = await run_in_threadpool(copy_context().run, rag_engine.get_answer, question, image_bytes)
+
+        return {
+            "answer": answer,
+            "links": links
+        }
+
+    try:
+        # Concurrent identical questions to the same corpus wait for the first one's answer (or error)
+        result, shared = await flights.do((id(rag_engine),) + question_key(question, image_bytes), run)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    trace = current_trace()
+    if shared and trace is not None:
+        trace.attrs["coalesced"] = True
+    return result
+
+async def answer_upload(registry: CorpusRegistry, flights: SingleFlight, corpus: Optional[str], question: str,
+                        image: Optional[UploadFile]) -> Dict[str, Any]:
+    # Stream the upload in chunks and reject oversized or non-image files before any processing
+    image_bytes = None
+    if image:
+        try:
+            image_bytes = await read_image_upload(image)
+        except ImageRejected as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e))
+    return await answer(flights, await select_engine(registry, corpus), question, image_bytes)
+
+async def answer_json(registry: CorpusRegistry, flights: SingleFlight, corpus: Optional[str], request: QuestionRequest) -> Dict[str, Any]:
+    # Base64 is decoded exactly once, here at the JSON boundary
+    try:
+        image_bytes = decode_image_base64(request.image)
+    except ImageRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return await answer(flights, await select_engine(registry, corpus), request.question, image_bytes)
 
 @router.post("/", response_model=QuestionResponse)
 async def answer_question(
     question: str = Form(...),
-    image: Optional[UploadFile] = File(None)
+    image: Optional[UploadFile] = File(None),
+    corpus: Optional[str] = Form(None),
+    registry: CorpusRegistry = Depends(get_registry),
+    flights: SingleFlight = Depends(get_flights)
 ) -> Dict[str, Any]:
     """
     Answer a student's question using RAG and Gemini.
-    
+
     Args:
         question: The student's question
         image: Optional image attachment
-    
+        corpus: Optional corpus name (default corpus if omitted)
+
     Returns:
         Dict containing answer and relevant links
     """
-    try:
-        # Process image if provided
-        image_base64 = None
-        if image:
-            contents = await image.read()
-            image_base64 = base64.b64encode(contents).decode()
-        
-        # Get answer using RAG
-        answer, links = rag_engine.get_answer(question, image_base64)
-        
-        return {
-            "answer": answer,
-            "links": links
-        }
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await answer_upload(registry, flights, corpus, question, image)
 
 @router.post("/json/", response_model=QuestionResponse)
-async def answer_question_json(request: QuestionRequest) -> Dict[str, Any]:
+async def answer_question_json(
+    request: QuestionRequest,
+    registry: CorpusRegistry = Depends(get_registry),
+    flights: SingleFlight = Depends(get_flights)
+) -> Dict[str, Any]:
     """
     Answer a student's question using RAG and Gemini (JSON endpoint).
     Args:
-        request: QuestionRequest with question and optional image (base64 or file path)
+        request: QuestionRequest with question, optional base64 image (plain or data URL) and optional corpus
     Returns:
         Dict containing answer and relevant links
     """
-    try:
-        question = request.question
-        image_base64 = request.image
-        answer, links = rag_engine.get_answer(question, image_base64)
-        return {
-            "answer": answer,
-            "links": links
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+    return await answer_json(registry, flights, request.corpus, request)
+
+# Corpus in the path, e.g. /api/c/tds/2025-01/json/ (registered before the upload route, whose path would also match)
+@router.post("/c/{corpus:path}/json/", response_model=QuestionResponse)
+async def answer_corpus_question_json(
+    corpus: str,
+    request: QuestionRequest,
+    registry: CorpusRegistry = Depends(get_registry),
+    flights: SingleFlight = Depends(get_flights)
+) -> Dict[str, Any]:
+    """JSON endpoint for one corpus; the path wins over a corpus field in the body."""
+    return await answer_json(registry, flights, corpus, request)
+
+@router.post("/c/{corpus:path}/", response_model=QuestionResponse)
+async def answer_corpus_question(
+    corpus: str,
+    question: str = Form(...),
+    image: Optional[UploadFile] = File(None),
+    registry: CorpusRegistry = Depends(get_registry),
+    flights: SingleFlight = Depends(get_flights)
+) -> Dict[str, Any]:
+    """Multipart endpoint for one corpus."""
+    return await answer_upload(registry, flights, corpus, question, image)
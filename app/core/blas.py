@@ -0,0 +1,48 @@
+"""
+Explicit BLAS thread counts.
+
+OpenBLAS/MKL size their thread pools from environment variables read when
+numpy is first imported. With several web workers, each also running a
+sharded search pool, the defaults (one BLAS thread per core in every
+process) oversubscribe the CPU. configure_blas() sets the variables and,
+when threadpoolctl is installed, also resizes pools that are already loaded.
+"""
+import os
+import sys
+from typing import Optional
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:  # optional: without it the cap only applies if numpy is imported afterwards
+    threadpool_limits = None
+
+BLAS_ENV_VARS = ("OPENBLAS_NUM_THREADS", "OMP_NUM_THREADS", "MKL_NUM_THREADS", "BLIS_NUM_THREADS",
+                 "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+def default_blas_threads(workers: int = 1, search_threads: int = 1) -> int:
+    """Cores left per BLAS call once every worker's search threads are busy."""
+    return max(1, (os.cpu_count() or 1) // max(1, workers * search_threads))
+
+def search_threads() -> int:
+    """Threads of the sharded search pool ($SEARCH_THREADS, default one per core)."""
+    return max(1, int(os.environ.get("SEARCH_THREADS") or os.cpu_count() or 1))
+
+def configure_blas(threads: Optional[int] = None) -> Optional[int]:
+    """Cap BLAS at `threads` (default $BLAS_THREADS; 1 for RETRIEVAL_MODE=sharded); None if left alone."""
+    if threads is None:
+        if os.environ.get("BLAS_THREADS"):
+            threads = int(os.environ["BLAS_THREADS"])
+        elif os.environ.get("RETRIEVAL_MODE") == "sharded":
+            threads = 1  # the shard pool provides the parallelism
+        else:
+            return None
+    # Already set before numpy was loaded (e.g. by app.serve in the master)
+    unchanged = all(os.environ.get(name) == str(threads) for name in BLAS_ENV_VARS)
+    for name in BLAS_ENV_VARS:
+        os.environ[name] = str(threads)
+    if threadpool_limits is not None:
+        threadpool_limits(threads)
+    elif "numpy" in sys.modules and not unchanged:
+        print(f"Warning: numpy is already imported and threadpoolctl is not installed; "
+              f"BLAS_THREADS={threads} only applies to new processes")
+    return threads
@@ -0,0 +1,123 @@
+"""
+Record/replay of upstream calls (embeddings, vision, generation).
+
+A cassette is a JSON-lines file (gzipped when the name ends in .gz), one
+entry per distinct request:
+
+    {"key": "embed:3f2a...", "kind": "embed", "request": {...}, "response": {...}, "elapsed_ms": 184.2}
+
+The key is a hash of the full request (model, text or prompt, image bytes),
+so the same inputs always get the same response back. Arrays such as
+embedding vectors are stored as base64 of their raw bytes, which keeps files
+small and replays them bit for bit.
+
+- record: call upstream, append entries for requests not on the cassette yet
+- replay: answer from the cassette only; a request that was not recorded raises
+  CassetteMiss. With latency > 0 each replay sleeps for the recorded time
+  multiplied by it (1.0 emulates the original latency).
+
+GeminiProcessor picks this up from UPSTREAM_CASSETTE, UPSTREAM_CASSETTE_MODE
+(default replay) and UPSTREAM_CASSETTE_LATENCY (default 0).
+"""
+import base64
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+import numpy as np
+
+MODES = ("record", "replay")
+
+class CassetteMiss(KeyError):
+    """Replay was asked for a request that is not on the cassette."""
+
+def encode(value):
+    """JSON-ready copy of a response; numpy arrays become base64 of their bytes."""
+    if isinstance(value, np.ndarray):
+        return {"__ndarray__": base64.b64encode(np.ascontiguousarray(value).tobytes()).decode("ascii"),
+                "dtype": value.dtype.str, "shape": list(value.shape)}
+    if isinstance(value, dict):
+        return {k: encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode(v) for v in value]
+    return value
+
+def decode(value):
+    if isinstance(value, dict):
+        if "__ndarray__" in value:
+            data = base64.b64decode(value["__ndarray__"])
+            return np.frombuffer(data, dtype=np.dtype(value["dtype"])).reshape(value["shape"]).copy()
+        return {k: decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [decode(v) for v in value]
+    return value
+
+def request_key(kind: str, request: dict) -> str:
+    canonical = json.dumps(request, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return f"{kind}:{hashlib.sha256(canonical).hexdigest()[:32]}"
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+class Cassette:
+    def __init__(self, path: str, mode: str = "replay", latency: float = 0.0):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode {mode!r}; choose from {MODES}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.entries: Dict[str, dict] = {}
+        self.hits = 0
+        self.recorded = 0
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            with _open(path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries.setdefault(entry["key"], entry)
+        elif mode == "replay":
+            raise FileNotFoundError(f"No cassette at {path}; record one with UPSTREAM_CASSETTE_MODE=record")
+
+    @classmethod
+    def from_env(cls) -> Optional["Cassette"]:
+        path = os.environ.get("UPSTREAM_CASSETTE")
+        if not path:
+            return None
+        return cls(path, os.environ.get("UPSTREAM_CASSETTE_MODE", "replay"),
+                   float(os.environ.get("UPSTREAM_CASSETTE_LATENCY", "0")))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def call(self, kind: str, request: dict, live: Callable[[], dict]) -> dict:
+        """The response for request: from the cassette in replay mode, from live() (and recorded) otherwise."""
+        key = request_key(kind, request)
+        if self.mode == "replay":
+            entry = self.entries.get(key)
+            if entry is None:
+                raise CassetteMiss(f"{kind} request not on cassette {self.path} ({key})")
+            if self.latency:
+                time.sleep(entry["elapsed_ms"] * self.latency / 1000.0)
+            with self.lock:
+                self.hits += 1
+            return decode(entry["response"])
+
+        started = time.perf_counter()
+        response = live()
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        with self.lock:
+            if key not in self.entries:
+                entry = {"key": key, "kind": kind, "request": request, "response": encode(response),
+                         "elapsed_ms": round(elapsed_ms, 2)}
+                self.entries[key] = entry
+                # One appended line per entry, so a crash loses at most the call in flight
+                with _open(self.path, "a") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                self.recorded += 1
+        return response
@@ -0,0 +1,145 @@
+"""
+Row metadata as a few numpy arrays instead of a DataFrame.
+
+A <name>_metadata.csv (or _texts.csv) becomes a ColumnStore: columns whose
+values are all integers are int64 arrays, every other column is int32 codes
+into one string table shared by the whole file. Repeated values (section,
+filename, url) are stored once, and the strings live in a single UTF-8
+buffer with offsets, so there is no Python object per cell for the garbage
+collector or for copy-on-write after fork to touch. Empty cells read as None.
+
+The store is saved as .npz under the snapshot's .serving/ directory, next to
+the normalized vectors, so serving processes load it without parsing CSV or
+importing pandas.
+"""
+import csv
+import os
+from typing import Dict, Iterable, List, Optional, Union
+import numpy as np
+
+Value = Union[int, str, None]
+
+# Forum threads and course pages can exceed csv's default 128KiB per field
+csv.field_size_limit(2**31 - 1)
+
+class StringTable:
+    """Distinct strings packed into one UTF-8 buffer; string i is blob[offsets[i]:offsets[i + 1]]."""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, strings: List[str]) -> "StringTable":
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, code: int) -> str:
+        return self.blob[self.offsets[code]:self.offsets[code + 1]].tobytes().decode("utf-8")
+
+    @property
+    def nbytes(self) -> int:
+        return self.blob.nbytes + self.offsets.nbytes
+
+class ColumnStore:
+    """Read-only table: int64 columns and int32 string-code columns (-1 for an empty cell)."""
+
+    def __init__(self, columns: Dict[str, np.ndarray], strings: StringTable, rows: int):
+        self.data = columns
+        self.strings = strings
+        self.rows = rows
+
+    @classmethod
+    def empty(cls) -> "ColumnStore":
+        return cls({}, StringTable.build([]), 0)
+
+    @classmethod
+    def from_records(cls, header: List[str], records: Iterable[List[str]]) -> "ColumnStore":
+        cells: List[List[str]] = [[] for _ in header]
+        for record in records:
+            if not record:
+                continue  # blank line
+            for column, value in zip(cells, record + [""] * (len(header) - len(record))):
+                column.append(value)
+        interned: Dict[str, int] = {}
+        columns = {}
+        for name, values in zip(header, cells):
+            try:
+                columns[name] = np.array([int(v) for v in values], dtype=np.int64)
+            except ValueError:
+                columns[name] = np.array([interned.setdefault(v, len(interned)) if v else -1 for v in values], dtype=np.int32)
+        return cls(columns, StringTable.build(list(interned)), len(cells[0]) if cells else 0)
+
+    @classmethod
+    def read_csv(cls, path: str) -> "ColumnStore":
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            return cls.from_records(header, reader)
+
+    def save(self, path: str) -> None:
+        arrays = {f"column:{name}": values for name, values in self.data.items()}
+        # Column order is kept by the names array; npz members come back in any order
+        np.savez(path, names=np.array(list(self.data), dtype=str), rows=np.array(self.rows),
+                 blob=self.strings.blob, offsets=self.strings.offsets, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "ColumnStore":
+        with np.load(path, allow_pickle=False) as npz:
+            columns = {str(name): npz[f"column:{name}"] for name in npz["names"]}
+            return cls(columns, StringTable(npz["blob"], npz["offsets"]), int(npz["rows"]))
+
+    def __len__(self) -> int:
+        return self.rows
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.data)
+
+    def __contains__(self, column: str) -> bool:
+        return column in self.data
+
+    def _value(self, values: np.ndarray, row: int) -> Value:
+        value = int(values[row])
+        if values.dtype == np.int64:
+            return value
+        return self.strings[value] if value >= 0 else None
+
+    def get(self, row: int, column: str, default: Value = None) -> Value:
+        """One cell; default if the file has no such column."""
+        values = self.data.get(column)
+        return default if values is None else self._value(values, row)
+
+    def row(self, row: int) -> Dict[str, Value]:
+        return {name: self._value(values, row) for name, values in self.data.items()}
+
+    def values(self, column: str) -> List[Value]:
+        """A whole column as Python values (for offline tools; serving reads single cells)."""
+        values = self.data[column]
+        return [self._value(values, row) for row in range(self.rows)]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(values.nbytes for values in self.data.values()) + self.strings.nbytes
+
+def prepare_columns(csv_path: str, target: str) -> ColumnStore:
+    """The ColumnStore for csv_path, cached at target (rebuilt when the CSV is newer)."""
+    try:
+        if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(csv_path):
+            return ColumnStore.load(target)
+    except (OSError, ValueError, KeyError):
+        pass  # unreadable cache: rebuild it
+    store = ColumnStore.read_csv(csv_path)
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f"{target}.{os.getpid()}.tmp.npz"
+        store.save(tmp)
+        os.replace(tmp, target)
+    except OSError:
+        pass  # read-only checkout: parse the CSV on every start
+    return store
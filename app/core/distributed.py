@@ -0,0 +1,113 @@
+"""
+Scatter-gather search over shard servers (app/shard.py).
+
+With RETRIEVAL_MODE=distributed the engine keeps only the row metadata and
+sends every query to all of RETRIEVAL_SHARDS (comma-separated base URLs) at
+once. Results that arrive within RETRIEVAL_SHARD_TIMEOUT_MS (default 250) are
+merged by score. A shard that is slow, down or serving a different snapshot
+(its row count does not match the metadata) is left out, and the answer is
+built from the others; the request trace lists the shards that were missing
+under "degraded_shards".
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import requests
+from app.core.search import merge_top_k
+from app.core.tracing import current_trace
+
+DEFAULT_TIMEOUT_MS = 250.0
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def fanout_pool() -> ThreadPoolExecutor:
+    """Threads that wait on shard responses; created on first use (after any fork)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=int(os.environ.get("RETRIEVAL_FANOUT_THREADS", "32")),
+                                       thread_name_prefix="shard-fanout")
+        return _pool
+
+def shard_urls_from_env() -> List[str]:
+    urls = [url.strip().rstrip("/") for url in os.environ.get("RETRIEVAL_SHARDS", "").split(",") if url.strip()]
+    if not urls:
+        raise ValueError("RETRIEVAL_MODE=distributed needs RETRIEVAL_SHARDS (comma-separated shard server URLs)")
+    return urls
+
+class DistributedIndex:
+    """Search one corpus across shard servers; same search() contract as the local indexes."""
+
+    mode = "distributed"
+
+    def __init__(self, corpus: str, rows: int, urls: List[str], timeout_ms: float = DEFAULT_TIMEOUT_MS,
+                 session: Optional[requests.Session] = None):
+        self.corpus = corpus
+        self.rows = rows
+        self.urls = urls
+        self.timeout = timeout_ms / 1000.0
+        self.session = session or requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=len(urls), pool_maxsize=32)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def __len__(self) -> int:
+        return self.rows
+
+    @property
+    def nbytes(self) -> int:
+        return 0  # vectors live on the shard servers
+
+    def _query_shard(self, url: str, payload: dict) -> Tuple[np.ndarray, np.ndarray]:
+        response = self.session.post(f"{url}/search", json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        body = response.json()
+        if body["total_rows"] != self.rows:
+            raise ValueError(f"shard has {body['total_rows']} {self.corpus} rows, metadata has {self.rows}")
+        return np.asarray(body["indices"], dtype=np.int64), np.asarray(body["scores"], dtype=np.float32)
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        from app.shard import encode_query
+
+        payload = {"corpus": self.corpus, "query": encode_query(query), "k": k}
+        futures = {fanout_pool().submit(self._query_shard, url, payload): url for url in self.urls}
+        done, late = wait(futures, timeout=self.timeout)
+        parts = []
+        missing: Dict[str, str] = {}
+        for future in done:
+            try:
+                parts.append(future.result())
+            except Exception as e:
+                missing[futures[future]] = f"{type(e).__name__}: {e}"[:200]
+        for future in late:
+            future.cancel()
+            missing[futures[future]] = "deadline exceeded"
+        if missing:
+            self._record_degraded(missing)
+        return merge_top_k(parts, k)
+
+    def search_batch(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        results = [self.search(query, k) for query in queries]
+        width = min(len(indices) for indices, _ in results) if results else 0
+        return (np.stack([indices[:width] for indices, _ in results]),
+                np.stack([scores[:width] for _, scores in results]))
+
+    def _record_degraded(self, missing: Dict[str, str]) -> None:
+        trace = current_trace()
+        if trace is not None:
+            trace.attrs.setdefault("degraded_shards", []).extend(
+                {"corpus": self.corpus, "shard": url, "error": error} for url, error in missing.items())
+        else:
+            for url, error in missing.items():
+                print(f"Warning: {self.corpus} shard {url} left out: {error}")
+
+    def warmup(self) -> None:
+        """Open a connection to every shard."""
+        for url in self.urls:
+            try:
+                self.session.get(f"{url}/healthz", timeout=5)
+            except requests.RequestException as e:
+                print(f"Warning: shard {url} warmup failed: {e}")
@@ -1,61 +1,148 @@
-import google.generativeai as genai
-from google.generativeai import types
-from typing import Optional, Tuple
+from typing import Optional, Tuple, Union
 import os
-from PIL import Image
 import io
-import base64
 import numpy as np
+import hashlib
+import threading
 import requests
+from app.core.cassette import Cassette
+from app.core.tracing import record_usage, stage
+
+EMBEDDING_ENDPOINT = "https://aiproxy.sanand.workers.dev/openai/v1/embeddings"
+EMBEDDING_MODEL = "text-embedding-3-small"
+GENERATION_MODEL = "models/gemini-2.0-flash"
+VISION_MODEL = "models/gemini-1.5-flash"
+VISION_PROMPT = "Describe this image in detail, focusing on any text, diagrams, or technical content that might be relevant for a data science course."
+
+def generation_result(response) -> dict:
+    """Text and token counts of a generate_content response (usage_metadata may be missing)."""
+    usage = getattr(response, "usage_metadata", None)
+    return {
+        "text": response.text,
+        "input_tokens": getattr(usage, "prompt_token_count", 0) or 0,
+        "output_tokens": getattr(usage, "candidates_token_count", 0) or 0,
+    }
+
+def preload_sdks() -> None:
+    """Import the Gemini SDK and PIL now rather than on the first request that needs them.
+
+    They are imported lazily because together they take most of the app's
+    import time and memory (and a replayed cassette never needs them); app.serve
+    calls this in the master so forked workers share the imported modules.
+    """
+    import google.generativeai  # noqa: F401
+    import PIL.Image  # noqa: F401
 
 class GeminiProcessor:
     def __init__(self):
+        # Recorded upstream calls to replay (or to record into), see app/core/cassette.py
+        self.cassette = Cassette.from_env()
         # Load Gemini API key from environment variable
         self.api_key = os.environ.get("GEMINI_API_KEY")  # Set GEMINI_API_KEY in your .env or environment
         if not self.api_key:
-            raise ValueError("GEMINI_API_KEY environment variable not set.")
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
-        self.vision_model = genai.GenerativeModel('gemini-1.5-flash')
-        # If you want vision, use the correct vision model name if available, or remove if not needed
+            if self.cassette is None or self.cassette.mode != "replay":
+                raise ValueError("GEMINI_API_KEY environment variable not set.")
+            self.api_key = "replay"  # never sent: every call is answered by the cassette
+        # Optional alternate endpoints, e.g. the local stand-ins started by bench/loadtest.py
+        self.embedding_endpoint = os.environ.get("EMBEDDING_ENDPOINT", EMBEDDING_ENDPOINT)
+        self.gemini_endpoint = os.environ.get("GEMINI_API_ENDPOINT")
+        # Gemini clients are built on first use (see preload_sdks)
+        self._models = None
+        self._models_lock = threading.Lock()
+        # Pooled session so embedding calls reuse the TLS connection to the proxy
+        self.session = requests.Session()
+    
+    def _gemini_models(self):
+        """(text model, vision model), importing and configuring the SDK the first time."""
+        with self._models_lock:
+            if self._models is None:
+                import google.generativeai as genai
+                if self.gemini_endpoint:
+                    # REST transport so a plain http:// endpoint works
+                    genai.configure(api_key=self.api_key, transport="rest", client_options={"api_endpoint": self.gemini_endpoint})
+                else:
+                    genai.configure(api_key=self.api_key)
+                self._models = (genai.GenerativeModel(GENERATION_MODEL), genai.GenerativeModel(VISION_MODEL))
+            return self._models
+    
+    @property
+    def model(self):
+        return self._gemini_models()[0]
+    
+    @property
+    def vision_model(self):
+        return self._gemini_models()[1]
+    
+    def prepare(self) -> None:
+        """Import the SDK and build the Gemini clients now (nothing to do when replaying a cassette)."""
+        if self.cassette is None or self.cassette.mode != "replay":
+            self._gemini_models()
+    
+    def warmup(self) -> None:
+        """Open a pooled connection to the embeddings proxy; failures are not fatal."""
+        if self.cassette is not None and self.cassette.mode == "replay":
+            return
+        try:
+            self.session.head(self.embedding_endpoint, timeout=5)
+        except requests.RequestException as e:
+            print(f"Warning: embeddings warmup failed: {e}")
+    
+    def _upstream(self, kind: str, request: dict, live):
+        """Run one upstream call, through the cassette when one is configured."""
+        if self.cassette is None:
+            return live()
+        return self.cassette.call(kind, request, live)
+    
+    def _post_embedding(self, text: str) -> dict:
+        AIPIPE_API_KEY = os.environ.get("AIPIPE_API_KEY")  # Set AIPIPE_API_KEY in your .env or environment
+        if not AIPIPE_API_KEY:
+            raise ValueError("AIPIPE_API_KEY environment variable not set.")
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {AIPIPE_API_KEY}"
+        }
+        
+        data = {
+            "model": EMBEDDING_MODEL,
+            "input": text
+        }
+        
+        response = self.session.post(self.embedding_endpoint, headers=headers, json=data)
+        if response.status_code != 200:
+            raise Exception(f"Embedding API error: {response.text}")
+        body = response.json()
+        return {
+            "embedding": np.array(body['data'][0]['embedding']),
+            "input_tokens": body.get('usage', {}).get('prompt_tokens', 0),
+        }
     
     def get_embedding(self, text: str) -> np.ndarray:
         """Get embedding using AIPipe's OpenAI embeddings."""
         try:
-            EMBEDDING_ENDPOINT = "https://aiproxy.sanand.workers.dev/openai/v1/embeddings"
-            AIPIPE_API_KEY = os.environ.get("AIPIPE_API_KEY")  # Set AIPIPE_API_KEY in your .env or environment
-            if not AIPIPE_API_KEY:
-                raise ValueError("AIPIPE_API_KEY environment variable not set.")
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {AIPIPE_API_KEY}"
-            }
-            
-            data = {
-                "model": "text-embedding-3-small",
-                "input": text
-            }
-            
-            response = requests.post(EMBEDDING_ENDPOINT, headers=headers, json=data)
-            if response.status_code == 200:
-                embedding = response.json()['data'][0]['embedding']
-                return np.array(embedding)
-            else:
-                raise Exception(f"Embedding API error: {response.text}")
+            with stage("embed"):
+                result = self._upstream("embed", {"model": EMBEDDING_MODEL, "input": text},
+                                        lambda: self._post_embedding(text))
+            record_usage("embed", result["input_tokens"])
+            return result["embedding"]
         except Exception as e:
             raise Exception(f"Error getting embedding: {str(e)}")
     
-    def process_image(self, image_base64: str) -> Tuple[str, np.ndarray]:
-        """Process image using Gemini Vision and get both text description and embedding."""
+    def process_image(self, image_data: Union[bytes, memoryview]) -> Tuple[str, np.ndarray]:
+        """Process raw image bytes using Gemini Vision and get both text description and embedding."""
         try:
-            # Decode base64 image
-            image_data = base64.b64decode(image_base64)
-            image = Image.open(io.BytesIO(image_data))
+            def describe() -> dict:
+                from PIL import Image
+                # BytesIO shares an immutable bytes buffer instead of copying it
+                image = Image.open(io.BytesIO(image_data))
+                return generation_result(self.vision_model.generate_content([VISION_PROMPT, image]))
             
-            # Get image description using Gemini Vision
-            prompt = "Describe this image in detail, focusing on any text, diagrams, or technical content that might be relevant for a data science course."
-            response = self.vision_model.generate_content([prompt, image])
-            image_description = response.text
+            with stage("vision"):
+                # Get image description using Gemini Vision
+                request = {"model": VISION_MODEL, "prompt": VISION_PROMPT,
+                           "image_sha256": hashlib.sha256(image_data).hexdigest()}
+                result = self._upstream("vision", request, describe)
+            record_usage("vision", result["input_tokens"], result["output_tokens"])
+            image_description = result["text"]
             
             # Get embedding for the image description
             image_embedding = self.get_embedding(image_description)
@@ -79,5 +166,8 @@ class GeminiProcessor:
         Please provide a clear, concise, and accurate answer. If the context doesn't contain enough information
         to answer the question fully, say so and provide the best possible answer with the available information."""
         
-        response = self.model.generate_content(prompt)
-        return response.text 
\ No newline at end of file
+        with stage("generate"):
+            result = self._upstream("generate", {"model": GENERATION_MODEL, "prompt": prompt},
+                                    lambda: generation_result(self.model.generate_content(prompt)))
+        record_usage("generate", result["input_tokens"], result["output_tokens"])
+        return result["text"]
@@ -0,0 +1,79 @@
+import binascii
+import os
+from typing import Optional
+
+# Largest decoded image we accept; screenshots are well under this
+MAX_IMAGE_BYTES = int(os.environ.get("MAX_IMAGE_BYTES", 10 * 1024 * 1024))
+# Request bodies may carry the image base64-encoded (4/3 larger) plus form/JSON overhead
+MAX_REQUEST_BYTES = MAX_IMAGE_BYTES * 4 // 3 + 64 * 1024
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Magic-number prefixes of the formats Gemini Vision accepts
+IMAGE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+class ImageRejected(ValueError):
+    """An uploaded image was too large, malformed or of an unsupported type."""
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Return the MIME type for the leading bytes of an image, or None if unsupported."""
+    for signature, mime_type in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return mime_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+def check_image(data: bytes) -> bytes:
+    """Validate size and type of a fully buffered image and return it unchanged."""
+    if len(data) > MAX_IMAGE_BYTES:
+        raise ImageRejected(f"Image exceeds {MAX_IMAGE_BYTES} bytes", 413)
+    if sniff_image_type(data[:16]) is None:
+        raise ImageRejected("Unsupported image type; send PNG, JPEG, GIF or WebP", 415)
+    return data
+
+async def read_image_upload(upload, max_bytes: int = MAX_IMAGE_BYTES) -> Optional[bytes]:
+    """Read an UploadFile in chunks, rejecting it as soon as it is oversized or not an image.
+
+    The chunks are joined once at the end, so the pipeline gets a single
+    immutable buffer that io.BytesIO can wrap without copying.
+    """
+    first = await upload.read(UPLOAD_CHUNK_SIZE)
+    if not first:
+        return None
+    if sniff_image_type(first[:16]) is None:
+        raise ImageRejected("Unsupported image type; send PNG, JPEG, GIF or WebP", 415)
+    chunks = [first]
+    size = len(first)
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise ImageRejected(f"Image exceeds {max_bytes} bytes", 413)
+        chunks.append(chunk)
+    return chunks[0] if len(chunks) == 1 else b"".join(chunks)
+
+def decode_image_base64(value: Optional[str]) -> Optional[bytes]:
+    """Decode the JSON endpoint's base64 image exactly once; blank values mean no image."""
+    if not value or value.strip() in ("", "null", "None"):
+        return None
+    # Accept data URLs such as "data:image/png;base64,...."
+    if value.startswith("data:"):
+        value = value.partition(",")[2]
+    if len(value) * 3 // 4 > MAX_IMAGE_BYTES + 3:
+        raise ImageRejected(f"Image exceeds {MAX_IMAGE_BYTES} bytes", 413)
+    try:
+        data = binascii.a2b_base64(value)
+    except binascii.Error as e:
+        raise ImageRejected(f"Invalid base64 image: {e}", 400)
+    return check_image(data)
@@ -0,0 +1,78 @@
+import os
+import threading
+import time
+from typing import Optional
+from app.core.gemini import GeminiProcessor
+from app.core.rag import RAGEngine
+from app.core.registry import DEFAULT_CORPUS, CorpusRegistry
+from app.core.singleflight import SingleFlight
+
+class EngineState:
+    """Tracks the background construction of the shared RAG engine.
+
+    The app starts serving liveness checks immediately while the snapshot is
+    loaded on a worker thread; readiness flips only once the engine (and the
+    optional warmup) is done. Other corpora are loaded on demand by the
+    registry (app/core/registry.py).
+    """
+
+    def __init__(self, warmup: bool = False, embeddings_dir: Optional[str] = None):
+        self.warmup = warmup
+        self.embeddings_dir = embeddings_dir
+        self.status = "starting"
+        self.error: Optional[str] = None
+        self.engine: Optional[RAGEngine] = None
+        self.registry: Optional[CorpusRegistry] = None
+        self.load_seconds: Optional[float] = None
+        # Identical questions asked concurrently share one pipeline run (app/core/singleflight.py)
+        self.flights = SingleFlight.from_env()
+        self._done = threading.Event()
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def load(self) -> None:
+        """Build one GeminiProcessor, the corpus registry that shares it and the default corpus's engine."""
+        started = time.perf_counter()
+        try:
+            self.status = "loading"
+            gemini = GeminiProcessor()
+            registry = CorpusRegistry.from_env(gemini, self.embeddings_dir, warmup=self.warmup)
+            # The default corpus keeps the old behaviour: built up front, test responses if it is missing
+            engine = RAGEngine(gemini=gemini, embeddings_dir=registry.corpora[DEFAULT_CORPUS])
+            # The SDK import is kept out of app import (fast process start) but done before ready,
+            # so no request waits for it
+            gemini.prepare()
+            if self.warmup:
+                self.status = "warming"
+                engine.warmup()
+            registry.add_loaded(DEFAULT_CORPUS, engine)
+            self.engine = engine
+            self.registry = registry
+            self.status = "ready"
+        except Exception as e:
+            print(f"Error initializing RAG engine: {e}")
+            self.error = str(e)
+            self.status = "failed"
+        finally:
+            self.load_seconds = time.perf_counter() - started
+            self._done.set()
+            print(f"RAG engine {self.status} after {self.load_seconds:.2f}s")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until loading has finished (successfully or not)."""
+        return self._done.wait(timeout)
+
+    def as_dict(self) -> dict:
+        return {
+            "status": self.status,
+            "error": self.error,
+            "load_seconds": self.load_seconds,
+            "single_flight": self.flights.as_dict(),
+            **({"corpora": self.registry.as_dict()} if self.registry is not None else {}),
+        }
+
+def warmup_enabled() -> bool:
+    """Whether WARMUP_ON_STARTUP asks for BLAS/cache/connection priming."""
+    return os.environ.get("WARMUP_ON_STARTUP", "").strip().lower() in ("1", "true", "yes")
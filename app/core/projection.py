@@ -0,0 +1,134 @@
+"""
+Dimension reduction for first-pass scoring.
+
+A Projection maps unit 1536-d embeddings to a few hundred dimensions:
+
+- "truncate": keep the first `dims` coordinates and renormalize.
+  text-embedding-3 models are trained so that prefixes of the vector are
+  themselves usable embeddings (Matryoshka representation learning).
+- "pca": project onto the top `dims` principal components of the corpus,
+  learned offline and stored next to the embeddings as <name>_pca<dims>.npz.
+
+Reduced scores only pick a shortlist; ReducedIndex (app/core/search.py)
+re-scores it at full dimension.
+
+    python -m app.core.projection --embeddings-dir embeddings --dims 256
+"""
+import argparse
+import os
+from typing import Optional
+import numpy as np
+
+METHODS = ("pca", "truncate")
+PROJECT_BLOCK_ROWS = 65536
+
+class Projection:
+    """A linear map to `dims` dimensions used for first-pass scoring."""
+
+    def __init__(self, method: str, dims: int, components: Optional[np.ndarray] = None,
+                 mean: Optional[np.ndarray] = None, explained_variance: Optional[float] = None):
+        if method not in METHODS:
+            raise ValueError(f"Unknown projection {method!r}; choose from {METHODS}")
+        self.method = method
+        self.dims = dims
+        # (full_dim, dims) orthonormal columns and the corpus mean, for "pca"
+        self.components = components
+        self.mean = mean
+        # Share of the corpus variance the components keep (pca only)
+        self.explained_variance = explained_variance
+
+    def project_rows(self, rows: np.ndarray) -> np.ndarray:
+        """C-contiguous float32 reduced rows, computed in blocks so memory-mapped input stays paged."""
+        out = np.empty((len(rows), self.dims), dtype=np.float32)
+        for start in range(0, len(rows), PROJECT_BLOCK_ROWS):
+            block = np.asarray(rows[start:start + PROJECT_BLOCK_ROWS], dtype=np.float32)
+            if self.method == "truncate":
+                block = block[:, :self.dims]
+                norms = np.linalg.norm(block, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                out[start:start + len(block)] = block / norms
+            else:
+                # Centering shifts every score for a query by the same amount, so ranking is unchanged
+                out[start:start + len(block)] = np.dot(block - self.mean, self.components)
+        return out
+
+    def project_query(self, query: np.ndarray) -> np.ndarray:
+        """Reduced query (or (m, d) block of queries) comparable with project_rows output."""
+        query = np.asarray(query, dtype=np.float32)
+        if self.method == "truncate":
+            reduced = query[..., :self.dims]
+            return reduced / np.linalg.norm(reduced, axis=-1, keepdims=True)
+        return np.dot(query, self.components)
+
+    @property
+    def nbytes(self) -> int:
+        return 0 if self.components is None else self.components.nbytes + self.mean.nbytes
+
+    def save(self, path: str) -> None:
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, method=self.method, dims=self.dims,
+                 explained_variance=np.nan if self.explained_variance is None else self.explained_variance,
+                 components=self.components if self.components is not None else np.empty(0, np.float32),
+                 mean=self.mean if self.mean is not None else np.empty(0, np.float32))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "Projection":
+        with np.load(path) as data:
+            method = str(data["method"])
+            if method == "truncate":
+                return cls(method, int(data["dims"]))
+            return cls(method, int(data["dims"]), data["components"].astype(np.float32), data["mean"].astype(np.float32),
+                       float(data["explained_variance"]))
+
+def fit_pca(embeddings: np.ndarray, dims: int) -> Projection:
+    """Top principal components of the rows, from their covariance accumulated block by block.
+
+    A corpus of n rows spans at most n dimensions, so dims is capped at n;
+    for such a corpus the projection loses nothing.
+    """
+    full_dim = embeddings.shape[1]
+    total = np.zeros(full_dim)
+    scatter = np.zeros((full_dim, full_dim))
+    for start in range(0, len(embeddings), PROJECT_BLOCK_ROWS):
+        block = np.asarray(embeddings[start:start + PROJECT_BLOCK_ROWS], dtype=np.float64)
+        total += block.sum(axis=0)
+        scatter += np.dot(block.T, block)
+    mean = total / len(embeddings)
+    covariance = scatter / len(embeddings) - np.outer(mean, mean)
+    values, vectors = np.linalg.eigh(covariance)
+    order = np.argsort(values)[::-1][:min(dims, len(embeddings))]
+    explained = float(values[order].sum() / max(values.sum(), 1e-12))
+    return Projection("pca", len(order), np.ascontiguousarray(vectors[:, order], dtype=np.float32),
+                      mean.astype(np.float32), explained_variance=explained)
+
+def make_projection(method: str, dims: int, embeddings: Optional[np.ndarray] = None) -> Projection:
+    if method == "truncate":
+        return Projection("truncate", dims)
+    if embeddings is None:
+        raise ValueError("A PCA projection has to be fitted on embeddings")
+    return fit_pca(embeddings, dims)
+
+def projection_path(embeddings_dir: str, name: str, dims: int) -> str:
+    return os.path.join(embeddings_dir, f"{name}_pca{dims}.npz")
+
+def main():
+    from app.core.snapshot import SOURCES, normalize_rows
+
+    parser = argparse.ArgumentParser(description="Fit the PCA projections used by the reduced retrieval mode")
+    parser.add_argument("--embeddings-dir", default="embeddings")
+    parser.add_argument("--dims", type=int, nargs="+", default=[256])
+    parser.add_argument("--sources", default=",".join(SOURCES))
+    args = parser.parse_args()
+
+    for name in args.sources.split(","):
+        embeddings = normalize_rows(np.load(os.path.join(args.embeddings_dir, f"{name}_embeddings.npy")))
+        for dims in args.dims:
+            projection = fit_pca(embeddings, dims)
+            path = projection_path(args.embeddings_dir, name, dims)
+            projection.save(path)
+            print(f"{name}: {len(embeddings)} rows -> {projection.dims} dims, "
+                  f"{projection.explained_variance:.1%} of variance kept -> {path}")
+
+if __name__ == "__main__":
+    main()
@@ -1,95 +1,135 @@
 import numpy as np
-import pandas as pd
-from typing import List, Tuple, Dict, Optional
+from typing import List, Tuple, Dict, Optional, Union
 import os
+import random
+from app.core.columns import ColumnStore
 from app.core.gemini import GeminiProcessor
+from app.core.snapshot import IndexSnapshot, build_corpus_index, get_snapshot
+from app.core.tracing import current_trace, stage
+
+def _unit(vector) -> np.ndarray:
+    """Scale a query vector to unit length so a dot product with unit rows is the cosine."""
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+def combine_queries(question_embedding, image_embedding=None, image_weight: float = 0.5) -> np.ndarray:
+    """Retrieval query for a question and an optional image.
+
+    Scores are linear in the query, so weighting the text and image scores is
+    a search with the weighted mean of the two unit vectors.
+    """
+    query = _unit(question_embedding)
+    if image_embedding is not None:
+        query = (1.0 - image_weight) * query + image_weight * _unit(image_embedding)
+    return query
 
 class RAGEngine:
-    def __init__(self):
-        self.gemini = GeminiProcessor()
-        
-        # Correct path to embeddings
-        embeddings_dir = os.path.join(os.path.dirname(__file__), "..", "..", "embeddings")
-        embeddings_dir = os.path.abspath(embeddings_dir)
+    def __init__(self, gemini: Optional[GeminiProcessor] = None, embeddings_dir: Optional[str] = None, snapshot: Optional[IndexSnapshot] = None):
+        # Share the caller's processor when given so the app holds a single upstream client
+        self.gemini = gemini if gemini is not None else GeminiProcessor()
+        # Fraction of requests whose top course candidates are dumped (off by default)
+        self.candidate_sample_rate = float(os.environ.get("TRACE_CANDIDATE_SAMPLE_RATE", "0"))
+        # "exact" scans full-width rows; "reduced" scans RETRIEVAL_DIMS-wide projections and "int8" quantized
+        # rows, both re-scoring a shortlist at full precision; "distributed" asks the RETRIEVAL_SHARDS servers
+        self.retrieval_mode = os.environ.get("RETRIEVAL_MODE", "exact")
+        self.retrieval_dims = int(os.environ.get("RETRIEVAL_DIMS", "256"))
+        self.retrieval_projection = os.environ.get("RETRIEVAL_PROJECTION", "pca")
+        # Share of the retrieval score that comes from the image description when there is one
+        self.image_weight = float(os.environ.get("RETRIEVAL_IMAGE_WEIGHT", "0.5"))
+        # Context chunks passed to the model
+        self.top_k = int(os.environ.get("RETRIEVAL_TOP_K", "3"))
         
         try:
+            # Reuse the snapshot preloaded before fork if there is one; rows are unit-normalized float32
+            self.snapshot = snapshot if snapshot is not None else get_snapshot(embeddings_dir)
+            course = self.snapshot.corpora["course"]
+            posts = self.snapshot.corpora["posts"]
+            
             # Load course content
-            self.course_embeddings = np.load(os.path.join(embeddings_dir, "course_embeddings.npy"))
-            self.course_metadata = pd.read_csv(os.path.join(embeddings_dir, "course_metadata.csv"))
+            self.course_embeddings = course.embeddings
+            self.course_metadata = course.metadata
             
             # Load posts content
-            self.posts_embeddings = np.load(os.path.join(embeddings_dir, "posts_embeddings.npy"))
-            self.posts_metadata = pd.read_csv(os.path.join(embeddings_dir, "posts_metadata.csv"))
+            self.posts_embeddings = posts.embeddings
+            self.posts_metadata = posts.metadata
             
-            # Load full texts
-            self.course_texts = pd.read_csv(os.path.join(embeddings_dir, "course_texts.csv"))
-            self.posts_texts = pd.read_csv(os.path.join(embeddings_dir, "posts_texts.csv"))
+            self.course_index = build_corpus_index(self.snapshot.directory, course, self.retrieval_mode,
+                                                   self.retrieval_dims, self.retrieval_projection)
+            self.posts_index = build_corpus_index(self.snapshot.directory, posts, self.retrieval_mode,
+                                                  self.retrieval_dims, self.retrieval_projection)
         except Exception as e:
             print(f"Warning: Could not load embeddings: {e}")
             # Initialize empty embeddings for testing
+            self.snapshot = None
             self.course_embeddings = np.array([])
-            self.course_metadata = pd.DataFrame()
+            self.course_metadata = ColumnStore.empty()
             self.posts_embeddings = np.array([])
-            self.posts_metadata = pd.DataFrame()
+            self.posts_metadata = ColumnStore.empty()
+            self.course_index = None
+            self.posts_index = None
+    
+    def warmup(self) -> None:
+        """Prime BLAS, the page cache and upstream connections before serving traffic."""
+        for index, embeddings in ((self.course_index, self.course_embeddings), (self.posts_index, self.posts_embeddings)):
+            if hasattr(index, "warmup"):
+                index.warmup()  # shard connections; the vectors are not here
+            elif index is not None and len(embeddings):
+                index.search(_unit(np.ones(embeddings.shape[1], dtype=np.float32)), 3)
+        self.gemini.warmup()
     
     def get_relevant_context(self, question_embedding: List[float], image_embedding: Optional[np.ndarray] = None, top_k: int = 3) -> List[Dict]:
         """Get most relevant context from embeddings using cosine similarity."""
         if len(self.course_embeddings) == 0 and len(self.posts_embeddings) == 0:
             return [{"text": "No embeddings available yet. This is a test response.", "url": None}]
         
-        # Calculate cosine similarity for text
-        course_scores = np.dot(self.course_embeddings, question_embedding) / (
-            np.linalg.norm(self.course_embeddings, axis=1) * np.linalg.norm(question_embedding)
-        )
-        posts_scores = np.dot(self.posts_embeddings, question_embedding) / (
-            np.linalg.norm(self.posts_embeddings, axis=1) * np.linalg.norm(question_embedding)
-        )
-        
-        # If image embedding is provided, combine scores
-        if image_embedding is not None:
-            image_course_scores = np.dot(self.course_embeddings, image_embedding) / (
-                np.linalg.norm(self.course_embeddings, axis=1) * np.linalg.norm(image_embedding)
-            )
-            image_posts_scores = np.dot(self.posts_embeddings, image_embedding) / (
-                np.linalg.norm(self.posts_embeddings, axis=1) * np.linalg.norm(image_embedding)
-            )
-            
-            # Combine text and image scores with equal weight
-            course_scores = (course_scores + image_course_scores) / 2
-            posts_scores = (posts_scores + image_posts_scores) / 2
+        # Cosine similarity for text (stored rows are already unit length), blended with the image if any
+        query = combine_queries(question_embedding, image_embedding, self.image_weight)
         
-        # Debug: Print top 10 course chunks by similarity
-        print("\nTop 10 course context candidates:")
-        top_course_indices_debug = np.argsort(course_scores)[-10:][::-1]
-        for idx in top_course_indices_debug:
-            section = self.course_metadata.iloc[idx]["section"] if "section" in self.course_metadata.columns else "?"
-            text = self.course_metadata.iloc[idx]["text"] if "text" in self.course_metadata.columns else "?"
-            print(f"Score: {course_scores[idx]:.4f} | Section: {section} | Text: {text[:100]}")
+        # Verbose candidate dump, sampled so it costs nothing on most requests
+        if self.candidate_sample_rate and random.random() < self.candidate_sample_rate:
+            self._record_candidates(*self.course_index.search(query, 10))
         
         # Get top matches from both sources
-        top_course_indices = np.argsort(course_scores)[-top_k:]
-        top_posts_indices = np.argsort(posts_scores)[-top_k:]
+        top_course_indices, course_scores = self.course_index.search(query, top_k)
+        top_posts_indices, posts_scores = self.posts_index.search(query, top_k)
         
         context = []
         
         # Add course content
-        for idx in top_course_indices:
+        for idx, score in zip(top_course_indices, course_scores):
             context.append({
-                "text": self.course_metadata.iloc[idx]["text"],
-                "url": self.course_metadata.iloc[idx]["url"] if "url" in self.course_metadata.columns else None,
-                "score": float(course_scores[idx])
+                "text": self.course_metadata.get(idx, "text"),
+                "url": self.course_metadata.get(idx, "url"),
+                "score": float(score)
             })
         
         # Add posts
-        for idx in top_posts_indices:
+        for idx, score in zip(top_posts_indices, posts_scores):
             context.append({
-                "text": self.posts_metadata.iloc[idx]["text"] if "text" in self.posts_metadata.columns else "?",
-                "url": self.posts_metadata.iloc[idx]["url"] if "url" in self.posts_metadata.columns else None,
-                "score": float(posts_scores[idx])
+                "text": self.posts_metadata.get(idx, "text", "?"),
+                "url": self.posts_metadata.get(idx, "url"),
+                "score": float(score)
             })
         
         return sorted(context, key=lambda x: x.get("score", 0), reverse=True)[:top_k]
     
+    def _record_candidates(self, indices: np.ndarray, scores: np.ndarray) -> None:
+        """Attach the top course candidates to the request trace (or print them outside a request)."""
+        candidates = []
+        for idx, score in zip(indices, scores):
+            candidates.append({
+                "score": round(float(score), 4),
+                "section": self.course_metadata.get(idx, "section", "?"),
+                "text": str(self.course_metadata.get(idx, "text", "?"))[:100],
+            })
+        trace = current_trace()
+        if trace is not None:
+            trace.attrs["course_candidates"] = candidates
+            return
+        print(f"\nTop {len(candidates)} course context candidates:")
+        for c in candidates:
+            print(f"Score: {c['score']:.4f} | Section: {c['section']} | Text: {c['text']}")
+    
     def _cosine_similarity(self, query_embedding: np.ndarray, embeddings: np.ndarray) -> np.ndarray:
         """Calculate cosine similarity between query and all embeddings."""
         # Normalize embeddings
@@ -101,8 +141,8 @@ class RAGEngine:
         
         return similarities
     
-    def get_answer(self, question: str, image_base64: Optional[str] = None) -> Tuple[str, List[Dict[str, str]]]:
-        """Get answer for a question using RAG."""
+    def get_answer(self, question: str, image: Optional[Union[bytes, memoryview]] = None) -> Tuple[str, List[Dict[str, str]]]:
+        """Get answer for a question (and optional raw image bytes) using RAG."""
         try:
             # For testing, return a dummy response when no embeddings are available
             if len(self.course_embeddings) == 0 and len(self.posts_embeddings) == 0:
@@ -117,27 +157,33 @@ class RAGEngine:
             # Process image if provided
             image_description = None
             image_embedding = None
-            if image_base64:
-                image_description, image_embedding = self.gemini.process_image(image_base64)
+            if image:
+                image_description, image_embedding = self.gemini.process_image(image)
             
             # Get relevant context
-            context = self.get_relevant_context(question_embedding, image_embedding)
+            with stage("retrieve"):
+                context = self.get_relevant_context(question_embedding, image_embedding, self.top_k)
             
             # Combine all context texts
-            combined_context = "\n".join([c["text"] for c in context])
+            with stage("pack"):
+                combined_context = "\n".join([c["text"] for c in context])
             
             # Generate answer using Gemini
             answer = self.gemini.generate_answer(question, combined_context, image_description)
             
             # Format links from context
-            links = [
-                {"url": ctx["url"], "text": ctx["text"][:100] + "..."} 
-                for ctx in context 
-                if ctx["url"] is not None
-            ]
+            with stage("pack"):
+                links = [
+                    {"url": ctx["url"], "text": ctx["text"][:100] + "..."} 
+                    for ctx in context 
+                    if ctx["url"] is not None
+                ]
             
             return answer, links
             
         except Exception as e:
             print(f"Error in get_answer: {e}")
+            trace = current_trace()
+            if trace is not None:
+                trace.attrs["error"] = str(e)
             return "I apologize, but I encountered an error while processing your question.", [] 
\ No newline at end of file
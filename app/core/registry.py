@@ -0,0 +1,151 @@
+"""
+Registry of corpora served by one process.
+
+A corpus is an embeddings directory (course_* and posts_* files, or a
+"current" link to a snapshot published by scrap/ingest.py). Besides the
+default one (EMBEDDINGS_DIR or embeddings/), every such directory under
+CORPORA_DIR is a corpus named by its relative path, e.g.
+CORPORA_DIR/tds/2025-01 -> "tds/2025-01".
+
+Engines are built on first use and kept in LRU order. When the loaded
+corpora exceed CORPUS_MEMORY_BUDGET_MB, the least recently used ones are
+dropped; the default corpus and those listed in CORPUS_PIN (comma-separated)
+are never evicted. Requests already holding an evicted engine finish with it.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+from app.core.gemini import GeminiProcessor
+from app.core.rag import RAGEngine
+from app.core.snapshot import CURRENT_LINK, SERVING_DIR_NAME, resolve_embeddings_dir
+
+DEFAULT_CORPUS = "default"
+
+class UnknownCorpus(KeyError):
+    """No corpus is registered under the requested name."""
+
+class CorpusLoadError(RuntimeError):
+    """A registered corpus could not be loaded."""
+
+def is_corpus_dir(path: str) -> bool:
+    return os.path.exists(os.path.join(path, "course_embeddings.npy")) or os.path.isdir(os.path.join(path, CURRENT_LINK))
+
+def discover_corpora(root: str) -> Dict[str, str]:
+    """{relative name: directory} for every corpus directory under root (corpora are not nested)."""
+    corpora = {}
+    for directory, subdirs, _ in os.walk(root):
+        if is_corpus_dir(directory):
+            corpora[os.path.relpath(directory, root).replace(os.sep, "/")] = directory
+            subdirs[:] = []
+            continue
+        subdirs[:] = sorted(d for d in subdirs if d not in ("snapshots", SERVING_DIR_NAME) and not d.startswith("."))
+    return corpora
+
+def engine_nbytes(engine: RAGEngine) -> int:
+    """Vectors, extra index copies and metadata an engine keeps (mapped pages count once touched)."""
+    total = 0
+    for embeddings, index, metadata in ((engine.course_embeddings, engine.course_index, engine.course_metadata),
+                                        (engine.posts_embeddings, engine.posts_index, engine.posts_metadata)):
+        total += embeddings.nbytes
+        if index is not None and index.mode != "exact":
+            total += index.nbytes  # reduced or quantized copy on top of the full rows
+        total += metadata.nbytes
+    return total
+
+class CorpusRegistry:
+    def __init__(self, gemini: GeminiProcessor, corpora: Dict[str, str], memory_budget: Optional[int] = None,
+                 pinned: Iterable[str] = (DEFAULT_CORPUS,), warmup: bool = False):
+        self.gemini = gemini
+        self.corpora = dict(corpora)
+        self.memory_budget = memory_budget
+        self.pinned = set(pinned)
+        self.warmup = warmup
+        self.loaded: "OrderedDict[str, RAGEngine]" = OrderedDict()
+        self.sizes: Dict[str, int] = {}
+        self.loads = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        # One lock per corpus so concurrent first requests build its engine once
+        self._load_locks: Dict[str, threading.Lock] = {}
+
+    @classmethod
+    def from_env(cls, gemini: GeminiProcessor, embeddings_dir: Optional[str] = None, warmup: bool = False) -> "CorpusRegistry":
+        corpora = {}
+        root = os.environ.get("CORPORA_DIR")
+        if root:
+            corpora.update(discover_corpora(root))
+        corpora[DEFAULT_CORPUS] = resolve_embeddings_dir(embeddings_dir)
+        budget_mb = float(os.environ.get("CORPUS_MEMORY_BUDGET_MB", "0"))
+        pinned = {DEFAULT_CORPUS} | {name.strip() for name in os.environ.get("CORPUS_PIN", "").split(",") if name.strip()}
+        return cls(gemini, corpora, int(budget_mb * 2**20) or None, pinned, warmup)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(self.sizes.values())
+
+    def get(self, name: Optional[str] = None) -> RAGEngine:
+        """The engine for a corpus, loading it on first use; blocks while it loads."""
+        name = name or DEFAULT_CORPUS
+        if name not in self.corpora:
+            raise UnknownCorpus(name)
+        with self.lock:
+            engine = self.loaded.get(name)
+            if engine is not None:
+                self.loaded.move_to_end(name)
+                return engine
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+        with load_lock:
+            with self.lock:
+                engine = self.loaded.get(name)
+                if engine is not None:
+                    self.loaded.move_to_end(name)
+                    return engine
+            engine = self._load(name)
+            self.add_loaded(name, engine)
+            return engine
+
+    def add_loaded(self, name: str, engine: RAGEngine) -> None:
+        """Register an engine built elsewhere (the default corpus at startup)."""
+        with self.lock:
+            self.loaded[name] = engine
+            self.sizes[name] = engine_nbytes(engine)
+            self.loads += 1
+            self._evict(keep=name)
+
+    def _load(self, name: str) -> RAGEngine:
+        started = time.perf_counter()
+        engine = RAGEngine(gemini=self.gemini, embeddings_dir=self.corpora[name])
+        if engine.snapshot is None:
+            raise CorpusLoadError(f"Could not load corpus {name!r} from {self.corpora[name]}")
+        if self.warmup:
+            engine.warmup()
+        print(f"Loaded corpus {name} in {time.perf_counter() - started:.2f}s")
+        return engine
+
+    def _evict(self, keep: str) -> None:
+        """Drop least recently used, unpinned engines until the budget holds (caller holds the lock)."""
+        if not self.memory_budget:
+            return
+        for name in list(self.loaded):
+            if self.nbytes <= self.memory_budget:
+                break
+            if name == keep or name in self.pinned:
+                continue
+            del self.loaded[name]
+            freed = self.sizes.pop(name)
+            self.evictions += 1
+            print(f"Evicted corpus {name} ({freed / 2**20:.1f}MiB) to stay under the memory budget")
+
+    def as_dict(self) -> dict:
+        with self.lock:
+            return {
+                "corpora": sorted(self.corpora),
+                "loaded": {name: round(self.sizes[name] / 2**20, 1) for name in self.loaded},
+                "pinned": sorted(self.pinned & set(self.corpora)),
+                "loaded_mib": round(self.nbytes / 2**20, 1),
+                "budget_mib": round(self.memory_budget / 2**20, 1) if self.memory_budget else None,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,252 @@
+import heapq
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Type
+from app.core.blas import search_threads
+from app.core.projection import Projection, make_projection
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first, without sorting the whole array."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        candidates = np.argpartition(scores, -k)[-k:]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(scores[candidates])[::-1]]
+
+def top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """Row-wise top_k_indices for a (queries, rows) score matrix."""
+    k = min(k, scores.shape[1])
+    if k < scores.shape[1]:
+        candidates = np.argpartition(scores, -k, axis=1)[:, -k:]
+    else:
+        candidates = np.broadcast_to(np.arange(scores.shape[1]), scores.shape).copy()
+    order = np.argsort(np.take_along_axis(scores, candidates, axis=1), axis=1)[:, ::-1]
+    return np.take_along_axis(candidates, order, axis=1)
+
+class ExactIndex:
+    """Brute-force cosine search over unit-normalized float32 rows."""
+
+    mode = "exact"
+
+    def __init__(self, embeddings: np.ndarray, **options):
+        self.embeddings = embeddings
+
+    def __len__(self) -> int:
+        return len(self.embeddings)
+
+    @property
+    def nbytes(self) -> int:
+        return self.embeddings.nbytes
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """Cosine similarity of a unit query against every row."""
+        return np.dot(self.embeddings, query)
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores = self.scores(query)
+        indices = top_k_indices(scores, k)
+        return indices, scores[indices]
+
+    def search_batch(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k for a (m, d) block of unit queries with a single matrix product."""
+        scores = np.dot(queries, self.embeddings.T)
+        indices = top_k_rows(scores, k)
+        return indices, np.take_along_axis(scores, indices, axis=1)
+
+class ReducedIndex:
+    """Two-pass search: score projected rows (truncated or PCA), re-score a shortlist at full dimension.
+
+    Only the dims-wide reduced rows are scanned per query; full rows are read
+    just for the shortlist of max(oversample * k, min_shortlist) candidates,
+    so they can stay memory-mapped and mostly out of the page cache. Pass a
+    stored projection (and its precomputed reduced rows) to skip fitting.
+    """
+
+    mode = "reduced"
+
+    def __init__(self, embeddings: np.ndarray, dims: int = 256, method: str = "pca",
+                 projection: Optional[Projection] = None, reduced: Optional[np.ndarray] = None,
+                 oversample: int = 4, min_shortlist: int = 32, **options):
+        self.embeddings = embeddings
+        self.projection = projection or make_projection(method, dims, embeddings)
+        self.reduced = reduced if reduced is not None else self.projection.project_rows(embeddings)
+        self.oversample = oversample
+        self.min_shortlist = min_shortlist
+
+    def __len__(self) -> int:
+        return len(self.embeddings)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes scanned per query (reduced rows and projection); full rows are only read for the shortlist."""
+        return self.reduced.nbytes + self.projection.nbytes
+
+    def shortlist_size(self, k: int) -> int:
+        return min(len(self.reduced), max(self.oversample * k, self.min_shortlist))
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        first = np.dot(self.reduced, self.projection.project_query(query))
+        candidates = np.sort(top_k_indices(first, self.shortlist_size(k)))  # ascending rows read sequentially
+        exact = np.dot(self.embeddings[candidates], query)
+        order = top_k_indices(exact, k)
+        return candidates[order], exact[order]
+
+    def search_batch(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        first = np.dot(self.projection.project_query(queries), self.reduced.T)
+        candidates = top_k_rows(first, self.shortlist_size(k))
+        rows = np.asarray(self.embeddings[candidates.ravel()]).reshape(*candidates.shape, -1)
+        exact = np.einsum("msd,md->ms", rows, queries)
+        order = top_k_rows(exact, k)
+        return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(exact, order, axis=1)
+
+class QuantizedIndex:
+    """Two-pass search over int8 codes: scan the quantized rows, re-score a shortlist at full precision.
+
+    Every dimension is scaled by its largest absolute value over the corpus
+    and rounded to int8, so the scanned copy is a quarter of the float32 rows.
+    Codes are widened to float32 a block at a time for the BLAS product.
+    """
+
+    mode = "int8"
+    SCAN_BLOCK_ROWS = 4096
+
+    def __init__(self, embeddings: np.ndarray, oversample: int = 4, min_shortlist: int = 32, **options):
+        self.embeddings = embeddings
+        self.scale = np.zeros(embeddings.shape[1], dtype=np.float32)
+        for start in range(0, len(embeddings), self.SCAN_BLOCK_ROWS):
+            block = np.abs(np.asarray(embeddings[start:start + self.SCAN_BLOCK_ROWS], dtype=np.float32))
+            np.maximum(self.scale, block.max(axis=0), out=self.scale)
+        self.scale /= 127.0
+        self.scale[self.scale == 0] = 1.0
+        self.codes = np.empty(embeddings.shape, dtype=np.int8)
+        for start in range(0, len(embeddings), self.SCAN_BLOCK_ROWS):
+            block = np.asarray(embeddings[start:start + self.SCAN_BLOCK_ROWS], dtype=np.float32)
+            self.codes[start:start + len(block)] = np.rint(block / self.scale)
+        self.oversample = oversample
+        self.min_shortlist = min_shortlist
+
+    def __len__(self) -> int:
+        return len(self.embeddings)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes scanned per query; full rows are only read for the shortlist."""
+        return self.codes.nbytes + self.scale.nbytes
+
+    def shortlist_size(self, k: int) -> int:
+        return min(len(self.codes), max(self.oversample * k, self.min_shortlist))
+
+    def approximate_scores(self, queries: np.ndarray) -> np.ndarray:
+        """(rows,) or (rows, m) scores of the dequantized rows against one query or a (d, m) block."""
+        scaled = (np.asarray(queries, dtype=np.float32).T * self.scale).T
+        out = np.empty((len(self.codes),) + scaled.shape[1:], dtype=np.float32)
+        for start in range(0, len(self.codes), self.SCAN_BLOCK_ROWS):
+            block = self.codes[start:start + self.SCAN_BLOCK_ROWS].astype(np.float32)
+            out[start:start + len(block)] = np.dot(block, scaled)
+        return out
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        first = self.approximate_scores(query)
+        candidates = np.sort(top_k_indices(first, self.shortlist_size(k)))
+        exact = np.dot(self.embeddings[candidates], query)
+        order = top_k_indices(exact, k)
+        return candidates[order], exact[order]
+
+    def search_batch(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        first = self.approximate_scores(np.ascontiguousarray(queries.T)).T
+        candidates = top_k_rows(first, self.shortlist_size(k))
+        rows = np.asarray(self.embeddings[candidates.ravel()]).reshape(*candidates.shape, -1)
+        exact = np.einsum("msd,md->ms", rows, queries)
+        order = top_k_rows(exact, k)
+        return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(exact, order, axis=1)
+
+_pools: Dict[int, ThreadPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+def search_pool(threads: int) -> ThreadPoolExecutor:
+    """Process-wide pool of `threads` search threads, shared by every sharded index (created on first use)."""
+    with _pools_lock:
+        pool = _pools.get(threads)
+        if pool is None:
+            pool = _pools[threads] = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="search")
+        return pool
+
+def merge_top_k(parts: List[Tuple[np.ndarray, np.ndarray]], k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Merge per-shard (indices, scores) lists, each best first, into the overall top k."""
+    merged = list(heapq.merge(*(zip(scores.tolist(), indices.tolist()) for indices, scores in parts),
+                              key=lambda item: item[0], reverse=True))[:k]
+    return (np.fromiter((i for _, i in merged), dtype=np.int64, count=len(merged)),
+            np.fromiter((s for s, _ in merged), dtype=np.float32, count=len(merged)))
+
+class ShardedIndex:
+    """Exact search with the rows split into contiguous shards scanned in parallel.
+
+    Shards are views of the same (usually memory-mapped) array, so the search
+    threads share one copy of the rows; BLAS releases the GIL during the
+    product, so threads scale without a process pool. Each shard returns its
+    own top k and the lists are merged with a heap. Keep BLAS single-threaded
+    (see app/core/blas.py) so shard threads do not oversubscribe the cores.
+    """
+
+    mode = "sharded"
+
+    def __init__(self, embeddings: np.ndarray, threads: Optional[int] = None, min_shard_rows: int = 16384, **options):
+        self.embeddings = embeddings
+        self.threads = threads or search_threads()
+        shards = max(1, min(self.threads, len(embeddings) // max(1, min_shard_rows)))
+        bounds = np.linspace(0, len(embeddings), shards + 1).astype(int)
+        self.shards = [(int(start), embeddings[start:stop]) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    def __len__(self) -> int:
+        return len(self.embeddings)
+
+    @property
+    def nbytes(self) -> int:
+        return self.embeddings.nbytes
+
+    @staticmethod
+    def _search_shard(offset: int, rows: np.ndarray, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores = np.dot(rows, query)
+        indices = top_k_indices(scores, k)
+        return indices + offset, scores[indices]
+
+    def _map(self, fn, *args) -> list:
+        if len(self.shards) == 1:
+            return [fn(offset, rows, *args) for offset, rows in self.shards]
+        pool = search_pool(self.threads)
+        return [f.result() for f in [pool.submit(fn, offset, rows, *args) for offset, rows in self.shards]]
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        return merge_top_k(self._map(self._search_shard, query, k), k)
+
+    @staticmethod
+    def _search_shard_batch(offset: int, rows: np.ndarray, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores = np.dot(queries, rows.T)
+        indices = top_k_rows(scores, k)
+        return indices + offset, np.take_along_axis(scores, indices, axis=1)
+
+    def search_batch(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        parts = self._map(self._search_shard_batch, queries, k)
+        indices = np.concatenate([p[0] for p in parts], axis=1)
+        scores = np.concatenate([p[1] for p in parts], axis=1)
+        order = top_k_rows(scores, k)
+        return np.take_along_axis(indices, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+# Retrieval modes by name; benchmarks and the engine build indexes through this table
+SEARCH_MODES: Dict[str, Type] = {
+    "exact": ExactIndex,
+    "reduced": ReducedIndex,
+    "int8": QuantizedIndex,
+    "sharded": ShardedIndex,
+}
+
+def build_index(mode: str, embeddings: np.ndarray, **options):
+    try:
+        index_cls = SEARCH_MODES[mode]
+    except KeyError:
+        raise ValueError(f"Unknown retrieval mode {mode!r}; choose from {sorted(SEARCH_MODES)}")
+    return index_cls(embeddings, **options)
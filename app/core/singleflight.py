@@ -0,0 +1,60 @@
+"""
+Coalescing of identical in-flight requests.
+
+When many students ask the same question at once, the first request runs the
+pipeline and the others wait for its result instead of repeating the
+embedding, retrieval and generation calls. A flight lasts only as long as
+its call: once it finishes, successfully or not, the next identical request
+starts a new one, so errors are never served from a finished flight.
+"""
+import asyncio
+import hashlib
+import os
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+def question_key(question: str, image: Optional[bytes] = None) -> Tuple[str, Optional[str]]:
+    """Case- and whitespace-insensitive question text plus the image's SHA-256."""
+    return " ".join(question.split()).casefold(), hashlib.sha256(image).hexdigest() if image else None
+
+class SingleFlight:
+    """One running call per key; concurrent callers with the same key share its outcome.
+
+    Must be used from a single event loop. The call runs as its own task, so a
+    caller that goes away (client disconnect) does not cancel it for the others.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+        self.started = 0
+        self.joined = 0
+
+    @classmethod
+    def from_env(cls) -> "SingleFlight":
+        """Enabled unless SINGLE_FLIGHT=0."""
+        return cls(os.environ.get("SINGLE_FLIGHT", "1").strip().lower() not in ("0", "false", "no"))
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """(result of call(), whether it came from a flight another request started)."""
+        if not self.enabled:
+            return await call(), False
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if shared:
+            self.joined += 1
+        else:
+            # The task copies this context, so the leader's trace records the pipeline's stages
+            flight = asyncio.ensure_future(call())
+            self._flights[key] = flight
+            self.started += 1
+            flight.add_done_callback(lambda done: self._land(key, done))
+        return await asyncio.shield(flight), shared
+
+    def _land(self, key: Hashable, flight: asyncio.Future) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.cancelled():
+            flight.exception()  # retrieved, even if every caller went away
+
+    def as_dict(self) -> dict:
+        return {"enabled": self.enabled, "in_flight": len(self._flights), "started": self.started, "joined": self.joined}
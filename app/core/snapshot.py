@@ -0,0 +1,173 @@
+import os
+import numpy as np
+from typing import Dict, Optional
+from app.core.columns import ColumnStore, prepare_columns
+from app.core.projection import Projection, make_projection, projection_path
+from app.core.search import build_index
+
+DEFAULT_EMBEDDINGS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "embeddings"))
+# Symlink (inside an embeddings directory) to the latest snapshot published by scrap/ingest.py
+CURRENT_LINK = "current"
+SOURCES = ("course", "posts")
+# Derived, serving-ready copies of the embeddings live next to the source files
+SERVING_DIR_NAME = ".serving"
+
+def resolve_embeddings_dir(embeddings_dir: Optional[str] = None) -> str:
+    """Explicit directory, else $EMBEDDINGS_DIR, else the repo's embeddings/ folder.
+
+    If the directory holds a published snapshot (a "current" symlink), that
+    snapshot's directory is used, resolved so a running process keeps the
+    snapshot it loaded when a newer one is published.
+    """
+    directory = os.path.abspath(embeddings_dir or os.environ.get("EMBEDDINGS_DIR") or DEFAULT_EMBEDDINGS_DIR)
+    current = os.path.join(directory, CURRENT_LINK)
+    if os.path.isdir(current):
+        return os.path.realpath(current)
+    return directory
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Return a C-contiguous float32 copy of matrix with unit-length rows (zero rows stay zero)."""
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    if matrix.ndim != 2 or not len(matrix):
+        return matrix
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def prepare_serving_layout(embeddings_dir: str, name: str) -> str:
+    """Write (once) a unit-normalized float32 copy of <name>_embeddings.npy and return its path.
+
+    The file is rebuilt only when the source .npy is newer, and is swapped in
+    atomically so concurrently starting processes never see a partial file.
+    """
+    source = os.path.join(embeddings_dir, f"{name}_embeddings.npy")
+    target = os.path.join(embeddings_dir, SERVING_DIR_NAME, f"{name}_embeddings.f32.npy")
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source):
+        return target
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    unit = normalize_rows(np.load(source))
+    tmp = f"{target}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, unit)
+    os.replace(tmp, target)
+    return target
+
+def load_columns(embeddings_dir: str, filename: str) -> ColumnStore:
+    """A CSV next to the embeddings as a ColumnStore, cached under .serving/ like the vectors."""
+    target = os.path.join(embeddings_dir, SERVING_DIR_NAME, f"{os.path.splitext(filename)[0]}.columns.npz")
+    return prepare_columns(os.path.join(embeddings_dir, filename), target)
+
+class Corpus:
+    """One embedded source: unit-normalized float32 vectors plus their row metadata."""
+
+    def __init__(self, name: str, embeddings: np.ndarray, metadata: ColumnStore, texts_dir: Optional[str] = None):
+        self.name = name
+        self.embeddings = embeddings
+        self.metadata = metadata
+        # Full texts are not needed to answer, so <name>_texts.csv is only read if asked for
+        self.texts_dir = texts_dir
+        self._texts: Optional[ColumnStore] = None
+
+    def __len__(self) -> int:
+        return len(self.embeddings)
+
+    @property
+    def texts(self) -> Optional[ColumnStore]:
+        if self._texts is None and self.texts_dir is not None:
+            self._texts = load_columns(self.texts_dir, f"{self.name}_texts.csv")
+        return self._texts
+
+def load_corpus(embeddings_dir: str, name: str, mmap: bool = True, vectors: bool = True) -> Corpus:
+    """Load one source, memory-mapping its vectors read-only when possible.
+
+    With vectors=False only the metadata is read (the rows are searched on
+    shard servers, see app/core/distributed.py); embeddings is then (rows, 0).
+    """
+    metadata = load_columns(embeddings_dir, f"{name}_metadata.csv")
+    texts_dir = embeddings_dir if os.path.exists(os.path.join(embeddings_dir, f"{name}_texts.csv")) else None
+    if not vectors:
+        return Corpus(name, np.empty((len(metadata), 0), dtype=np.float32), metadata, texts_dir)
+    try:
+        if not mmap:
+            raise OSError("mmap disabled")
+        embeddings = np.load(prepare_serving_layout(embeddings_dir, name), mmap_mode="r")
+    except OSError:
+        # Read-only checkout (or mmap disabled): normalize in memory instead
+        embeddings = normalize_rows(np.load(os.path.join(embeddings_dir, f"{name}_embeddings.npy")))
+        embeddings.setflags(write=False)
+    return Corpus(name, embeddings, metadata, texts_dir)
+
+def load_projection(embeddings_dir: str, corpus: Corpus, method: str, dims: int) -> Projection:
+    """The stored PCA projection for a corpus (python -m app.core.projection), else one fitted now."""
+    if method == "pca":
+        path = projection_path(embeddings_dir, corpus.name, dims)
+        if os.path.exists(path):
+            return Projection.load(path)
+        print(f"No stored projection {path}; fitting PCA for {corpus.name} on load")
+    return make_projection(method, dims, corpus.embeddings)
+
+def prepare_reduced_layout(embeddings_dir: str, corpus: Corpus, projection: Projection, method: str, dims: int) -> np.ndarray:
+    """Projected rows for the reduced mode, cached under .serving/ like the full rows and memory-mapped."""
+    target = os.path.join(embeddings_dir, SERVING_DIR_NAME, f"{corpus.name}_{method}{dims}.f32.npy")
+    sources = [os.path.join(embeddings_dir, f"{corpus.name}_embeddings.npy"), projection_path(embeddings_dir, corpus.name, dims)]
+    newest = max(os.path.getmtime(path) for path in sources if os.path.exists(path))
+    try:
+        if not (os.path.exists(target) and os.path.getmtime(target) >= newest):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp = f"{target}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, projection.project_rows(corpus.embeddings))
+            os.replace(tmp, target)
+        return np.load(target, mmap_mode="r")
+    except OSError:
+        # Read-only checkout: project in memory
+        return projection.project_rows(corpus.embeddings)
+
+def build_corpus_index(embeddings_dir: str, corpus: Corpus, mode: str = "exact", dims: int = 256, method: str = "pca"):
+    """Search index for one corpus; the reduced mode uses the projection stored in the snapshot."""
+    if mode == "distributed":
+        from app.core.distributed import DEFAULT_TIMEOUT_MS, DistributedIndex, shard_urls_from_env
+        timeout_ms = float(os.environ.get("RETRIEVAL_SHARD_TIMEOUT_MS", DEFAULT_TIMEOUT_MS))
+        return DistributedIndex(corpus.name, len(corpus), shard_urls_from_env(), timeout_ms)
+    if not len(corpus):
+        return build_index("exact", corpus.embeddings)
+    if mode != "reduced":
+        return build_index(mode, corpus.embeddings)
+    projection = load_projection(embeddings_dir, corpus, method, dims)
+    reduced = prepare_reduced_layout(embeddings_dir, corpus, projection, method, dims)
+    return build_index(mode, corpus.embeddings, projection=projection, reduced=reduced)
+
+class IndexSnapshot:
+    """All corpora served from one embeddings directory."""
+
+    def __init__(self, directory: str, corpora: Dict[str, Corpus]):
+        self.directory = directory
+        self.corpora = corpora
+
+    @property
+    def nbytes(self) -> int:
+        return sum(corpus.embeddings.nbytes for corpus in self.corpora.values())
+
+def load_snapshot(embeddings_dir: Optional[str] = None, mmap: bool = True, vectors: bool = True) -> IndexSnapshot:
+    embeddings_dir = resolve_embeddings_dir(embeddings_dir)
+    corpora = {name: load_corpus(embeddings_dir, name, mmap=mmap, vectors=vectors) for name in SOURCES}
+    return IndexSnapshot(embeddings_dir, corpora)
+
+# Snapshots loaded before fork (see app/serve.py), shared copy-on-write by all workers
+_preloaded: Dict[str, IndexSnapshot] = {}
+
+def vectors_are_local() -> bool:
+    """False when RETRIEVAL_MODE=distributed: shard servers hold the vectors, this process only metadata."""
+    return os.environ.get("RETRIEVAL_MODE", "exact") != "distributed"
+
+def preload_snapshot(embeddings_dir: Optional[str] = None) -> IndexSnapshot:
+    """Load a snapshot in the current (master) process so forked workers inherit it."""
+    snapshot = load_snapshot(embeddings_dir, vectors=vectors_are_local())
+    _preloaded[snapshot.directory] = snapshot
+    return snapshot
+
+def get_snapshot(embeddings_dir: Optional[str] = None) -> IndexSnapshot:
+    """Return the preloaded snapshot for embeddings_dir, loading it if there is none."""
+    directory = resolve_embeddings_dir(embeddings_dir)
+    snapshot = _preloaded.get(directory)
+    return snapshot if snapshot is not None else load_snapshot(directory, vectors=vectors_are_local())
@@ -0,0 +1,105 @@
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+# One JSON object per request on this logger; set TRACE_LOG=0 to silence it
+logger = logging.getLogger("app.trace")
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.propagate = False
+logger.setLevel(logging.INFO if os.environ.get("TRACE_LOG", "1") != "0" else logging.WARNING)
+
+class Trace:
+    """Wall-clock timings of the stages of one request.
+
+    A stage entered several times (e.g. two embedding calls when an image is
+    attached) accumulates its duration and call count.
+    """
+
+    def __init__(self, request_id: Optional[str] = None):
+        self.request_id = request_id or uuid.uuid4().hex
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.attrs: Dict[str, object] = {}
+        # Upstream token counts per stage: {"generate": {"input": 812, "output": 96}}
+        self.usage: Dict[str, Dict[str, int]] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000.0
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed_ms
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def add_usage(self, name: str, input_tokens: int = 0, output_tokens: int = 0) -> None:
+        counts = self.usage.setdefault(name, {"input": 0, "output": 0})
+        counts["input"] += input_tokens or 0
+        counts["output"] += output_tokens or 0
+
+    def usage_header(self) -> str:
+        """Token usage formatted like Server-Timing, for the X-Token-Usage header."""
+        return ", ".join(f"{name};in={c['input']};out={c['output']}" for name, c in self.usage.items())
+
+    @property
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000.0
+
+    def server_timing(self) -> str:
+        """Stages formatted for the HTTP Server-Timing header."""
+        metrics = [f"{name};dur={ms:.1f}" for name, ms in self.stages.items()]
+        metrics.append(f"total;dur={self.total_ms:.1f}")
+        return ", ".join(metrics)
+
+    def record(self, **fields) -> dict:
+        return {
+            "request_id": self.request_id,
+            **fields,
+            "total_ms": round(self.total_ms, 2),
+            "stages_ms": {name: round(ms, 2) for name, ms in self.stages.items()},
+            "stage_calls": self.counts,
+            **({"usage": self.usage} if self.usage else {}),
+            **self.attrs,
+        }
+
+    def log(self, **fields) -> None:
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(self.record(**fields), default=str))
+
+_current: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+def start_trace(request_id: Optional[str] = None) -> Trace:
+    """Begin a trace for the current context (request)."""
+    trace = Trace(request_id)
+    _current.set(trace)
+    return trace
+
+def record_usage(name: str, input_tokens: int = 0, output_tokens: int = 0) -> None:
+    """Add upstream token counts to the current request's trace; a no-op outside one."""
+    trace = _current.get()
+    if trace is not None:
+        trace.add_usage(name, input_tokens, output_tokens)
+
+@contextmanager
+def stage(name: str):
+    """Time a stage of the current request; a no-op outside a traced request."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    with trace.stage(name):
+        yield
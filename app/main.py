@@ -1,15 +1,35 @@
 from dotenv import load_dotenv
 load_dotenv()
 
+# BLAS_THREADS (or RETRIEVAL_MODE=sharded) caps BLAS threads; must run before numpy is imported
+from app.core.blas import configure_blas
+configure_blas()
+
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from app.api.middleware import BodySizeLimitMiddleware, TracingMiddleware
 from app.api.routes import router as api_router
+from app.core.images import MAX_REQUEST_BYTES
+from app.core.lifecycle import EngineState, warmup_enabled
 import os
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the snapshot in the background so the server accepts liveness probes right away
+    state = EngineState(warmup=warmup_enabled())
+    app.state.engine_state = state
+    loop = asyncio.get_running_loop()
+    app.state.engine_load = loop.run_in_executor(None, state.load)
+    yield
+
 app = FastAPI(
     title="TDS Virtual TA",
     description="A virtual Teaching Assistant for IIT Madras' Tools in Data Science course",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -21,9 +41,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Refuse oversized bodies while they stream in, before multipart/JSON parsing
+app.add_middleware(BodySizeLimitMiddleware, max_body_bytes=MAX_REQUEST_BYTES)
+
+# Outermost: per-stage Server-Timing header and one structured log line per API request
+app.add_middleware(TracingMiddleware, path_prefix="/api")
+
 # Include API routes
 app.include_router(api_router, prefix="/api")
 
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and the event loop is responsive."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: the engine is loaded (and warmed up, if enabled)."""
+    state = app.state.engine_state
+    return JSONResponse(status_code=200 if state.ready else 503, content=state.as_dict())
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -11,4 +11,7 @@ class QuestionResponse(BaseModel):
 
 class QuestionRequest(BaseModel):
     question: str
-    image: Optional[str] = None 
\ No newline at end of file
+    # Base64-encoded image (optionally a data: URL); decoded once at the route
+    image: Optional[str] = None
+    # Corpus to answer from, e.g. "tds/2025-01" (see app/core/registry.py); the default corpus if omitted
+    corpus: Optional[str] = None 
\ No newline at end of file
@@ -1,85 +1,314 @@
-import yaml
-import requests
+"""
+Run the evaluate.yaml cases against the app, concurrently, and report
+correctness together with latency, per-stage timings and token usage.
+
+    python -m app.run_tests                                  # app running at http://127.0.0.1:8000
+    python -m app.run_tests --base-url https://tds-virtual-ta-ieja.onrender.com
+    python -m app.run_tests --in-process                     # call the app through the ASGI transport, no server
+    python -m app.run_tests --in-process --stub-upstream     # ...with bench/stubs.py instead of the real APIs
+    python -m app.run_tests --json-out after.json --compare before.json
+    python -m app.run_tests --in-process --record cassettes/eval.jsonl.gz   # save the upstream calls...
+    python -m app.run_tests --in-process --replay cassettes/eval.jsonl.gz   # ...and rerun offline, same answers
+
+Images are read and base64-encoded once per file. Stage timings come from the
+app's Server-Timing header and token counts from its X-Token-Usage header,
+so both work over HTTP as well as in-process. The exit status is non-zero
+when any case fails.
+"""
+import argparse
+import asyncio
 import base64
+import json
 import os
-from pathlib import Path
+import re
+import sys
+import time
+from typing import Dict, List, Optional
+import httpx
+import numpy as np
+import yaml
 
-def load_image(image_path):
-    """Load and encode image from file path."""
-    if not image_path:
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)  # also runnable as python app/run_tests.py
+
+# USD per million tokens (input, output) for the model behind each stage; override with --prices
+PRICES = {
+    "embed": (0.02, 0.0),       # text-embedding-3-small
+    "generate": (0.10, 0.40),   # gemini-2.0-flash
+    "vision": (0.075, 0.30),    # gemini-1.5-flash
+}
+
+def load_cases(yaml_path: str) -> List[dict]:
+    """evaluate.yaml tests as request payloads plus assertions; each image file is read and encoded once."""
+    with open(yaml_path, "r") as f:
+        config = yaml.safe_load(f)
+    default_asserts = (config.get("defaultTest") or {}).get("assert", [])
+    encoded: Dict[str, str] = {}
+    cases = []
+    for number, test in enumerate(config.get("tests", []), 1):
+        variables = test.get("vars", {})
+        image = variables.get("image")
+        if image and image not in encoded:
+            path = image[len("file://"):] if image.startswith("file://") else image
+            with open(os.path.join(os.path.dirname(os.path.abspath(yaml_path)), path), "rb") as f:
+                encoded[image] = base64.b64encode(f.read()).decode()
+        cases.append({
+            "id": number,
+            "question": variables.get("question", "What does this image show?"),
+            "image": os.path.basename(image) if image else None,
+            "image_base64": encoded[image] if image else None,
+            "asserts": default_asserts + test.get("assert", []),
+        })
+    return cases
+
+def check(result: dict, assertion: dict) -> Optional[str]:
+    """None if the assertion holds, else why it failed."""
+    kind = assertion["type"]
+    if kind == "is-json":
+        if not (isinstance(result.get("answer"), str) and isinstance(result.get("links"), list)
+                and all(isinstance(l, dict) and isinstance(l.get("url"), str) and isinstance(l.get("text"), str)
+                        for l in result["links"])):
+            return "response does not match the {answer, links[{url, text}]} schema"
         return None
-    
-    # Remove file:// prefix if present
-    if image_path.startswith('file://'):
-        image_path = image_path[7:]
-    
-    # Convert to absolute path
-    image_path = os.path.join(os.path.dirname(__file__), image_path)
-    
-    with open(image_path, 'rb') as f:
-        return base64.b64encode(f.read()).decode()
-
-def run_test(test_case, base_url="http://127.0.0.1:8000/api/"):
-    """Run a single test case."""
-    print(f"\nRunning test: {test_case.get('vars', {}).get('question', 'Image-only test')}")
-    
-    # Prepare request data
-    data = {}
-    files = {}
-    
-    if 'question' in test_case['vars']:
-        data['question'] = test_case['vars']['question']
-    
-    if 'image' in test_case['vars']:
-        image_data = load_image(test_case['vars']['image'])
-        if image_data:
-            files['image'] = ('image.png', base64.b64decode(image_data), 'image/png')
-    
-    # Make request
+    text = str(result.get(assertion.get("path", "answer"), ""))
+    value = assertion.get("value")
+    values = value if isinstance(value, list) else [value]
+    if kind == "contains":
+        ok = value in text
+    elif kind == "icontains":
+        ok = value.lower() in text.lower()
+    elif kind == "contains-any":
+        ok = any(v in text for v in values)
+    elif kind == "icontains-any":
+        ok = any(v.lower() in text.lower() for v in values)
+    elif kind == "contains-all":
+        ok = all(v in text for v in values)
+    elif kind == "icontains-all":
+        ok = all(v.lower() in text.lower() for v in values)
+    elif kind == "regex":
+        ok = re.search(value, text) is not None
+    else:
+        return f"unsupported assertion type {kind!r}"
+    return None if ok else f"{kind} {value!r} failed on {assertion.get('path', 'answer')}"
+
+def parse_header_metrics(header: Optional[str]) -> Dict[str, Dict[str, float]]:
+    """Parse "embed;dur=12.3, generate;in=800;out=90" into {name: {param: value}}."""
+    metrics = {}
+    for metric in (header or "").split(","):
+        name, _, params = metric.strip().partition(";")
+        if not name:
+            continue
+        values = {}
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key and value:
+                values[key] = float(value)
+        metrics[name] = values
+    return metrics
+
+def case_cost(usage: Dict[str, Dict[str, float]], prices: Dict[str, tuple]) -> float:
+    cost = 0.0
+    for name, counts in usage.items():
+        input_price, output_price = prices.get(name, (0.0, 0.0))
+        cost += (counts.get("input", 0) * input_price + counts.get("output", 0) * output_price) / 1e6
+    return cost
+
+async def run_case(client: httpx.AsyncClient, case: dict, prices: Dict[str, tuple]) -> dict:
+    record = {"id": case["id"], "question": case["question"], "image": case["image"]}
+    started = time.perf_counter()
     try:
-        response = requests.post(base_url, data=data, files=files)
-        response.raise_for_status()
-        result = response.json()
-        
-        # Run assertions
-        for assertion in test_case.get('assert', []):
-            if assertion['type'] == 'contains':
-                assert assertion['value'] in result[assertion['path']], \
-                    f"Expected '{assertion['value']}' in {assertion['path']}"
-            elif assertion['type'] == 'contains-any':
-                assert any(v in result[assertion['path']] for v in assertion['value']), \
-                    f"Expected any of {assertion['value']} in {assertion['path']}"
-            elif assertion['type'] == 'contains-all':
-                assert all(v in result[assertion['path']] for v in assertion['value']), \
-                    f"Expected all of {assertion['value']} in {assertion['path']}"
-            elif assertion['type'] == 'icontains':
-                assert assertion['value'].lower() in result[assertion['path']].lower(), \
-                    f"Expected '{assertion['value']}' (case-insensitive) in {assertion['path']}"
-        
-        print("✅ Test passed!")
-        return True
-        
-    except Exception as e:
-        print(f"❌ Test failed: {str(e)}")
-        return False
+        response = await client.post("/api/json/", json={"question": case["question"], "image": case["image_base64"]})
+        record["latency_ms"] = (time.perf_counter() - started) * 1000.0
+        record["status"] = response.status_code
+        timing = parse_header_metrics(response.headers.get("server-timing"))
+        record["stages_ms"] = {name: values.get("dur") for name, values in timing.items() if name != "total"}
+        usage = parse_header_metrics(response.headers.get("x-token-usage"))
+        record["usage"] = {name: {"input": int(v.get("in", 0)), "output": int(v.get("out", 0))} for name, v in usage.items()}
+        record["cost_usd"] = case_cost(record["usage"], prices)
+        # Joined another request's run: no stages or tokens of its own, latency is only the wait
+        record["coalesced"] = response.headers.get("x-single-flight") == "joined"
+        if response.status_code != 200:
+            record["failures"] = [f"HTTP {response.status_code}: {response.text[:200]}"]
+        else:
+            result = response.json()
+            record["answer"] = result.get("answer")
+            record["failures"] = [f for f in (check(result, a) for a in case["asserts"]) if f]
+    except httpx.HTTPError as e:
+        record.update(latency_ms=(time.perf_counter() - started) * 1000.0, status=None, stages_ms={}, usage={},
+                      cost_usd=0.0, coalesced=False, failures=[f"{type(e).__name__}: {e}"])
+    record["passed"] = not record["failures"]
+    return record
+
+async def run_suite(client: httpx.AsyncClient, cases: List[dict], parallelism: int, repeat: int,
+                    prices: Dict[str, tuple]) -> List[dict]:
+    """Every case `repeat` times, at most `parallelism` in flight."""
+    semaphore = asyncio.Semaphore(parallelism)
+
+    async def limited(case, run):
+        async with semaphore:
+            record = await run_case(client, case, prices)
+            record["run"] = run
+            mark = "PASS" if record["passed"] else "FAIL"
+            print(f"[{mark}] case {case['id']:>2} run {run} {record['latency_ms']:8.1f}ms  {case['question'][:60]}")
+            return record
+
+    return await asyncio.gather(*(limited(case, run) for run in range(repeat) for case in cases))
+
+async def run_in_process(cases: List[dict], args, prices: Dict[str, tuple]) -> List[dict]:
+    """Start the app's lifespan here and call it through httpx's ASGI transport (no sockets)."""
+    from app.main import app
+    async with app.router.lifespan_context(app):
+        await app.state.engine_load
+        if not app.state.engine_state.ready:
+            raise SystemExit(f"RAG engine failed to load: {app.state.engine_state.error}")
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=args.timeout) as client:
+            return await run_suite(client, cases, args.parallel, args.repeat, prices)
+
+async def run_http(cases: List[dict], args, prices: Dict[str, tuple]) -> List[dict]:
+    limits = httpx.Limits(max_connections=args.parallel, max_keepalive_connections=args.parallel)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        return await run_suite(client, cases, args.parallel, args.repeat, prices)
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    return float(np.percentile(values, p)) if values else None
+
+def summarize(records: List[dict], elapsed: float) -> dict:
+    latencies = [r["latency_ms"] for r in records if r["status"] == 200]
+    stages: Dict[str, List[float]] = {}
+    tokens = {"input": 0, "output": 0}
+    for r in records:
+        for name, ms in r["stages_ms"].items():
+            if ms is not None:
+                stages.setdefault(name, []).append(ms)
+        for counts in r["usage"].values():
+            tokens["input"] += counts["input"]
+            tokens["output"] += counts["output"]
+    return {
+        "cases": len(records),
+        "passed": sum(r["passed"] for r in records),
+        "elapsed_s": elapsed,
+        "latency_ms": {"p50": percentile(latencies, 50), "p95": percentile(latencies, 95), "max": max(latencies, default=None)},
+        "stages_ms": {name: {"p50": percentile(v, 50), "p95": percentile(v, 95)} for name, v in stages.items()},
+        "tokens": tokens,
+        "cost_usd": sum(r["cost_usd"] for r in records),
+        "coalesced": sum(r.get("coalesced", False) for r in records),
+    }
+
+def format_ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.0f}"
+
+def print_report(records: List[dict], summary: dict, baseline: Optional[dict]) -> None:
+    stage_names = list(summary["stages_ms"])
+    before = {}
+    if baseline:
+        for r in baseline["cases"]:
+            before.setdefault(r["id"], []).append(r["latency_ms"])
+    header = f"\n{'case':>4} {'result':<6} {'ms':>7}" + "".join(f" {name[:9]:>9}" for name in stage_names)
+    header += f" {'tokens in':>9} {'out':>6}" + (f" {'vs base':>8}" if baseline else "")
+    print(header)
+    by_case: Dict[int, List[dict]] = {}
+    for r in records:
+        by_case.setdefault(r["id"], []).append(r)
+    for case_id, runs in sorted(by_case.items()):
+        latency = float(np.median([r["latency_ms"] for r in runs]))
+        line = f"{case_id:>4} {'pass' if all(r['passed'] for r in runs) else 'FAIL':<6} {latency:>7.0f}"
+        for name in stage_names:
+            line += f" {format_ms(percentile([r['stages_ms'][name] for r in runs if r['stages_ms'].get(name) is not None], 50)):>9}"
+        line += f" {sum(c['input'] for c in runs[0]['usage'].values()):>9} {sum(c['output'] for c in runs[0]['usage'].values()):>6}"
+        if baseline and case_id in before:
+            line += f" {latency / float(np.median(before[case_id])):>7.2f}x"
+        print(line)
+        for failure in runs[0]["failures"]:
+            print(f"{'':>12}{failure}")
+    latency = summary["latency_ms"]
+    print(f"\n{summary['passed']}/{summary['cases']} passed in {summary['elapsed_s']:.1f}s; "
+          f"latency p50 {format_ms(latency['p50'])}ms p95 {format_ms(latency['p95'])}ms; "
+          f"tokens {summary['tokens']['input']} in / {summary['tokens']['output']} out, "
+          f"est. ${summary['cost_usd']:.4f}")
+    if summary["coalesced"]:
+        print(f"Warning: {summary['coalesced']} requests joined an identical in-flight request, so their latency, "
+              f"stages and tokens are not their own; run the server with SINGLE_FLIGHT=0 (or drop --single-flight) for independent runs")
+    if baseline:
+        old = baseline["summary"]
+        ratio = (latency["p50"] or 0) / old["latency_ms"]["p50"] if old["latency_ms"]["p50"] else float("nan")
+        print(f"Baseline: {old['passed']}/{old['cases']} passed, p50 {format_ms(old['latency_ms']['p50'])}ms "
+              f"(now x{ratio:.2f}), est. ${old['cost_usd']:.4f}")
+
+def start_stubs(latency: str):
+    """Point the app at bench/stubs.py stand-ins (must run before the engine is created)."""
+    from bench.stubs import StubConfig, StubServer, create_stub_app
+    stubs = StubServer(create_stub_app(StubConfig({"embed": latency, "generate": latency, "vision": latency}))).start()
+    os.environ.update({
+        "GEMINI_API_KEY": os.environ.get("GEMINI_API_KEY") or "stub",
+        "AIPIPE_API_KEY": os.environ.get("AIPIPE_API_KEY") or "stub",
+        "EMBEDDING_ENDPOINT": f"{stubs.url}/openai/v1/embeddings",
+        "GEMINI_API_ENDPOINT": stubs.url,
+    })
+    return stubs
 
 def main():
-    # Load test configuration
-    yaml_path = os.path.join(os.path.dirname(__file__), 'evaluate.yaml')
-    with open(yaml_path, 'r') as f:
-        config = yaml.safe_load(f)
-    
-    # Run tests
-    total_tests = len(config['tests'])
-    passed_tests = 0
-    
-    print(f"\nRunning {total_tests} tests...")
-    
-    for test in config['tests']:
-        if run_test(test):
-            passed_tests += 1
-    
-    print(f"\nTest Summary: {passed_tests}/{total_tests} tests passed")
+    parser = argparse.ArgumentParser(description="Run evaluate.yaml against the app with latency and cost reporting")
+    parser.add_argument("--cases", default=os.path.join(REPO_ROOT, "evaluate.yaml"))
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="App to call over HTTP")
+    parser.add_argument("--in-process", action="store_true", help="Call the app in this process via the ASGI transport")
+    parser.add_argument("--stub-upstream", action="store_true",
+                        help="With --in-process: use the offline stand-ins for the embedding proxy and Gemini")
+    parser.add_argument("--stub-latency", default="fixed:50", help="Latency spec for every stub stage (see bench/stubs.py)")
+    parser.add_argument("--record", default=None, metavar="CASSETTE",
+                        help="With --in-process: record the upstream calls to this cassette (app/core/cassette.py)")
+    parser.add_argument("--replay", default=None, metavar="CASSETTE",
+                        help="With --in-process: answer upstream calls from this cassette, offline")
+    parser.add_argument("--replay-latency", type=float, default=0.0,
+                        help="Sleep this multiple of each recorded call's latency when replaying (1 = original)")
+    parser.add_argument("--parallel", type=int, default=8, help="Cases in flight at once")
+    parser.add_argument("--repeat", type=int, default=1, help="Run every case this many times")
+    parser.add_argument("--single-flight", action="store_true",
+                        help="In-process: let identical concurrent requests share one pipeline run (off so every run is measured)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--prices", default=None, help='JSON {stage: [usd_per_1M_in, usd_per_1M_out]} overrides')
+    parser.add_argument("--json-out", default=None, help="Write per-case records and the summary as JSON")
+    parser.add_argument("--compare", default=None, help="Previous --json-out to compare latency and results against")
+    args = parser.parse_args()
+    if (args.stub_upstream or args.record or args.replay) and not args.in_process:
+        parser.error("--stub-upstream, --record and --replay need --in-process (they configure the app before it starts)")
+    if args.record and args.replay:
+        parser.error("--record and --replay are exclusive")
+    if args.record or args.replay:
+        os.environ.update({"UPSTREAM_CASSETTE": args.record or args.replay,
+                           "UPSTREAM_CASSETTE_MODE": "record" if args.record else "replay",
+                           "UPSTREAM_CASSETTE_LATENCY": str(args.replay_latency)})
+
+    if args.in_process:
+        # Otherwise --repeat runs and --parallel duplicates would join each other's flights
+        os.environ["SINGLE_FLIGHT"] = "1" if args.single_flight else "0"
+
+    prices = {**PRICES, **{k: tuple(v) for k, v in json.loads(args.prices or "{}").items()}}
+    cases = load_cases(args.cases)
+    print(f"Running {len(cases)} cases x{args.repeat}, {args.parallel} at a time, "
+          f"{'in-process' if args.in_process else args.base_url}")
+    stubs = start_stubs(args.stub_latency) if args.stub_upstream else None
+    started = time.perf_counter()
+    try:
+        runner = run_in_process if args.in_process else run_http
+        records = asyncio.run(runner(cases, args, prices))
+    finally:
+        if stubs is not None:
+            stubs.stop()
+    summary = summarize(records, time.perf_counter() - started)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(records, summary, baseline)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump({"config": vars(args), "summary": summary, "cases": records}, f, indent=2)
+        print(f"Results written to {args.json_out}")
+    if summary["passed"] < summary["cases"]:
+        sys.exit(1)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
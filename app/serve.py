@@ -0,0 +1,160 @@
+"""
+Production entry point: gunicorn master + uvicorn workers sharing one index.
+
+The embeddings snapshot is loaded in the master before fork (memory-mapped,
+read-only), so every worker maps the same physical pages. Upstream clients
+(GeminiProcessor and its gRPC/HTTP sessions) are still created inside each
+worker by the app's lifespan hook, i.e. after fork.
+
+BLAS thread counts are fixed before numpy is imported: cores divided among
+the workers (and their search threads with RETRIEVAL_MODE=sharded), so the
+processes do not oversubscribe the CPU.
+
+    python -m app.serve --workers 4 --bind 0.0.0.0:$PORT
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import argparse
+import gc
+import os
+import threading
+import time
+from typing import Dict, Optional
+from gunicorn.app.base import BaseApplication
+from app.core.blas import configure_blas, default_blas_threads
+
+SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+def read_memory(pid: int) -> Optional[Dict[str, int]]:
+    """Return the smaps_rollup counters (in kB) for a process, or None if unavailable."""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+    counters = {}
+    for line in lines:
+        key, _, rest = line.partition(":")
+        if key in SMAPS_FIELDS:
+            counters[key] = int(rest.split()[0])
+    return counters
+
+def format_memory(label: str, pid: int, counters: Dict[str, int]) -> str:
+    shared = counters.get("Shared_Clean", 0) + counters.get("Shared_Dirty", 0)
+    private = counters.get("Private_Clean", 0) + counters.get("Private_Dirty", 0)
+    return (f"{label} pid={pid} rss={counters.get('Rss', 0) / 1024:.1f}MiB "
+            f"shared={shared / 1024:.1f}MiB private={private / 1024:.1f}MiB "
+            f"pss={counters.get('Pss', 0) / 1024:.1f}MiB")
+
+def report_memory(server) -> None:
+    """Log RSS vs shared vs private memory for the master and every live worker."""
+    master = read_memory(os.getpid())
+    if master is None:
+        server.log.info("Memory report unavailable (no /proc/<pid>/smaps_rollup on this platform)")
+        return
+    server.log.info(format_memory("master", os.getpid(), master))
+    total_private = 0
+    reported = 0
+    # The arbiter adds and reaps workers on its own thread while this runs: iterate a copy,
+    # and skip a worker that exits between the listing and the read
+    for pid in sorted(list(server.WORKERS)):
+        try:
+            counters = read_memory(pid)
+        except (OSError, ValueError):
+            counters = None
+        if counters is None:
+            continue
+        reported += 1
+        total_private += counters.get("Private_Clean", 0) + counters.get("Private_Dirty", 0)
+        server.log.info(format_memory("worker", pid, counters))
+    server.log.info(f"workers={reported} total_private={total_private / 1024:.1f}MiB")
+
+class TAServer(BaseApplication):
+    """Gunicorn application that preloads the index before forking uvicorn workers."""
+
+    def __init__(self, options: dict, memory_report_interval: float = 60.0):
+        self.options = options
+        self.memory_report_interval = memory_report_interval
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+        self.cfg.set("when_ready", self.when_ready)
+
+    def load(self):
+        # Import here so the app module (and its routes) are loaded once in the master
+        from app.main import app
+        return app
+
+    def when_ready(self, server):
+        if self.memory_report_interval <= 0:
+            return
+
+        def loop():
+            while True:
+                time.sleep(self.memory_report_interval)
+                report_memory(server)
+
+        # Logging handlers reinitialize their locks at fork, so this thread is safe to keep in the master
+        threading.Thread(target=loop, name="memory-report", daemon=True).start()
+
+def default_workers() -> int:
+    return int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the TDS Virtual TA with pre-forked workers")
+    parser.add_argument("--bind", default=f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+    parser.add_argument("--workers", type=int, default=default_workers(),
+                        help="Worker processes (default: $WEB_CONCURRENCY or CPU count)")
+    parser.add_argument("--timeout", type=int, default=120)
+    parser.add_argument("--embeddings-dir", default=None)
+    parser.add_argument("--memory-report-interval", type=float, default=60.0,
+                        help="Seconds between per-worker memory reports (0 disables)")
+    parser.add_argument("--blas-threads", type=int, default=None,
+                        help="BLAS threads per worker (default: $BLAS_THREADS, else cores / workers / search threads)")
+    args = parser.parse_args()
+
+    # Before numpy is imported (by the snapshot modules below), so every worker inherits the limits
+    sharded = os.environ.get("RETRIEVAL_MODE") == "sharded"
+    if sharded and not os.environ.get("SEARCH_THREADS"):
+        os.environ["SEARCH_THREADS"] = str(max(1, (os.cpu_count() or 1) // args.workers))
+    search_threads = int(os.environ["SEARCH_THREADS"]) if sharded else 1
+    blas_threads = args.blas_threads or int(os.environ.get("BLAS_THREADS") or default_blas_threads(args.workers, search_threads))
+    os.environ["BLAS_THREADS"] = str(configure_blas(blas_threads))
+    print(f"BLAS threads per worker: {blas_threads}" + (f", search threads per worker: {search_threads}" if sharded else ""))
+    from app.core.registry import discover_corpora
+    from app.core.snapshot import preload_snapshot
+
+    if args.embeddings_dir:
+        # Workers resolve the same directory, so they pick up the preloaded snapshot
+        os.environ["EMBEDDINGS_DIR"] = os.path.abspath(args.embeddings_dir)
+    started = time.perf_counter()
+    snapshot = preload_snapshot()
+    print(f"Preloaded snapshot {snapshot.directory} ({snapshot.nbytes / 2**20:.1f}MiB of vectors) "
+          f"in {time.perf_counter() - started:.2f}s")
+    # Pinned corpora are never evicted, so share them across workers as well
+    pinned = [name.strip() for name in os.environ.get("CORPUS_PIN", "").split(",") if name.strip()]
+    corpora = discover_corpora(os.environ["CORPORA_DIR"]) if os.environ.get("CORPORA_DIR") else {}
+    for name in pinned:
+        if name in corpora:
+            print(f"Preloaded pinned corpus {name} ({preload_snapshot(corpora[name]).nbytes / 2**20:.1f}MiB of vectors)")
+    # The app imports these on first use; importing them here lets the workers share the modules
+    from app.core.gemini import preload_sdks
+    preload_sdks()
+    # Move everything allocated so far out of the GC's reach so collections in
+    # the workers do not touch (and un-share) the master's pages
+    gc.collect()
+    gc.freeze()
+
+    TAServer({
+        "bind": args.bind,
+        "workers": args.workers,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+        "timeout": args.timeout,
+    }, memory_report_interval=args.memory_report_interval).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Shard server: top-k search over one slice of the snapshot's rows, over HTTP.
+
+Shard i of n serves rows [i * rows / n, (i + 1) * rows / n) of every corpus
+and answers with global row numbers, so a coordinator (RETRIEVAL_MODE=distributed,
+see app/core/distributed.py) can merge shards and look rows up in its own
+metadata. Only the slice's pages of the memory-mapped vectors are touched.
+
+    python -m app.shard --shard 0 --shards 2 --port 9101
+    python -m app.shard --shard 1 --shards 2 --port 9102
+
+POST /search   {"corpus": "course", "query": "<base64 float32>", "k": 3}
+GET  /healthz  slice bounds and row counts
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.core.blas import configure_blas
+configure_blas()
+
+import argparse
+import base64
+import os
+import time
+from typing import Dict, Optional
+import numpy as np
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+from app.core.snapshot import SOURCES, load_corpus, resolve_embeddings_dir
+from app.core.search import build_index
+
+class ShardQuery(BaseModel):
+    corpus: str
+    # Unit query vector as base64 of little-endian float32
+    query: str
+    k: int = 3
+
+def shard_bounds(rows: int, shard: int, shards: int):
+    bounds = np.linspace(0, rows, shards + 1).astype(int)
+    return int(bounds[shard]), int(bounds[shard + 1])
+
+def encode_query(query: np.ndarray) -> str:
+    return base64.b64encode(np.ascontiguousarray(query, dtype="<f4").tobytes()).decode("ascii")
+
+def decode_query(data: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype="<f4")
+
+def create_shard_app(embeddings_dir: Optional[str] = None, shard: int = 0, shards: int = 1, mode: str = "exact",
+                     delay_ms: float = 0.0) -> FastAPI:
+    """An app serving slice `shard` of `shards`; delay_ms adds latency to every search (for testing)."""
+    directory = resolve_embeddings_dir(embeddings_dir)
+    slices: Dict[str, dict] = {}
+    for name in SOURCES:
+        corpus = load_corpus(directory, name)
+        start, stop = shard_bounds(len(corpus), shard, shards)
+        slices[name] = {"start": start, "stop": stop, "total_rows": len(corpus),
+                        "index": build_index(mode, corpus.embeddings[start:stop])}
+    app = FastAPI(title=f"TDS Virtual TA shard {shard}/{shards}")
+
+    @app.get("/healthz")
+    def healthz():
+        return {"status": "ok", "shard": shard, "shards": shards, "mode": mode, "directory": directory,
+                "corpora": {name: {k: v for k, v in s.items() if k != "index"} for name, s in slices.items()}}
+
+    @app.post("/search")
+    def search(request: ShardQuery):
+        # Sync endpoint: FastAPI runs it in its threadpool, so the scan does not block the event loop
+        piece = slices.get(request.corpus)
+        if piece is None:
+            raise HTTPException(status_code=404, detail=f"Unknown corpus {request.corpus!r}")
+        if delay_ms:
+            time.sleep(delay_ms / 1000.0)
+        query = decode_query(request.query)
+        if len(piece["index"]) == 0:
+            indices, scores = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        else:
+            indices, scores = piece["index"].search(query, request.k)
+        return {
+            "shard": shard,
+            "indices": (np.asarray(indices) + piece["start"]).tolist(),
+            "scores": np.asarray(scores, dtype=np.float32).tolist(),
+            "total_rows": piece["total_rows"],
+        }
+
+    return app
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve top-k search for one slice of the snapshot")
+    parser.add_argument("--shard", type=int, required=True, help="This shard's number, from 0")
+    parser.add_argument("--shards", type=int, required=True, help="Number of shards the rows are split into")
+    parser.add_argument("--embeddings-dir", default=None)
+    parser.add_argument("--mode", default=os.environ.get("SHARD_SEARCH_MODE", "exact"),
+                        help="Local search mode for the slice (exact, sharded, int8, ...)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9101)
+    parser.add_argument("--delay-ms", type=float, default=0.0, help="Extra latency per search, to test slow shards")
+    args = parser.parse_args()
+    if not 0 <= args.shard < args.shards:
+        parser.error("--shard must be between 0 and --shards - 1")
+    app = create_shard_app(args.embeddings_dir, args.shard, args.shards, args.mode, args.delay_ms)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,3 @@
-import base64
 from app.core.gemini import GeminiProcessor
 import os
 
@@ -10,13 +9,13 @@ def test_image_embedding():
     image_path = os.path.join(os.path.dirname(__file__), "test_images", "project-tds-virtual-ta-q1.webp")
     
     try:
-        # Read and encode image
+        # Read raw image bytes
         with open(image_path, "rb") as image_file:
-            image_base64 = base64.b64encode(image_file.read()).decode()
+            image_bytes = image_file.read()
         
         # Process image
         print("Processing image...")
-        image_description, image_embedding = processor.process_image(image_base64)
+        image_description, image_embedding = processor.process_image(image_bytes)
         
         # Print results
         print("\nImage Description:")
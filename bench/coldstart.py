@@ -0,0 +1,229 @@
+"""
+Import time, cold start and per-worker memory of the serving process.
+
+Every measurement runs in a fresh interpreter, with the upstream APIs served
+by the local stand-ins (bench/stubs.py):
+
+- import: seconds to import app.main, and which heavy packages it pulled in
+- load: seconds to build the default corpus's engine (EngineState.load)
+- first request: one /api/json/ question answered in-process
+- RSS after each step
+- with --workers N: app.serve's time to its first ready response, and the
+  memory of the master and of each worker (smaps_rollup, Linux only)
+
+python -X importtime also lists the slowest imports of app.main.
+
+    python -m bench.coldstart
+    python -m bench.coldstart --runs 10 --workers 4 --out after.json --compare before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+import numpy as np
+from bench.stubs import StubConfig, StubServer, create_stub_app
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+HEAVY_MODULES = ("pandas", "PIL", "google.generativeai", "grpc", "google.protobuf")
+
+def current_rss_mib() -> Optional[float]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return None
+
+def measure_child() -> dict:
+    """Runs in the child: import, engine load and a first request, timed one after the other."""
+    started = time.perf_counter()
+    import app.main
+    import_s = time.perf_counter() - started
+    result = {"import_s": import_s, "rss_import_mib": current_rss_mib(),
+              "heavy_after_import": [m for m in HEAVY_MODULES if m in sys.modules]}
+
+    from app.core.lifecycle import EngineState
+    state = EngineState()
+    started = time.perf_counter()
+    state.load()
+    result.update(load_s=time.perf_counter() - started, rss_load_mib=current_rss_mib(), status=state.status)
+
+    import httpx
+    application = app.main.app
+    application.state.engine_state = state
+
+    async def ask() -> int:
+        transport = httpx.ASGITransport(app=application)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            response = await client.post("/api/json/", json={"question": "What is the deadline for GA1?"})
+            return response.status_code
+
+    started = time.perf_counter()
+    result["first_request_status"] = asyncio.run(ask())
+    result.update(first_request_s=time.perf_counter() - started, rss_request_mib=current_rss_mib(),
+                  heavy_after_request=[m for m in HEAVY_MODULES if m in sys.modules])
+    return result
+
+def child_env(stub_url: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "GEMINI_API_KEY": "stub",
+        "AIPIPE_API_KEY": "stub",
+        "EMBEDDING_ENDPOINT": f"{stub_url}/openai/v1/embeddings",
+        "GEMINI_API_ENDPOINT": stub_url,
+        "TRACE_LOG": "0",
+        "PYTHONPATH": REPO_ROOT + os.pathsep + env.get("PYTHONPATH", ""),
+    })
+    return env
+
+def run_child(env: Dict[str, str]) -> dict:
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, "-m", "bench.coldstart", "--child"], cwd=REPO_ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process_s"] = time.perf_counter() - started
+    return result
+
+def slowest_imports(env: Dict[str, str], top: int) -> List[dict]:
+    """Third-party packages imported by app.main, by the cumulative time of their largest import."""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"], cwd=REPO_ROOT, env=env,
+                            capture_output=True, text=True, check=True).stderr
+    totals: Dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        package = name.strip().split(".")[0]
+        if cumulative.strip().isdigit() and package != "app":
+            # Nested imports are included in their parent's cumulative time, so take the largest
+            totals[package] = max(totals.get(package, 0), int(cumulative))
+    ranked = sorted(totals.items(), key=lambda item: -item[1])[:top]
+    return [{"package": package, "ms": us / 1000.0} for package, us in ranked]
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def children(pid: int) -> List[int]:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+def measure_workers(env: Dict[str, str], workers: int, settle: float) -> Optional[dict]:
+    """Start app.serve, time its first ready response, then read master and worker memory."""
+    import httpx
+    from app.serve import read_memory
+
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "app.serve", "--bind", f"127.0.0.1:{port}", "--workers", str(workers),
+                                "--memory-report-interval", "0"], cwd=REPO_ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        ready_s = None
+        while time.perf_counter() - started < 120:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/readyz", timeout=2).status_code == 200:
+                    ready_s = time.perf_counter() - started
+                    break
+            except httpx.HTTPError:
+                pass
+            if process.poll() is not None:
+                return None
+            time.sleep(0.05)
+        time.sleep(settle)  # let every worker finish its lifespan startup
+        master = read_memory(process.pid)
+        if master is None:
+            return {"workers": workers, "ready_s": ready_s}
+        worker_memory = [read_memory(pid) for pid in children(process.pid)]
+        worker_memory = [m for m in worker_memory if m]
+
+        def private(m: dict) -> float:
+            return (m.get("Private_Clean", 0) + m.get("Private_Dirty", 0)) / 1024
+
+        return {"workers": workers, "ready_s": ready_s, "master_rss_mib": master["Rss"] / 1024,
+                "worker_private_mib": float(np.mean([private(m) for m in worker_memory])) if worker_memory else None,
+                "worker_pss_mib": float(np.mean([m["Pss"] / 1024 for m in worker_memory])) if worker_memory else None}
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+def summarize(runs: List[dict]) -> dict:
+    keys = ("process_s", "import_s", "load_s", "first_request_s", "rss_import_mib", "rss_load_mib", "rss_request_mib")
+    summary = {key: float(np.median([run[key] for run in runs if run.get(key) is not None])) for key in keys}
+    summary["heavy_after_import"] = runs[-1]["heavy_after_import"]
+    summary["heavy_after_request"] = runs[-1]["heavy_after_request"]
+    return summary
+
+def print_report(report: dict, baseline: Optional[dict] = None) -> None:
+    rows = [("process start to exit", "process_s", "s"), ("import app.main", "import_s", "s"),
+            ("engine load", "load_s", "s"), ("first request", "first_request_s", "s"),
+            ("RSS after import", "rss_import_mib", "MiB"), ("RSS after load", "rss_load_mib", "MiB"),
+            ("RSS after request", "rss_request_mib", "MiB")]
+    summary = report["cold_start"]
+    base = baseline["cold_start"] if baseline else {}
+    print(f"\nMedian of {report['runs']} fresh processes" + (" (vs. baseline)" if baseline else ""))
+    for label, key, unit in rows:
+        line = f"  {label:<24}{summary[key]:>9.3f} {unit}"
+        if key in base and base[key]:
+            line += f"   was {base[key]:.3f} ({summary[key] / base[key] - 1:+.0%})"
+        print(line)
+    print(f"  heavy packages after import:  {', '.join(summary['heavy_after_import']) or '-'}")
+    print(f"  heavy packages after request: {', '.join(summary['heavy_after_request']) or '-'}")
+    if report.get("imports"):
+        print("\nSlowest imports under app.main (cumulative):")
+        for entry in report["imports"]:
+            print(f"  {entry['package']:<28}{entry['ms']:>9.1f} ms")
+    serve = report.get("serve")
+    if serve:
+        line = f"\napp.serve with {serve['workers']} workers: first ready response after {serve['ready_s']:.2f}s"
+        if serve.get("worker_private_mib") is not None:
+            line += (f", master RSS {serve['master_rss_mib']:.1f}MiB, per worker {serve['worker_private_mib']:.1f}MiB private"
+                     f" / {serve['worker_pss_mib']:.1f}MiB PSS")
+        print(line)
+        base_serve = (baseline or {}).get("serve") or {}
+        if base_serve.get("worker_private_mib"):
+            print(f"  baseline: ready after {base_serve['ready_s']:.2f}s, per worker {base_serve['worker_private_mib']:.1f}MiB private")
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time, cold start and per-worker memory")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes to take the median over")
+    parser.add_argument("--workers", type=int, default=0, help="Also start app.serve with this many workers (0 skips)")
+    parser.add_argument("--settle", type=float, default=3.0, help="Seconds to wait after ready before reading memory")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list (0 skips)")
+    parser.add_argument("--out", default=None, help="Write results as JSON to this path")
+    parser.add_argument("--compare", default=None, help="Earlier --out file to compare against")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(measure_child()))
+        return
+
+    stubs = StubServer(create_stub_app(StubConfig({"embed": "fixed:0", "generate": "fixed:0", "vision": "fixed:0"}))).start()
+    try:
+        env = child_env(stubs.url)
+        runs = [run_child(env) for _ in range(args.runs)]
+        report = {"runs": args.runs, "cold_start": summarize(runs),
+                  "imports": slowest_imports(env, args.top) if args.top else [],
+                  "serve": measure_workers(env, args.workers, args.settle) if args.workers else None}
+    finally:
+        stubs.stop()
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Recall vs. dimension report for the reduced retrieval mode (CPU only, no network).
+
+For each projection ("truncate" prefixes, "pca" components) and each width
+this reports, against exact full-width search:
+
+- first-pass recall@k: top-k of the reduced scores alone
+- recall@k after re-scoring the shortlist at full dimension (what the
+  "reduced" mode serves)
+- bytes scanned per query and single-query latency
+
+On the real snapshot each corpus is queried with the rows of the other one
+(forum posts against course chunks and the reverse), which look like real
+questions; --synthetic uses the clustered corpus of bench.retrieval.
+
+    python -m bench.dimensions --embeddings-dir embeddings
+    python -m bench.dimensions --synthetic 100000 --dims 64,128,256,512 --out dims.json
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import Dict, List, Tuple
+import numpy as np
+from app.core.projection import METHODS, make_projection
+from app.core.search import build_index, top_k_rows
+from app.core.snapshot import load_snapshot
+from bench.retrieval import make_queries, recall_at_k, write_corpus
+
+def real_corpora(embeddings_dir: str, queries: int) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    snapshot = load_snapshot(embeddings_dir, mmap=False)
+    course = np.asarray(snapshot.corpora["course"].embeddings)
+    posts = np.asarray(snapshot.corpora["posts"].embeddings)
+    return {"course": (course, posts[:queries]), "posts": (posts, course[:queries])}
+
+def synthetic_corpus(rows: int, queries: int, seed: int) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "corpus.npy")
+        write_corpus(path, rows, 1536, seed)
+        corpus = np.load(path)
+    return {f"synthetic_{rows}": (corpus, make_queries(corpus, queries, seed))}
+
+def bench_width(corpus: np.ndarray, queries: np.ndarray, truth: np.ndarray, method: str, dims: int, k: int) -> dict:
+    started = time.perf_counter()
+    projection = make_projection(method, dims, corpus)
+    index = build_index("reduced", corpus, projection=projection)
+    build_s = time.perf_counter() - started
+    first = np.dot(projection.project_query(queries), index.reduced.T)
+    latencies = []
+    found = []
+    for query in queries:
+        started = time.perf_counter()
+        indices, _ = index.search(query, k)
+        latencies.append((time.perf_counter() - started) * 1000.0)
+        found.append(indices)
+    return {
+        "method": method,
+        "dims": projection.dims,
+        "explained_variance": projection.explained_variance,
+        "first_pass_recall": recall_at_k(top_k_rows(first, k), truth),
+        "recall": recall_at_k(np.asarray(found), truth),
+        "shortlist": index.shortlist_size(k),
+        "scan_bytes": int(index.nbytes),
+        "build_s": build_s,
+        "query_p50_ms": float(np.percentile(latencies, 50)),
+    }
+
+def report(name: str, corpus: np.ndarray, queries: np.ndarray, widths: List[int], k: int) -> List[dict]:
+    exact = build_index("exact", corpus)
+    truth, _ = exact.search_batch(queries, k)
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        exact.search(query, k)
+        latencies.append((time.perf_counter() - started) * 1000.0)
+    exact_p50 = float(np.percentile(latencies, 50))
+    print(f"\n{name}: {corpus.shape[0]} rows x {corpus.shape[1]}, {len(queries)} queries, recall@{k}; "
+          f"exact scans {exact.nbytes / 2**20:.1f}MiB, p50 {exact_p50:.2f}ms")
+    print(f"{'method':<9}{'dims':>6}{'var':>7}{'first':>8}{'rescored':>10}{'scan':>8}{'p50 ms':>9}")
+    results = []
+    for method in METHODS:
+        for dims in widths:
+            if method == "pca" and dims > len(corpus) and any(r["dims"] == len(corpus) for r in results):
+                continue  # capped at the corpus rank: same as the row already reported
+            result = bench_width(corpus, queries, truth, method, dims, k)
+            result.update({"corpus": name, "rows": int(corpus.shape[0]), "exact_scan_bytes": int(exact.nbytes),
+                           "exact_query_p50_ms": exact_p50})
+            results.append(result)
+            variance = result["explained_variance"]
+            print(f"{method:<9}{result['dims']:>6}{'' if variance is None else f'{variance:.0%}':>7}"
+                  f"{result['first_pass_recall']:>8.3f}{result['recall']:>10.3f}"
+                  f"{exact.nbytes / result['scan_bytes']:>7.1f}x{result['query_p50_ms']:>9.2f}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall vs. dimension for the reduced retrieval mode")
+    parser.add_argument("--embeddings-dir", default=None, help="Snapshot to report on (default: the app's)")
+    parser.add_argument("--synthetic", type=int, default=None, help="Use a synthetic corpus of this many rows instead")
+    parser.add_argument("--dims", default="64,128,256,512,768", help="Comma-separated widths")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    widths = [int(d) for d in args.dims.split(",") if d.strip()]
+    if args.synthetic:
+        corpora = synthetic_corpus(args.synthetic, args.queries, args.seed)
+    else:
+        corpora = real_corpora(args.embeddings_dir, args.queries)
+    results = []
+    for name, (corpus, queries) in corpora.items():
+        results.extend(report(name, corpus, queries, widths, args.k))
+    print("\nscan: bytes scanned per query relative to exact search. PCA keeps at most as many "
+          "dimensions as the corpus has rows.")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"k": args.k, "results": results}, f, indent=2)
+        print(f"Results written to {args.out}")
+
+if __name__ == "__main__":
+    main()
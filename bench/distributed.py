@@ -0,0 +1,143 @@
+"""
+Scatter-gather retrieval over local shard servers (app/shard.py).
+
+Starts --shards shard processes on this machine, each serving its slice of
+the snapshot, and queries them through DistributedIndex (what the engine uses
+with RETRIEVAL_MODE=distributed) in three scenarios:
+
+- healthy: all shards answer; results must equal a local exact search
+- slow: one shard sleeps longer than the deadline; answers must still come
+  back on time, from the other shards
+- down: one shard is killed; same as above
+
+Reported per scenario: p50/p95 latency, recall@k against exact search and how
+many queries were answered from fewer than all shards. Exits non-zero when a
+healthy query differs from exact search or a degraded query misses its
+deadline or returns nothing.
+
+    python -m bench.distributed
+    python -m bench.distributed --shards 4 --queries 200 --timeout-ms 150 --out distributed.json
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import List
+import numpy as np
+import requests
+from app.core.distributed import DistributedIndex
+from app.core.search import build_index
+from app.core.snapshot import SOURCES, load_snapshot
+from app.core.tracing import start_trace
+from bench.retrieval import make_queries
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_shard(shard: int, shards: int, embeddings_dir: str, delay_ms: float = 0.0):
+    port = free_port()
+    command = [sys.executable, "-m", "app.shard", "--shard", str(shard), "--shards", str(shards),
+               "--embeddings-dir", embeddings_dir, "--port", str(port), "--delay-ms", str(delay_ms)]
+    process = subprocess.Popen(command, env=dict(os.environ, BLAS_THREADS="1"))
+    return process, f"http://127.0.0.1:{port}"
+
+def wait_ready(url: str, process: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Shard at {url} exited with {process.returncode}")
+        try:
+            if requests.get(f"{url}/healthz", timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Shard at {url} did not become ready in {timeout:.0f}s")
+
+def run_scenario(name: str, indexes: dict, exact: dict, queries: dict, k: int, timeout_ms: float, expect_full: bool) -> dict:
+    latencies, recalls = [], []
+    degraded = failures = 0
+    for corpus, index in indexes.items():
+        for query in queries[corpus]:
+            trace = start_trace()
+            started = time.perf_counter()
+            indices, _ = index.search(query, k)
+            latencies.append((time.perf_counter() - started) * 1000.0)
+            truth, _ = exact[corpus].search(query, k)
+            recalls.append(len(set(indices.tolist()) & set(truth.tolist())) / max(1, len(truth)))
+            degraded += bool(trace.attrs.get("degraded_shards"))
+            if expect_full:
+                failures += indices.tolist() != truth.tolist()
+            else:
+                # A late shard is dropped at the deadline; allow scheduling slack on top
+                failures += len(indices) == 0 or latencies[-1] > timeout_ms * 1.5 + 50
+    p50, p95 = np.percentile(latencies, [50, 95])
+    return {"scenario": name, "queries": len(latencies), "p50_ms": float(p50), "p95_ms": float(p95),
+            "recall": float(np.mean(recalls)), "degraded": degraded, "failures": failures}
+
+def main():
+    parser = argparse.ArgumentParser(description="Scatter-gather retrieval over local shard servers")
+    parser.add_argument("--embeddings-dir", default=None)
+    parser.add_argument("--shards", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=100, help="Queries per corpus and scenario")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--timeout-ms", type=float, default=250.0, help="Per-query shard deadline")
+    parser.add_argument("--slow-ms", type=float, default=None, help="Delay of the slow shard (default: 2x the deadline)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="Write results as JSON to this path")
+    args = parser.parse_args()
+    if args.shards < 2:
+        parser.error("--shards must be at least 2 so a degraded answer is possible")
+
+    snapshot = load_snapshot(args.embeddings_dir)
+    exact = {name: build_index("exact", snapshot.corpora[name].embeddings) for name in SOURCES}
+    queries = {name: make_queries(snapshot.corpora[name].embeddings, args.queries, args.seed) for name in SOURCES}
+    print(f"{snapshot.directory}: " + ", ".join(f"{name} {len(snapshot.corpora[name])} rows" for name in SOURCES)
+          + f"; {args.shards} shards, deadline {args.timeout_ms:.0f}ms\n")
+
+    processes: List[subprocess.Popen] = []
+    results = []
+    try:
+        # The last shard is started twice: normally and with a delay past the deadline
+        shards = [start_shard(i, args.shards, snapshot.directory) for i in range(args.shards)]
+        slow = start_shard(args.shards - 1, args.shards, snapshot.directory, args.slow_ms or 2 * args.timeout_ms)
+        processes = [process for process, _ in shards] + [slow[0]]
+        for process, url in shards + [slow]:
+            wait_ready(url, process)
+        urls = [url for _, url in shards]
+
+        def indexes_for(shard_urls: List[str]) -> dict:
+            return {name: DistributedIndex(name, len(snapshot.corpora[name]), shard_urls, args.timeout_ms) for name in SOURCES}
+
+        healthy = indexes_for(urls)
+        for index in healthy.values():
+            index.warmup()
+        results.append(run_scenario("healthy", healthy, exact, queries, args.k, args.timeout_ms, True))
+        results.append(run_scenario("slow", indexes_for(urls[:-1] + [slow[1]]), exact, queries, args.k, args.timeout_ms, False))
+        shards[-1][0].terminate()
+        shards[-1][0].wait()
+        results.append(run_scenario("down", healthy, exact, queries, args.k, args.timeout_ms, False))
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+                process.wait()
+
+    print(f"{'scenario':<10}{'queries':>8}{'p50 ms':>9}{'p95 ms':>9}{'recall':>8}{'degraded':>10}{'failures':>10}")
+    for r in results:
+        print(f"{r['scenario']:<10}{r['queries']:>8}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['recall']:>8.3f}"
+              f"{r['degraded']:>10}{r['failures']:>10}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"shards": args.shards, "timeout_ms": args.timeout_ms, "results": results}, f, indent=2)
+        print(f"Results written to {args.out}")
+    if any(r["failures"] for r in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+A local fake of the raw markdown host used by scrap/sidebar_to_content_fetcher.py,
+for testing its conditional GETs without GitHub.
+
+- GET /_sidebar.md, GET /{path}.md     fixture markdown with ETag and Last-Modified;
+                                       304 for a matching If-None-Match, or (without
+                                       one) for an If-Modified-Since at or after the
+                                       last change
+- POST /_edit/{path}                   change a page (new ETag, later Last-Modified)
+- POST /_unlink/{path}                 drop a page from the sidebar
+- GET /_stats, POST /_reset            responses per status code
+
+--validators picks which headers are sent (both, etag or last-modified), to
+exercise either revalidation path of the fetcher.
+
+    python -m bench.fake_content --pages 20 --port 9200
+    cd scrap && python sidebar_to_content_fetcher.py --base-url http://127.0.0.1:9200/
+
+--check instead runs the fetcher against the server in a temporary directory
+and verifies 200 on the first run, 304 for everything on the second, a changed
+page fetched and rewritten on the third, and the manifest contents; it exits
+non-zero on any mismatch.
+
+    python -m bench.fake_content --check
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, List, Optional
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from bench.stubs import StubServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scrap"))
+from sidebar_to_content_fetcher import CACHE_FILE, MANIFEST_FILE, ContentFetcher  # noqa: E402
+
+VALIDATORS = ("both", "etag", "last-modified")
+
+class FakeContent:
+    """Deterministic markdown pages and a sidebar linking them; pages can be edited or unlinked."""
+
+    def __init__(self, pages: int = 10, validators: str = "both"):
+        if validators not in VALIDATORS:
+            raise ValueError(f"validators must be one of {VALIDATORS}, got {validators!r}")
+        self.validators = validators
+        self.clock = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        self.files: Dict[str, dict] = {}
+        self.linked: List[str] = []
+        self.counts: Counter = Counter()
+        self.lock = threading.Lock()
+        for i in range(pages):
+            # Some pages live in a subdirectory, as in the course repo
+            path = f"week{i % 3}/page-{i}.md" if i % 4 == 3 else f"page-{i}.md"
+            self._put(path, f"# Page {i}\n\n## Section\n\nContent of page {i}, revision 0.\n")
+            self.linked.append(path)
+        self._write_sidebar()
+
+    def _put(self, path: str, text: str) -> None:
+        # Every change moves the clock a minute, so Last-Modified always increases
+        self.clock += timedelta(minutes=1)
+        self.files[path] = {"text": text, "etag": f'"{hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]}"',
+                            "last_modified": self.clock}
+
+    def _write_sidebar(self) -> None:
+        lines = ["- [Course site](https://tds.s-anand.net/)"]  # external: the fetcher skips it
+        lines += [f"- [{os.path.basename(path)[:-3]}]({path})" for path in self.linked]
+        self._put("_sidebar.md", "\n".join(lines) + "\n")
+
+    def edit(self, path: str) -> None:
+        with self.lock:
+            text = self.files[path]["text"]
+            self._put(path, text + f"\nEdited at {format_datetime(self.clock, usegmt=True)}.\n")
+
+    def unlink(self, path: str) -> None:
+        with self.lock:
+            self.linked.remove(path)
+            self._write_sidebar()
+
+    def respond(self, path: str, if_none_match: Optional[str], if_modified_since: Optional[str]) -> Response:
+        with self.lock:
+            entry = self.files.get(path)
+            if entry is None:
+                self.counts["404"] += 1
+                return Response("Not found", status_code=404)
+            headers = {}
+            if self.validators in ("both", "etag"):
+                headers["ETag"] = entry["etag"]
+            if self.validators in ("both", "last-modified"):
+                headers["Last-Modified"] = format_datetime(entry["last_modified"], usegmt=True)
+            if self.not_modified(entry, if_none_match, if_modified_since):
+                self.counts["304"] += 1
+                return Response(status_code=304, headers=headers)
+            self.counts["200"] += 1
+            return Response(entry["text"], media_type="text/markdown; charset=utf-8", headers=headers)
+
+    def not_modified(self, entry: dict, if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+        # If-None-Match wins over If-Modified-Since when both are sent (RFC 9110, 13.2.2)
+        if if_none_match is not None:
+            if self.validators == "last-modified":
+                return False
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            return "*" in tags or entry["etag"] in tags
+        if if_modified_since is None or self.validators == "etag":
+            return False
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return since is not None and entry["last_modified"] <= since
+
+def create_fake_content_app(site: FakeContent) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/_edit/{path:path}")
+    async def edit(path: str):
+        if path not in site.files:
+            return Response("Not found", status_code=404)
+        site.edit(path)
+        return {"path": path, "etag": site.files[path]["etag"]}
+
+    @app.post("/_unlink/{path:path}")
+    async def unlink(path: str):
+        if path not in site.linked:
+            return Response("Not linked", status_code=404)
+        site.unlink(path)
+        return {"path": path}
+
+    @app.get("/_stats")
+    async def stats():
+        return dict(site.counts)
+
+    @app.post("/_reset")
+    async def reset():
+        site.counts.clear()
+        return {"status": "ok"}
+
+    @app.get("/{path:path}")
+    async def markdown(path: str, request: Request):
+        return site.respond(path, request.headers.get("if-none-match"), request.headers.get("if-modified-since"))
+
+    return app
+
+def run_check(pages: int, validators: str) -> List[str]:
+    """Run the fetcher four times against a fresh site; returns the failed expectations."""
+    site = FakeContent(pages, validators)
+    names = {os.path.basename(path): path for path in site.linked}
+    server = StubServer(create_fake_content_app(site)).start()
+    failures = []
+
+    def expect(what: str, ok: bool) -> None:
+        print(f"  [{'ok' if ok else 'FAIL'}] {what}")
+        if not ok:
+            failures.append(f"{validators}: {what}")
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            out = os.path.join(directory, "content_md")
+
+            def fetch() -> dict:
+                site.counts.clear()
+                return ContentFetcher(server.url + "/", out, max_workers=4).run()
+
+            def manifest() -> dict:
+                with open(os.path.join(out, MANIFEST_FILE), encoding="utf-8") as f:
+                    return json.load(f)
+
+            def local(name: str) -> str:
+                with open(os.path.join(out, name), encoding="utf-8") as f:
+                    return f.read()
+
+            result = fetch()
+            expect(f"first run: all {len(names)} pages added", result["added"] == sorted(names))
+            expect(f"first run: {len(names) + 1} responses with 200", site.counts == Counter({"200": len(names) + 1}))
+            expect("first run: every page written as served",
+                   all(local(name) == site.files[path]["text"] for name, path in names.items()))
+            expect("first run: validators cached", os.path.exists(os.path.join(out, CACHE_FILE)))
+            expect("first run: manifest lists every page", manifest()["changed"] == sorted(names))
+
+            mtimes = {name: os.stat(os.path.join(out, name)).st_mtime_ns for name in names}
+            result = fetch()
+            expect("second run: all pages unchanged", result["unchanged"] == sorted(names) and not result["changed"])
+            expect(f"second run: {len(names) + 1} responses with 304", site.counts == Counter({"304": len(names) + 1}))
+            expect("second run: no page rewritten",
+                   all(os.stat(os.path.join(out, name)).st_mtime_ns == mtimes[name] for name in names))
+
+            edited = sorted(names)[1]
+            site.edit(names[edited])
+            result = fetch()
+            expect(f"third run: only {edited} changed", result["changed"] == [edited] and not result["added"])
+            expect("third run: one 200, the rest 304", site.counts == Counter({"200": 1, "304": len(names)}))
+            expect(f"third run: {edited} holds the new content", local(edited) == site.files[names[edited]]["text"])
+
+            # Downstream consumed the manifest; then a page is edited and another one unlinked
+            os.remove(os.path.join(out, MANIFEST_FILE))
+            removed = sorted(names)[2]
+            site.edit(names[edited])
+            site.unlink(names[removed])
+            result = fetch()
+            expect(f"fourth run: {edited} changed, {removed} removed",
+                   result["changed"] == [edited] and result["removed"] == [removed])
+            expect(f"fourth run: {removed} deleted locally", not os.path.exists(os.path.join(out, removed)))
+            current = manifest()
+            expect("fourth run: manifest lists only this run's changes",
+                   current["changed"] == [edited] and current["removed"] == [removed]
+                   and current["base_url"] == server.url + "/")
+    finally:
+        server.stop()
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve fixture markdown with ETag/Last-Modified for the content fetcher")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--validators", choices=VALIDATORS, default=None,
+                        help="Validator headers to send (default both; --check without it tries each)")
+    parser.add_argument("--check", action="store_true", help="Run the fetcher against the server and verify it")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9200)
+    args = parser.parse_args()
+    if args.check:
+        failures = []
+        for validators in ([args.validators] if args.validators else VALIDATORS):
+            print(f"Validators: {validators}")
+            failures += run_check(args.pages, validators)
+        if failures:
+            print(f"\n{len(failures)} check(s) failed")
+            sys.exit(1)
+        print("\nAll checks passed")
+        return
+    print(f"Sidebar: http://{args.host}:{args.port}/_sidebar.md")
+    uvicorn.run(create_fake_content_app(FakeContent(args.pages, args.validators or "both")), host=args.host, port=args.port,
+                log_level="warning")
+
+if __name__ == "__main__":
+    main()
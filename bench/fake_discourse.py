@@ -0,0 +1,164 @@
+"""
+A local fake of the Discourse JSON API used by scrap/scraper2.py, for testing
+and timing the topic fetcher without a forum login.
+
+- GET /c/{category}.json?page=N        topic listing, 30 topics per page
+- GET /t/{id}.json                     topic with the first 20 posts and the full post id stream
+- GET /t/{id}/posts.json?post_ids[]=   more posts of a topic
+- POST /_reply/{id}                    add a reply (bumps bumped_at and posts_count)
+- GET /_stats, POST /_reset            request counts per endpoint and 429s
+
+Every request sleeps for a latency drawn from a bench.stubs.LatencyModel, and
+requests above --rate per second get a 429 with Retry-After.
+
+    python -m bench.fake_discourse --topics 500 --port 9100
+"""
+import argparse
+import asyncio
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from bench.stubs import LatencyModel
+
+CATEGORY = "courses/tds-kb/34"
+TOPICS_PER_PAGE = 30
+POSTS_CHUNK_SIZE = 20
+WORDS = ["the", "deadline", "GA3", "docker", "answer", "score", "llm", "python", "error", "submit", "pypi.org"]
+
+class FakeForum:
+    """Deterministic topics and posts; replies can be added to simulate activity."""
+
+    def __init__(self, topics: int = 200, max_posts: int = 60, seed: int = 0):
+        self.rng = random.Random(seed)
+        self.topics: Dict[int, dict] = {}
+        self.posts: Dict[int, List[dict]] = {}
+        self.next_post_id = 1
+        start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        for i in range(topics):
+            topic_id = 160000 + i
+            created = start + timedelta(hours=self.rng.randint(0, 24 * 100))
+            self.topics[topic_id] = {
+                "id": topic_id,
+                "title": f"Topic {topic_id} about {self.rng.choice(WORDS)}",
+                "slug": f"topic-{topic_id}",
+                "created_at": created.isoformat().replace("+00:00", "Z"),
+                "views": self.rng.randint(10, 5000),
+                "tags": [self.rng.choice(["ga1", "ga2", "project", "clarification"])],
+                "posters": [{"user": {"username": f"user{self.rng.randint(1, 500)}"}}],
+                "posts_count": 0,
+                "bumped_at": None,
+            }
+            self.posts[topic_id] = []
+            for _ in range(self.rng.randint(1, max_posts)):
+                self.add_reply(topic_id, created)
+
+    def add_reply(self, topic_id: int, when: Optional[datetime] = None) -> dict:
+        topic = self.topics[topic_id]
+        when = when or datetime.now(timezone.utc)
+        posts = self.posts[topic_id]
+        words = " ".join(self.rng.choice(WORDS) for _ in range(self.rng.randint(5, 80)))
+        post = {
+            "id": self.next_post_id,
+            "post_number": len(posts) + 1,
+            "username": f"user{self.rng.randint(1, 500)}",
+            "created_at": (when + timedelta(minutes=len(posts))).isoformat().replace("+00:00", "Z"),
+            "cooked": f"<p>{words}</p><p><a href=\"https://x.org/{self.next_post_id}\">link</a> &amp; more</p>",
+        }
+        self.next_post_id += 1
+        posts.append(post)
+        topic["posts_count"] = len(posts)
+        topic["bumped_at"] = post["created_at"]
+        return post
+
+def create_fake_discourse_app(forum: FakeForum, latency: str = "fixed:0", rate: Optional[float] = None) -> FastAPI:
+    app = FastAPI()
+    model = LatencyModel(latency)
+    rng = random.Random(1)
+    counts: Counter = Counter()
+    lock = threading.Lock()
+    window = {"second": 0, "count": 0}
+
+    async def admit(kind: str):
+        """Count the request, apply the rate limit and sleep the simulated latency."""
+        with lock:
+            counts[kind] += 1
+            if rate:
+                second = int(time.monotonic())
+                if window["second"] != second:
+                    window.update(second=second, count=0)
+                window["count"] += 1
+                if window["count"] > rate:
+                    counts["429"] += 1
+                    return JSONResponse({"errors": ["rate limited"]}, status_code=429, headers={"Retry-After": "1"})
+        await asyncio.sleep(model.sample(rng))
+        return None
+
+    @app.get("/c/{category:path}")
+    async def category(category: str, page: int = 0):
+        if category != f"{CATEGORY}.json":
+            return JSONResponse({"errors": ["not found"]}, status_code=404)
+        limited = await admit("category")
+        if limited:
+            return limited
+        topics = sorted(forum.topics.values(), key=lambda t: t["bumped_at"], reverse=True)
+        page_topics = topics[page * TOPICS_PER_PAGE:(page + 1) * TOPICS_PER_PAGE]
+        return {"topic_list": {"topics": page_topics}}
+
+    @app.get("/t/{topic_file}")
+    async def topic(topic_file: str):
+        topic_id = int(topic_file.removesuffix(".json"))
+        limited = await admit("topic")
+        if limited:
+            return limited
+        posts = forum.posts.get(topic_id)
+        if posts is None:
+            return JSONResponse({"errors": ["not found"]}, status_code=404)
+        return {**forum.topics[topic_id],
+                "post_stream": {"posts": posts[:POSTS_CHUNK_SIZE], "stream": [p["id"] for p in posts]}}
+
+    @app.get("/t/{topic_id}/posts.json")
+    async def topic_posts(topic_id: int, request: Request):
+        limited = await admit("posts")
+        if limited:
+            return limited
+        wanted = {int(i) for i in request.query_params.getlist("post_ids[]")}
+        return {"post_stream": {"posts": [p for p in forum.posts.get(topic_id, []) if p["id"] in wanted]}}
+
+    @app.post("/_reply/{topic_id}")
+    async def reply(topic_id: int):
+        return forum.add_reply(topic_id)
+
+    @app.get("/_stats")
+    async def stats():
+        return dict(counts)
+
+    @app.post("/_reset")
+    async def reset():
+        counts.clear()
+        return {"status": "ok"}
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake Discourse JSON API")
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--max-posts", type=int, default=60)
+    parser.add_argument("--latency", default="lognormal:80,0.4", help="Per-request latency spec (see bench.stubs)")
+    parser.add_argument("--rate", type=float, default=None, help="Requests per second before answering 429")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    args = parser.parse_args()
+    forum = FakeForum(args.topics, args.max_posts, args.seed)
+    print(f"Category listing: http://{args.host}:{args.port}/c/{CATEGORY}.json")
+    uvicorn.run(create_fake_discourse_app(forum, args.latency, args.rate), host=args.host, port=args.port,
+                log_level="warning")
+
+if __name__ == "__main__":
+    main()
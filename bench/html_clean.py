@@ -0,0 +1,108 @@
+"""
+HTML-cleaning throughput benchmark (CPU only, no network).
+
+Cleans Discourse-style "cooked" post HTML (synthetic, or a field of a
+JSON/JSONL records file) with:
+
+- bs4:    BeautifulSoup(html, 'html.parser').get_text(...), one document at a time
+- fast:   scrap/html_clean.py in this process
+- pool:   scrap/html_clean.py over a process pool (--workers)
+
+and checks that every variant returns exactly the BeautifulSoup output.
+
+    python -m bench.html_clean --docs 20000 --workers 4
+    python -m bench.html_clean --input scrap/data/tds_posts.jsonl --field thread_content
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scrap"))
+import html_clean  # noqa: E402
+from records import iter_records  # noqa: E402
+
+WORDS = ["the", "model", "answer", "GA3", "deadline", "pypi.org", "score", "docker", "&amp;", "&lt;code&gt;",
+         "&nbsp;", "&#39;", "é", "data", "llm", "tokens", "submission", "error", "python", "url"]
+
+def cooked_post(rng: random.Random) -> str:
+    """One synthetic post body shaped like Discourse's cooked HTML."""
+    def words(n):
+        return " ".join(rng.choice(WORDS) for _ in range(n))
+    parts = []
+    for _ in range(rng.randint(3, 12)):
+        kind = rng.random()
+        if kind < 0.5:
+            parts.append(f'<p>{words(rng.randint(5, 60))} <a href="https://x.org/t/{rng.randint(1, 9999)}" '
+                         f'class="inline-onebox">topic {rng.randint(1, 99)}</a>.</p>')
+        elif kind < 0.65:
+            parts.append(f'<pre><code class="lang-python">import os\nprint("{words(8)}")\n</code></pre>')
+        elif kind < 0.8:
+            parts.append(f'<aside class="quote" data-post="3"><div class="title"><img src="/a.png" width="20"> '
+                         f'user:</div><blockquote><p>{words(rng.randint(5, 40))}</p></blockquote></aside>')
+        elif kind < 0.9:
+            parts.append(f"<ul><li>{words(12)}</li><li><strong>{words(4)}</strong></li></ul>")
+        else:
+            parts.append(f'<div class="lightbox-wrapper"><img src="/x.png" alt="{words(2)}"><br>'
+                         f"<span>{words(6)}</span></div><!-- lightbox -->")
+    return "\n".join(parts)
+
+def load_docs(args) -> List[str]:
+    if args.input:
+        return [record.get(args.field) or "" for record in iter_records(args.input)]
+    rng = random.Random(args.seed)
+    return [cooked_post(rng) for _ in range(args.docs)]
+
+def timed(name: str, fn, docs: List[str], reference: List[str] = None) -> dict:
+    started = time.perf_counter()
+    out = fn(docs)
+    seconds = time.perf_counter() - started
+    nbytes = sum(len(d.encode("utf-8")) for d in docs)
+    result = {
+        "variant": name,
+        "seconds": seconds,
+        "docs_per_s": len(docs) / seconds if seconds else None,
+        "mb_per_s": nbytes / 2**20 / seconds if seconds else None,
+        "identical": None if reference is None else out == reference,
+    }
+    print(f"{name:<12} {seconds:8.2f}s {result['docs_per_s'] or 0:10.0f} docs/s {result['mb_per_s'] or 0:7.2f} MB/s"
+          + ("" if reference is None else f"  identical={result['identical']}"))
+    return result, out
+
+def main():
+    parser = argparse.ArgumentParser(description="HTML-cleaning throughput benchmark")
+    parser.add_argument("--docs", type=int, default=10000, help="Synthetic documents to generate")
+    parser.add_argument("--input", default=None, help="JSON/JSONL records file to read documents from instead")
+    parser.add_argument("--field", default="thread_content", help="Record field holding the HTML")
+    parser.add_argument("--separator", default=" ")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunksize", type=int, default=html_clean.DEFAULT_CHUNKSIZE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    docs = load_docs(args)
+    print(f"{len(docs)} documents, {sum(map(len, docs)) / 2**20:.1f} MiB, backend={html_clean.backend()}, "
+          f"workers={args.workers}")
+    sep = args.separator
+    results = []
+    result, reference = timed("bs4", lambda d: [html_clean._bs4_get_text(x, sep) if isinstance(x, str) else ""
+                                               for x in d], docs)
+    results.append(result)
+    results.append(timed("fast", lambda d: html_clean.clean_html_batch(d, sep, workers=1), docs, reference)[0])
+    results.append(timed(f"pool x{args.workers}", lambda d: list(html_clean.iter_clean(
+        d, sep, workers=args.workers, chunksize=args.chunksize)), docs, reference)[0])
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"docs": len(docs), "workers": args.workers, "backend": html_clean.backend(),
+                       "results": results}, f, indent=2)
+        print(f"Results written to {args.out}")
+    if not all(r["identical"] in (None, True) for r in results):
+        sys.exit("Output differs from BeautifulSoup")
+
+if __name__ == "__main__":
+    main()
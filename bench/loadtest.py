@@ -0,0 +1,246 @@
+"""
+Open-loop load test for the TDS Virtual TA, fully offline.
+
+Starts local stand-ins for the embeddings proxy and Gemini (bench/stubs.py),
+launches the app pointed at them, then fires the evaluate.yaml questions and
+images at a target request rate. Arrivals are scheduled independently of
+completions (open loop) and latency is measured from the scheduled send time,
+so a stalled server shows up as queueing delay instead of a lower offered load.
+
+    python -m bench.loadtest --rps 20 --duration 30
+    python -m bench.loadtest --rps 50 --app-workers 4 --generate-latency lognormal:900,0.4 --json-out run.json
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+import httpx
+import numpy as np
+import yaml
+from bench.stubs import STAGES, StubConfig, StubServer, create_stub_app
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+PERCENTILES = (50, 95, 99)
+
+def load_cases(yaml_path: str) -> List[dict]:
+    """Turn evaluate.yaml tests into request payloads, reading each image only once."""
+    with open(yaml_path, "r") as f:
+        config = yaml.safe_load(f)
+    cases = []
+    for test in config.get("tests", []):
+        variables = test.get("vars", {})
+        image_bytes = None
+        image = variables.get("image")
+        if image:
+            path = image[len("file://"):] if image.startswith("file://") else image
+            with open(os.path.join(REPO_ROOT, path), "rb") as f:
+                image_bytes = f.read()
+        cases.append({
+            "question": variables.get("question", "What does this image show?"),
+            "image": image_bytes,
+            "image_base64": base64.b64encode(image_bytes).decode() if image_bytes else None,
+        })
+    return cases
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {f"p{p}": None for p in PERCENTILES}
+    points = np.percentile(np.asarray(values), PERCENTILES)
+    return {f"p{p}": float(v) for p, v in zip(PERCENTILES, points)}
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    """Parse "embed;dur=12.3, generate;dur=80.1" into {stage: ms}."""
+    timings = {}
+    for metric in (header or "").split(","):
+        name, _, params = metric.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur" and name:
+                timings[name] = float(value)
+    return timings
+
+class LoadResult:
+    def __init__(self):
+        self.latencies_ms: List[float] = []
+        self.statuses: Dict[str, int] = {}
+        self.server_stages_ms: Dict[str, List[float]] = {}
+
+    def record(self, status: str, latency_ms: Optional[float], server_timing: Optional[Dict[str, float]] = None) -> None:
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if latency_ms is not None:
+            self.latencies_ms.append(latency_ms)
+        for name, ms in (server_timing or {}).items():
+            self.server_stages_ms.setdefault(name, []).append(ms)
+
+async def send(client: httpx.AsyncClient, endpoint: str, case: dict) -> httpx.Response:
+    if endpoint == "multipart":
+        files = {"image": ("image", case["image"], "application/octet-stream")} if case["image"] else None
+        return await client.post("/api/", data={"question": case["question"]}, files=files)
+    return await client.post("/api/json/", json={"question": case["question"], "image": case["image_base64"]})
+
+async def run_load(base_url: str, cases: List[dict], rps: float, duration: float, arrival: str,
+                   endpoint: str, timeout: float, seed: int) -> dict:
+    """Fire requests at rps for duration seconds without waiting for earlier ones to finish."""
+    rng = random.Random(seed)
+    result = LoadResult()
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        loop = asyncio.get_running_loop()
+
+        async def fire(case: dict, scheduled: float):
+            timing = None
+            try:
+                response = await send(client, endpoint, case)
+                status = str(response.status_code)
+                timing = parse_server_timing(response.headers.get("server-timing"))
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latency_ms = (loop.time() - scheduled) * 1000.0
+            ok = status == "200"
+            result.record(status, latency_ms if ok else None, timing if ok else None)
+
+        tasks = []
+        start = loop.time()
+        offset = 0.0
+        i = 0
+        while offset < duration:
+            scheduled = start + offset
+            delay = scheduled - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(fire(cases[i % len(cases)], scheduled)))
+            i += 1
+            offset += rng.expovariate(rps) if arrival == "poisson" else 1.0 / rps
+        await asyncio.gather(*tasks)
+        elapsed = loop.time() - start
+
+    ok = result.statuses.get("200", 0)
+    return {
+        "sent": len(tasks),
+        "ok": ok,
+        "statuses": result.statuses,
+        "elapsed_s": elapsed,
+        "offered_rps": len(tasks) / duration,
+        "throughput_rps": ok / elapsed if elapsed else 0.0,
+        "request": percentiles(result.latencies_ms),
+        "server_stages": {name: {"count": len(v), **percentiles(v)} for name, v in result.server_stages_ms.items()},
+    }
+
+def start_app(stub_url: str, port: int, workers: int, single_flight: bool = False) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "SINGLE_FLIGHT": "1" if single_flight else "0",
+        "GEMINI_API_KEY": "stub",
+        "AIPIPE_API_KEY": "stub",
+        "EMBEDDING_ENDPOINT": f"{stub_url}/openai/v1/embeddings",
+        "GEMINI_API_ENDPOINT": stub_url,
+        "PYTHONPATH": REPO_ROOT + os.pathsep + env.get("PYTHONPATH", ""),
+    })
+    if workers > 1:
+        cmd = [sys.executable, "-m", "app.serve", "--bind", f"127.0.0.1:{port}",
+               "--workers", str(workers), "--memory-report-interval", "0"]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+               "--port", str(port), "--log-level", "warning"]
+    return subprocess.Popen(cmd, cwd=REPO_ROOT, env=env)
+
+def wait_ready(base_url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/readyz", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"App at {base_url} did not become ready within {timeout}s")
+
+def format_ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+def print_report(report: dict) -> None:
+    load = report["load"]
+    print(f"\nSent {load['sent']} requests in {load['elapsed_s']:.1f}s "
+          f"(offered {load['offered_rps']:.1f} rps), {load['ok']} ok, "
+          f"throughput {load['throughput_rps']:.1f} rps")
+    print(f"Statuses: {load['statuses']}")
+    print(f"\n{'stage':<14} {'count':>7} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage, row in report["stages"].items():
+        print(f"{stage:<14} {row['count']:>7} {row['errors']:>7} "
+              f"{format_ms(row['p50']):>9} {format_ms(row['p95']):>9} {format_ms(row['p99']):>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline open-loop load test with upstream stand-ins")
+    parser.add_argument("--rps", type=float, default=10.0, help="Target arrival rate")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of load")
+    parser.add_argument("--arrival", choices=("poisson", "constant"), default="poisson")
+    parser.add_argument("--endpoint", choices=("json", "multipart"), default="json")
+    parser.add_argument("--cases", default=os.path.join(REPO_ROOT, "evaluate.yaml"))
+    parser.add_argument("--target", help="Base URL of an already running app (skips starting one)")
+    parser.add_argument("--app-port", type=int, default=8090)
+    parser.add_argument("--app-workers", type=int, default=1, help=">1 launches app.serve with that many workers")
+    parser.add_argument("--embed-latency", default="lognormal:80,0.5", help="Latency spec in ms, e.g. fixed:50")
+    parser.add_argument("--generate-latency", default="lognormal:900,0.4")
+    parser.add_argument("--vision-latency", default="lognormal:1500,0.4")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Failure probability for every stub stage")
+    parser.add_argument("--single-flight", action="store_true",
+                        help="Let identical concurrent requests share one pipeline run (off by default: the few "
+                             "replayed questions would coalesce far more than real traffic)")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json-out", help="Write the full report as JSON to this path")
+    args = parser.parse_args()
+
+    cases = load_cases(args.cases)
+    config = StubConfig(
+        latencies={"embed": args.embed_latency, "generate": args.generate_latency, "vision": args.vision_latency},
+        error_rates={stage: args.error_rate for stage in STAGES},
+        seed=args.seed,
+    )
+    stubs = StubServer(create_stub_app(config)).start()
+    print(f"Upstream stubs listening on {stubs.url}")
+
+    app_process = None
+    base_url = args.target
+    try:
+        if base_url is None:
+            base_url = f"http://127.0.0.1:{args.app_port}"
+            app_process = start_app(stubs.url, args.app_port, args.app_workers, args.single_flight)
+        wait_ready(base_url)
+        httpx.post(f"{stubs.url}/_reset")
+
+        load = asyncio.run(run_load(base_url, cases, args.rps, args.duration, args.arrival,
+                                    args.endpoint, args.timeout, args.seed))
+        stage_stats = httpx.get(f"{stubs.url}/_stats").json()
+    finally:
+        if app_process is not None:
+            app_process.terminate()
+            app_process.wait(timeout=30)
+        stubs.stop()
+
+    # Client-observed latency, the app's own Server-Timing stages, then what the stubs measured
+    stages = {"request": {"count": load["ok"], "errors": load["sent"] - load["ok"], **load["request"]}}
+    for name, row in load["server_stages"].items():
+        stages[f"app:{name}"] = {"errors": 0, **row}
+    for stage in STAGES:
+        latencies = stage_stats[stage]["latencies_ms"]
+        stages[f"stub:{stage}"] = {"count": len(latencies), "errors": stage_stats[stage]["errors"], **percentiles(latencies)}
+    report = {
+        "config": vars(args),
+        "load": {k: v for k, v in load.items() if k not in ("request", "server_stages")},
+        "stages": stages,
+    }
+    print_report(report)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json_out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+Recall vs. latency sweep over retrieval configurations, on labelled questions (CPU only).
+
+Labels are questions with the URLs that should come back:
+
+- bench/relevance.yaml: the evaluate.yaml questions, labelled by hand. Their
+  query vectors come from the embedding API, so they are used only once
+  cached (run with --embed once; needs AIPIPE_API_KEY, and GEMINI_API_KEY for
+  the image questions). Vectors are cached in bench/.relevance_embeddings.npz.
+- forum threads from scrap/data/tds_posts.json (those with an accepted answer
+  when the scrape recorded it, else those with replies): the thread title is
+  the query and the thread URL is the answer. The thread's metadata chunk
+  quotes the title verbatim, so it is left out of the results; the thread's
+  posts must be found on their content. Title vectors are cached with the
+  others (--embed).
+
+Each configuration (snapshot x retrieval mode x top_k x image weight) runs the
+same two-corpus search and merge as RAGEngine.get_relevant_context and
+reports recall@k, MRR, hit rate, query latency and the bytes each query scans,
+then marks the configurations on the Pareto frontier (nothing else is at
+least as good on recall, MRR, latency and memory and better on one).
+
+    python -m bench.pareto
+    python -m bench.pareto --embed                          # first run: cache the evaluate.yaml query vectors
+    python -m bench.pareto --modes exact,int8,reduced:pca:128 --top-k 3,5 --out pareto.json
+    python -m bench.pareto --embeddings-dir snapshots/a --embeddings-dir snapshots/b   # e.g. two chunk sizes
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+import yaml
+from app.core.rag import combine_queries
+from app.core.snapshot import build_corpus_index, load_snapshot
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+RELEVANCE_PATH = os.path.join(os.path.dirname(__file__), "relevance.yaml")
+EMBEDDING_CACHE = os.path.join(os.path.dirname(__file__), ".relevance_embeddings.npz")
+POSTS_PATH = os.path.join(REPO_ROOT, "scrap", "data", "tds_posts.json")
+DEFAULT_MODES = "exact,int8,reduced:pca:64,reduced:pca:128,reduced:pca:256,reduced:truncate:256,reduced:truncate:512"
+
+def cache_key(kind: str, data: bytes) -> str:
+    return f"{kind}_{hashlib.sha1(data).hexdigest()}"
+
+def load_cache(path: str) -> Dict[str, np.ndarray]:
+    if not os.path.exists(path):
+        return {}
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+def embed_labels(labels: List[dict], cache_path: str, embed: bool) -> None:
+    """Attach cached query vectors to the hand-written labels, calling the APIs for missing ones if embed."""
+    cache = load_cache(cache_path)
+    gemini = None
+    changed = False
+    for label in labels:
+        keys = {"text": cache_key("text", label["question"].encode())}
+        image_bytes = None
+        if label.get("image"):
+            with open(os.path.join(REPO_ROOT, label["image"]), "rb") as f:
+                image_bytes = f.read()
+            keys["image"] = cache_key("image", image_bytes)
+        if embed and any(key not in cache for key in keys.values()):
+            if gemini is None:
+                from app.core.gemini import GeminiProcessor
+                gemini = GeminiProcessor()
+            if keys["text"] not in cache:
+                cache[keys["text"]] = np.asarray(gemini.get_embedding(label["question"]), dtype=np.float32)
+            if image_bytes is not None and keys["image"] not in cache:
+                cache[keys["image"]] = np.asarray(gemini.process_image(image_bytes)[1], dtype=np.float32)
+            changed = True
+        label["query"] = cache.get(keys["text"])
+        label["image_query"] = cache.get(keys["image"]) if "image" in keys else None
+    if changed:
+        tmp = f"{cache_path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, **cache)
+        os.replace(tmp, cache_path)
+
+def load_relevance(path: str) -> List[dict]:
+    with open(path) as f:
+        entries = yaml.safe_load(f).get("labels", [])
+    return [{"source": "evaluate", "question": entry["question"], "image": entry.get("image"),
+             "relevant": set(entry["relevant"])} for entry in entries]
+
+def load_posts(path: str) -> List[dict]:
+    with open(path) as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+def forum_labels(snapshot, posts_path: str, limit: Optional[int]) -> List[dict]:
+    """One label per answered thread: its title as the question, the thread URL as the answer (no vectors yet)."""
+    if not os.path.exists(posts_path):
+        print(f"No forum data at {posts_path}; skipping forum labels")
+        return []
+    records = load_posts(posts_path)
+    if any("accepted_answer" in record for record in records):
+        threads = [record for record in records if record.get("accepted_answer")]
+        kind = "accepted answer"
+    else:
+        threads = [record for record in records if (record.get("replies") or 0) > 0]
+        kind = "replies (this scrape has no accepted-answer flags)"
+    posts = snapshot.corpora["posts"]
+    if "path" not in posts.metadata.columns:
+        return []
+    # Rows that restate the title (forum/metadata: "Title: ...\nTags: ...") would match the query by construction
+    title_rows: Dict[str, Set[int]] = {}
+    for row, (url, path) in enumerate(zip(posts.metadata.values("url"), posts.metadata.values("path"))):
+        if path == "forum/metadata":
+            title_rows.setdefault(url, set()).add(row)
+    indexed = set(posts.metadata.values("url"))
+    labels = []
+    for record in threads[:limit]:
+        if record.get("url") not in indexed or not record.get("title"):
+            continue
+        labels.append({"source": "forum", "question": record["title"], "image": None, "relevant": {record["url"]},
+                       "exclude": {"posts": title_rows.get(record["url"], set())}})
+    print(f"{len(labels)} forum labels from threads with {kind}")
+    return labels
+
+def retrieve(indexes: dict, urls: dict, query: np.ndarray, top_k: int,
+             exclude: Optional[Dict[str, Set[int]]] = None) -> List[str]:
+    """Ranked URLs, searched and merged the way RAGEngine.get_relevant_context does it.
+
+    exclude maps a corpus to rows left out of its results; the search over-fetches
+    by that many rows so top_k results remain.
+    """
+    results = []
+    for name, index in indexes.items():
+        skip = (exclude or {}).get(name, set())
+        indices, scores = index.search(query, top_k + len(skip))
+        kept = [(float(score), urls[name][i]) for i, score in zip(indices, scores) if int(i) not in skip]
+        results.extend(kept[:top_k])
+    results.sort(key=lambda item: item[0], reverse=True)
+    return [url for _, url in results[:top_k]]
+
+def score_ranking(ranked: List[str], relevant: set) -> Tuple[float, float, float]:
+    """(recall, reciprocal rank, hit) of one ranked URL list."""
+    found = set(ranked) & relevant
+    rank = next((position for position, url in enumerate(ranked, 1) if url in relevant), None)
+    return len(found) / len(relevant), (1.0 / rank if rank else 0.0), float(bool(found))
+
+def parse_mode(spec: str) -> Tuple[str, dict]:
+    """"exact", "int8" or "reduced:<pca|truncate>:<dims>" -> (mode, build_corpus_index options)."""
+    parts = spec.split(":")
+    if parts[0] == "reduced":
+        return "reduced", {"method": parts[1] if len(parts) > 1 else "pca", "dims": int(parts[2]) if len(parts) > 2 else 256}
+    return parts[0], {}
+
+def run_config(indexes: dict, urls: dict, labels: List[dict], top_k: int, image_weight: float, repeat: int) -> dict:
+    recalls, ranks, hits, latencies = [], [], [], []
+    for label in labels:
+        query = combine_queries(label["query"], label["image_query"], image_weight)
+        for _ in range(repeat):
+            started = time.perf_counter()
+            ranked = retrieve(indexes, urls, query, top_k, label.get("exclude"))
+            latencies.append((time.perf_counter() - started) * 1000.0)
+        recall, rank, hit = score_ranking(ranked, label["relevant"])
+        recalls.append(recall)
+        ranks.append(rank)
+        hits.append(hit)
+    by_source = {}
+    for source in sorted({label["source"] for label in labels}):
+        picked = [r for r, label in zip(recalls, labels) if label["source"] == source]
+        by_source[source] = float(np.mean(picked))
+    return {
+        "recall": float(np.mean(recalls)),
+        "mrr": float(np.mean(ranks)),
+        "hit_rate": float(np.mean(hits)),
+        "recall_by_source": by_source,
+        "query_p50_ms": float(np.percentile(latencies, 50)),
+        "query_p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+def pareto_front(results: List[dict]) -> None:
+    """Set "pareto" on each result: True unless another is at least as good everywhere and better somewhere."""
+    def better_or_equal(a, b):
+        return (a["recall"] >= b["recall"] and a["mrr"] >= b["mrr"]
+                and a["query_p50_ms"] <= b["query_p50_ms"] and a["scan_bytes"] <= b["scan_bytes"])
+    for result in results:
+        result["pareto"] = not any(
+            other is not result and better_or_equal(other, result) and not better_or_equal(result, other)
+            for other in results)
+
+def sweep(embeddings_dir: Optional[str], args, evaluate_labels: List[dict]) -> List[dict]:
+    snapshot = load_snapshot(embeddings_dir)
+    urls = {name: corpus.metadata.values("url") for name, corpus in snapshot.corpora.items()}
+    labels = [label for label in evaluate_labels if label["query"] is not None]
+    threads = forum_labels(snapshot, args.posts, args.forum_limit)
+    embed_labels(threads, EMBEDDING_CACHE, args.embed)
+    if any(label["query"] is None for label in threads):
+        print(f"{sum(label['query'] is None for label in threads)} of {len(threads)} forum titles have no cached "
+              f"query vector; run once with --embed to include them")
+    labels += [label for label in threads if label["query"] is not None]
+    if not labels:
+        raise SystemExit("No labels with query vectors; run once with --embed (needs AIPIPE_API_KEY)")
+    has_images = any(label["image_query"] is not None for label in labels)
+    weights = [float(w) for w in args.image_weights.split(",")] if has_images else [0.5]
+    print(f"\n{snapshot.directory}: {len(labels)} labels "
+          f"({sum(l['source'] == 'evaluate' for l in labels)} evaluate.yaml, {sum(l['source'] == 'forum' for l in labels)} forum)")
+
+    results = []
+    for spec in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        mode, options = parse_mode(spec)
+        started = time.perf_counter()
+        indexes = {name: build_corpus_index(snapshot.directory, corpus, mode, **options)
+                   for name, corpus in snapshot.corpora.items()}
+        build_s = time.perf_counter() - started
+        scan_bytes = sum(int(index.nbytes) for index in indexes.values())
+        for top_k in [int(k) for k in args.top_k.split(",") if k.strip()]:
+            for weight in weights:
+                result = run_config(indexes, urls, labels, top_k, weight, args.repeat)
+                result.update({"snapshot": snapshot.directory, "mode": spec, "top_k": top_k,
+                               "image_weight": weight if has_images else None, "scan_bytes": scan_bytes,
+                               "build_s": build_s, "labels": len(labels)})
+                results.append(result)
+    return results
+
+def print_table(results: List[dict]) -> None:
+    multiple_snapshots = len({r["snapshot"] for r in results}) > 1
+    print(f"\n{'':1} {'mode':<22}{'k':>3}{'img w':>6}{'recall':>8}{'mrr':>7}{'hit':>7}{'p50 ms':>9}{'p95 ms':>9}{'scan MiB':>10}"
+          + ("  snapshot" if multiple_snapshots else ""))
+    for r in results:
+        weight = "-" if r["image_weight"] is None else f"{r['image_weight']:.2f}"
+        line = (f"{'*' if r['pareto'] else ' '} {r['mode']:<22}{r['top_k']:>3}{weight:>6}{r['recall']:>8.3f}{r['mrr']:>7.3f}"
+                f"{r['hit_rate']:>7.3f}{r['query_p50_ms']:>9.3f}{r['query_p95_ms']:>9.3f}{r['scan_bytes'] / 2**20:>10.2f}")
+        print(line + (f"  {os.path.basename(r['snapshot'])}" if multiple_snapshots else ""))
+    print("\n* on the Pareto frontier of recall, MRR, p50 latency and bytes scanned. Frontier by latency:")
+    for r in sorted((r for r in results if r["pareto"]), key=lambda r: r["query_p50_ms"]):
+        print(f"  {r['query_p50_ms']:7.3f}ms recall {r['recall']:.3f} mrr {r['mrr']:.3f}  {r['mode']} k={r['top_k']}"
+              + ("" if r["image_weight"] is None else f" image_weight={r['image_weight']}"))
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall vs. latency sweep over retrieval configurations")
+    parser.add_argument("--embeddings-dir", action="append", default=None,
+                        help="Snapshot to sweep; repeat to compare snapshots (e.g. built with different chunk sizes)")
+    parser.add_argument("--modes", default=DEFAULT_MODES, help="Comma-separated: exact, int8, reduced:<pca|truncate>:<dims>")
+    parser.add_argument("--top-k", default="3,5,10", help="Comma-separated top_k values")
+    parser.add_argument("--image-weights", default="0.3,0.5,0.7", help="Image share of the query (image labels only)")
+    parser.add_argument("--labels", default=RELEVANCE_PATH, help="Hand-labelled questions")
+    parser.add_argument("--posts", default=POSTS_PATH, help="Scraped forum threads for the forum labels")
+    parser.add_argument("--forum-limit", type=int, default=None, help="Use at most this many forum threads")
+    parser.add_argument("--embed", action="store_true", help="Call the APIs for label vectors missing from the cache")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed searches per label")
+    parser.add_argument("--out", default=None, help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    evaluate_labels = load_relevance(args.labels)
+    embed_labels(evaluate_labels, EMBEDDING_CACHE, args.embed)
+    missing = sum(label["query"] is None for label in evaluate_labels)
+    if missing:
+        print(f"{missing} of {len(evaluate_labels)} evaluate.yaml labels have no cached query vector; "
+              f"run once with --embed to include them")
+
+    results = []
+    for embeddings_dir in args.embeddings_dir or [None]:
+        results.extend(sweep(embeddings_dir, args, evaluate_labels))
+    pareto_front(results)
+    print_table(results)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+        print(f"Results written to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Retrieval microbenchmarks on synthetic 1536-d corpora (CPU only, no network).
+
+For every corpus size and every mode in app.core.search.SEARCH_MODES this
+measures load time (full read and mmap), index build time, index and process
+memory, single-query latency, batched throughput and recall@k against exact
+search, and writes the results as JSON so runs can be compared across commits.
+
+    python -m bench.retrieval --sizes 1000,10000,100000
+    python -m bench.retrieval --sizes 1000000 --max-gb 8 --out after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from typing import Dict, List, Optional
+import numpy as np
+from app.core.search import SEARCH_MODES, build_index
+
+DIM = 1536
+GEN_CHUNK_ROWS = 50_000
+
+def current_rss() -> Optional[int]:
+    """Resident set size of this process in bytes (Linux), else None."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def write_corpus(path: str, rows: int, dim: int, seed: int, clusters: int = 256) -> None:
+    """Write a clustered, unit-normalized float32 corpus to an .npy file in bounded memory."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    out = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(rows, dim))
+    for start in range(0, rows, GEN_CHUNK_ROWS):
+        stop = min(start + GEN_CHUNK_ROWS, rows)
+        labels = rng.integers(0, clusters, stop - start)
+        block = centers[labels] + rng.standard_normal((stop - start, dim), dtype=np.float32)
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        out[start:stop] = block
+    out.flush()
+    del out
+
+def make_queries(corpus: np.ndarray, count: int, seed: int) -> np.ndarray:
+    """Perturbed corpus rows, so every query has genuine near neighbours."""
+    rng = np.random.default_rng(seed + 1)
+    picks = rng.integers(0, len(corpus), count)
+    queries = np.asarray(corpus[picks], dtype=np.float32) + 0.5 * rng.standard_normal((count, corpus.shape[1]), dtype=np.float32) / np.sqrt(corpus.shape[1])
+    # float32 like the engine's queries (numpy 2 would promote through the np.sqrt scalar above)
+    return (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f.tolist()) & set(t.tolist())) for f, t in zip(found, truth))
+    return hits / truth.size
+
+def bench_mode(mode: str, corpus: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int, batch: int) -> dict:
+    rss_before = current_rss()
+    started = time.perf_counter()
+    index = build_index(mode, corpus)
+    build_s = time.perf_counter() - started
+    rss_after = current_rss()
+
+    latencies = []
+    found = []
+    for query in queries:
+        started = time.perf_counter()
+        indices, _ = index.search(query, k)
+        latencies.append((time.perf_counter() - started) * 1000.0)
+        found.append(indices)
+
+    started = time.perf_counter()
+    for start in range(0, len(queries), batch):
+        index.search_batch(queries[start:start + batch], k)
+    batch_s = time.perf_counter() - started
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "mode": mode,
+        "build_s": build_s,
+        "index_bytes": int(index.nbytes),
+        "rss_delta_bytes": None if rss_before is None else rss_after - rss_before,
+        "query_p50_ms": float(p50),
+        "query_p95_ms": float(p95),
+        "query_p99_ms": float(p99),
+        "batch_qps": len(queries) / batch_s if batch_s else None,
+        f"recall_at_{k}": recall_at_k(np.asarray(found), truth),
+    }
+
+def bench_size(rows: int, modes: List[str], args, workdir: str) -> List[dict]:
+    path = os.path.join(workdir, f"corpus_{rows}.npy")
+    started = time.perf_counter()
+    write_corpus(path, rows, args.dim, args.seed)
+    generate_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    mapped = np.load(path, mmap_mode="r")
+    np.dot(mapped, np.ones(args.dim, dtype=np.float32))  # first scan faults the pages in
+    load_mmap_s = time.perf_counter() - started
+    del mapped
+
+    started = time.perf_counter()
+    corpus = np.load(path)
+    load_s = time.perf_counter() - started
+    rss_loaded = current_rss()
+
+    queries = make_queries(corpus, args.queries, args.seed)
+    truth, _ = build_index("exact", corpus).search_batch(queries, args.k)
+
+    results = []
+    for mode in modes:
+        result = bench_mode(mode, corpus, queries, truth, args.k, args.batch)
+        result.update({"rows": rows, "dim": args.dim, "generate_s": generate_s, "load_s": load_s,
+                       "load_mmap_first_scan_s": load_mmap_s, "rss_after_load_bytes": rss_loaded})
+        results.append(result)
+        print(f"rows={rows:>8} mode={mode:<10} p50={result['query_p50_ms']:8.2f}ms "
+              f"p99={result['query_p99_ms']:8.2f}ms batch={result['batch_qps'] or 0:9.1f}qps "
+              f"recall@{args.k}={result[f'recall_at_{args.k}']:.3f} index={result['index_bytes'] / 2**20:.1f}MiB")
+    del corpus
+    os.remove(path)
+    return results
+
+def compare(results: List[dict], baseline_path: str, k: int) -> None:
+    """Print latency/throughput ratios against a previous run (lower/higher is better)."""
+    with open(baseline_path) as f:
+        baseline = {(r["rows"], r["mode"]): r for r in json.load(f)["results"]}
+    print(f"\nComparison with {baseline_path}:")
+    for result in results:
+        old = baseline.get((result["rows"], result["mode"]))
+        if old is None:
+            continue
+        p50 = result["query_p50_ms"] / old["query_p50_ms"] if old["query_p50_ms"] else float("nan")
+        qps = (result["batch_qps"] or 0) / old["batch_qps"] if old.get("batch_qps") else float("nan")
+        key = f"recall_at_{k}"
+        print(f"rows={result['rows']:>8} mode={result['mode']:<10} p50 x{p50:.2f} batch_qps x{qps:.2f} "
+              f"recall {old.get(key, float('nan')):.3f} -> {result[key]:.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval microbenchmarks on synthetic corpora")
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000", help="Comma-separated corpus row counts")
+    parser.add_argument("--modes", default=",".join(SEARCH_MODES), help="Comma-separated retrieval modes")
+    parser.add_argument("--dim", type=int, default=DIM)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--batch", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-gb", type=float, default=4.0, help="Skip corpora larger than this many GiB")
+    parser.add_argument("--workdir", default=None, help="Where to write the synthetic .npy files")
+    parser.add_argument("--out", default=None, help="JSON results path (default: bench-retrieval-<commit>.json)")
+    parser.add_argument("--compare", default=None, help="Previous results JSON to compare against")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    commit = git_commit()
+    results: List[dict] = []
+    skipped: Dict[int, str] = {}
+    with tempfile.TemporaryDirectory(dir=args.workdir) as workdir:
+        for rows in sizes:
+            size_gb = rows * args.dim * 4 / 2**30
+            if size_gb > args.max_gb:
+                skipped[rows] = f"{size_gb:.1f} GiB exceeds --max-gb {args.max_gb}"
+                print(f"Skipping rows={rows}: {skipped[rows]}")
+                continue
+            results.extend(bench_size(rows, modes, args, workdir))
+
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "k": args.k,
+            "queries": args.queries,
+            "batch": args.batch,
+            "skipped": skipped,
+        },
+        "results": results,
+    }
+    out = args.out or f"bench-retrieval-{commit or 'local'}.json"
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {out}")
+    if args.compare:
+        compare(results, args.compare, args.k)
+
+if __name__ == "__main__":
+    main()
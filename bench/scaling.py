@@ -0,0 +1,128 @@
+"""
+Search latency and throughput vs. cores (CPU only, no network).
+
+Compares, for 1, 2, 4, ... threads:
+
+- exact: one np.dot over the whole matrix, with BLAS allowed that many threads
+- sharded: ShardedIndex with that many search threads and single-threaded BLAS
+
+Each configuration runs in a fresh process, because BLAS reads its thread
+count when numpy is imported. The corpus is written once and memory-mapped by
+every run. Reported per configuration: single-query p50/p95 latency and the
+throughput of --clients concurrent callers.
+
+    python -m bench.scaling --rows 200000
+    python -m bench.scaling --rows 1000000 --threads 1,2,4,8 --clients 8 --out scaling.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import List
+
+def measure(corpus_path: str, mode: str, threads: int, queries: int, clients: int, duration: float, k: int) -> dict:
+    """Runs inside the child process, after BLAS has been configured through the environment."""
+    import numpy as np
+    from app.core.search import build_index
+    from bench.retrieval import make_queries
+
+    corpus = np.load(corpus_path, mmap_mode="r")
+    np.dot(corpus, np.ones(corpus.shape[1], dtype=np.float32))  # fault the pages in
+    index = build_index(mode, corpus, threads=threads) if mode == "sharded" else build_index(mode, corpus)
+    query_block = make_queries(corpus, queries, 0).astype(np.float32)
+    for query in query_block[:3]:
+        index.search(query, k)
+
+    latencies = []
+    for query in query_block:
+        started = time.perf_counter()
+        index.search(query, k)
+        latencies.append((time.perf_counter() - started) * 1000.0)
+
+    done = [0] * clients
+    stop = time.perf_counter() + duration
+
+    def client(number: int) -> None:
+        position = number
+        while time.perf_counter() < stop:
+            index.search(query_block[position % len(query_block)], k)
+            position += clients
+            done[number] += 1
+
+    workers = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    p50, p95 = np.percentile(latencies, [50, 95])
+    return {"mode": mode, "threads": threads, "query_p50_ms": float(p50), "query_p95_ms": float(p95),
+            "clients": clients, "qps": sum(done) / elapsed, "rows": int(corpus.shape[0])}
+
+def run_child(corpus_path: str, mode: str, threads: int, args) -> dict:
+    env = dict(os.environ)
+    env["BLAS_THREADS"] = str(threads if mode == "exact" else 1)
+    for name in ("OPENBLAS_NUM_THREADS", "OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        env[name] = env["BLAS_THREADS"]
+    command = [sys.executable, "-m", "bench.scaling", "--child", corpus_path, "--mode", mode,
+               "--threads", str(threads), "--queries", str(args.queries), "--clients", str(args.clients),
+               "--duration", str(args.duration), "--k", str(args.k)]
+    output = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Search latency and throughput vs. cores")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--threads", default=None, help="Comma-separated thread counts (default: 1, 2, 4, ... up to the cores)")
+    parser.add_argument("--modes", default="exact,sharded")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--clients", type=int, default=None, help="Concurrent callers for the throughput run (default: cores)")
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds per throughput run")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="Write results as JSON to this path")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--mode", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    args.clients = args.clients or cores
+    if args.child:
+        print(json.dumps(measure(args.child, args.mode, int(args.threads), args.queries, args.clients, args.duration, args.k)))
+        return
+
+    from bench.retrieval import write_corpus
+    if args.threads:
+        thread_counts = [int(t) for t in args.threads.split(",") if t.strip()]
+    else:
+        thread_counts = sorted({1 << i for i in range(cores.bit_length()) if 1 << i <= cores} | {cores})
+    results: List[dict] = []
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus_path = os.path.join(workdir, "corpus.npy")
+        write_corpus(corpus_path, args.rows, args.dim, args.seed)
+        print(f"{args.rows} rows x {args.dim}, {cores} cores, {args.clients} clients for throughput\n")
+        print(f"{'mode':<9}{'threads':>8}{'p50 ms':>9}{'p95 ms':>9}{'qps':>9}{'p50 speedup':>13}{'qps speedup':>13}")
+        for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+            base = None
+            for threads in thread_counts:
+                result = run_child(corpus_path, mode, threads, args)
+                base = base or result
+                result["p50_speedup"] = base["query_p50_ms"] / result["query_p50_ms"]
+                result["qps_speedup"] = result["qps"] / base["qps"]
+                results.append(result)
+                print(f"{mode:<9}{threads:>8}{result['query_p50_ms']:>9.2f}{result['query_p95_ms']:>9.2f}"
+                      f"{result['qps']:>9.1f}{result['p50_speedup']:>12.2f}x{result['qps_speedup']:>12.2f}x")
+    print("\nexact: BLAS threads = threads; sharded: search threads = threads, BLAS single-threaded.")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"cores": cores, "results": results}, f, indent=2)
+        print(f"Results written to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Local stand-ins for the upstream APIs the app calls:
+
+- aiproxy's OpenAI-compatible embeddings endpoint (POST /openai/v1/embeddings)
+- Gemini generateContent over REST, split into "generate" (text-only prompt)
+  and "vision" (prompt with inline image data) stages
+
+Each stage sleeps for a latency drawn from a configurable distribution and
+fails with a configurable probability, and records its own service times so
+the load tester can report per-stage percentiles without burning API quota.
+"""
+import asyncio
+import hashlib
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+EMBEDDING_DIM = 1536
+STAGES = ("embed", "generate", "vision")
+
+class LatencyModel:
+    """A latency distribution in milliseconds parsed from a short spec.
+
+    Specs: "fixed:MS", "uniform:LO,HI", "normal:MEAN,SD", "lognormal:MEDIAN,SIGMA".
+    """
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        kind, _, params = spec.partition(":")
+        self.kind = kind.strip().lower()
+        self.params = [float(p) for p in params.split(",") if p.strip()]
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+        if self.kind not in expected or len(self.params) != expected[self.kind]:
+            raise ValueError(f"Invalid latency spec {spec!r}")
+
+    def sample(self, rng: random.Random) -> float:
+        """Draw one latency in seconds."""
+        if self.kind == "fixed":
+            ms = self.params[0]
+        elif self.kind == "uniform":
+            ms = rng.uniform(*self.params)
+        elif self.kind == "normal":
+            ms = rng.gauss(*self.params)
+        else:
+            median, sigma = self.params
+            ms = median * float(np.exp(rng.gauss(0.0, sigma)))
+        return max(ms, 0.0) / 1000.0
+
+class StubConfig:
+    def __init__(self, latencies: Dict[str, str], error_rates: Optional[Dict[str, float]] = None, seed: int = 0):
+        self.latencies = {stage: LatencyModel(spec) for stage, spec in latencies.items()}
+        self.error_rates = error_rates or {}
+        self.rng = random.Random(seed)
+
+class StageStats:
+    """Service times and error counts recorded by the stubs, per stage."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.latencies: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+        self.errors: Dict[str, int] = {stage: 0 for stage in STAGES}
+
+    def as_dict(self) -> dict:
+        return {
+            stage: {"latencies_ms": [x * 1000.0 for x in self.latencies[stage]], "errors": self.errors[stage]}
+            for stage in STAGES
+        }
+
+def fake_embedding(text: str) -> List[float]:
+    """A deterministic unit vector for text, so repeated questions retrieve the same context."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIM)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+def create_stub_app(config: StubConfig) -> FastAPI:
+    app = FastAPI(title="Upstream stubs")
+    stats = StageStats()
+    app.state.stats = stats
+
+    async def simulate(stage: str) -> Optional[JSONResponse]:
+        started = time.perf_counter()
+        model = config.latencies.get(stage)
+        if model is not None:
+            await asyncio.sleep(model.sample(config.rng))
+        if config.rng.random() < config.error_rates.get(stage, 0.0):
+            stats.errors[stage] += 1
+            status = 429 if config.rng.random() < 0.5 else 500
+            return JSONResponse(status_code=status, content={"error": {"code": status, "message": f"stub {stage} failure"}})
+        stats.latencies[stage].append(time.perf_counter() - started)
+        return None
+
+    @app.post("/openai/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        error = await simulate("embed")
+        if error is not None:
+            return error
+        tokens = sum(len(text.split()) for text in inputs)
+        return {
+            "object": "list",
+            "model": body.get("model"),
+            "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(text)} for i, text in enumerate(inputs)],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.post("/{version}/models/{target}")
+    async def generate_content(version: str, target: str, request: Request):
+        body = await request.json()
+        parts = [part for content in body.get("contents", []) for part in content.get("parts", [])]
+        is_vision = any("inline_data" in part or "inlineData" in part for part in parts)
+        stage = "vision" if is_vision else "generate"
+        error = await simulate(stage)
+        if error is not None:
+            return error
+        prompt_tokens = sum(len(part.get("text", "").split()) for part in parts)
+        text = ("Stub description: a screenshot containing code, text and a diagram."
+                if is_vision else "Stub answer based on the provided context.")
+        return {
+            "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+            "usageMetadata": {
+                "promptTokenCount": prompt_tokens,
+                "candidatesTokenCount": len(text.split()),
+                "totalTokenCount": prompt_tokens + len(text.split()),
+            },
+        }
+
+    @app.get("/_stats")
+    async def get_stats():
+        return stats.as_dict()
+
+    @app.post("/_reset")
+    async def reset():
+        stats.reset()
+        return {"status": "ok"}
+
+    # HEAD probes from GeminiProcessor.warmup
+    @app.head("/openai/v1/embeddings")
+    async def embeddings_head():
+        return {}
+
+    return app
+
+class StubServer:
+    """Run an ASGI app with uvicorn on a background thread (port 0 picks a free port)."""
+
+    def __init__(self, app, host: str = "127.0.0.1", port: int = 0):
+        self.server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, name="upstream-stubs", daemon=True)
+        self.host = host
+
+    def start(self, timeout: float = 10.0) -> "StubServer":
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if time.monotonic() > deadline or not self.thread.is_alive():
+                raise RuntimeError("Stub server failed to start")
+            time.sleep(0.01)
+        return self
+
+    @property
+    def port(self) -> int:
+        return self.server.servers[0].sockets[0].getsockname()[1]
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
@@ -0,0 +1,114 @@
+"""
+Token-aware markdown chunker shared by the embedding scripts.
+
+One compiled regex walks the text once and yields its blocks: fenced code
+blocks, headings and sentences. A sentence only ends at . ! ? followed by
+whitespace, so URLs, file names and version numbers stay intact. Blocks are
+then packed into chunks of at most max_tokens tokens:
+
+- a heading starts a new chunk, unless the current one is still smaller
+  than min_tokens (short sections are packed together rather than
+  becoming tiny vectors of their own)
+- a code fence is never split unless it alone exceeds max_tokens
+- consecutive chunks share up to overlap_tokens tokens of trailing sentences
+
+Chunks are slices of the original text, so whitespace and formatting inside
+a chunk are preserved. Token counts use tiktoken's cl100k_base encoding (the
+text-embedding-3 tokenizer) when it is installed, otherwise a close
+word/punctuation approximation.
+"""
+import re
+from typing import Callable, List, NamedTuple, Optional
+
+DEFAULT_MAX_TOKENS = 400
+DEFAULT_OVERLAP_TOKENS = 40
+
+_BLOCK_START = r"[ \t]*(?:\#{1,6}[ \t]|```|~~~)"
+_SEGMENTS = re.compile(
+    rf"""
+      (?P<fence>^[ \t]*(?P<tick>```|~~~)[^\n]*\n.*?(?:^[ \t]*(?P=tick)[ \t]*$|\Z))
+    | (?P<heading>^\#{{1,6}}[ \t]+[^\n]*)
+    | (?P<sentence>\S(?:[^\n]|\n(?![ \t]*\n|{_BLOCK_START}))*?(?:[.!?](?=\s|\Z)|(?=\n[ \t]*\n|\n{_BLOCK_START})|\Z))
+    """,
+    re.MULTILINE | re.DOTALL | re.VERBOSE,
+)
+_APPROX_TOKENS = re.compile(r"\w+|[^\w\s]")
+
+def _approx_token_count(text: str) -> int:
+    return len(_APPROX_TOKENS.findall(text))
+
+def _load_token_counter() -> Callable[[str], int]:
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception:  # not installed, or the encoding file cannot be fetched
+        return _approx_token_count
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+count_tokens = _load_token_counter()
+
+class Segment(NamedTuple):
+    start: int
+    end: int
+    tokens: int
+    kind: str
+
+def _split_oversized(text: str, start: int, end: int, max_tokens: int, kind: str) -> List[Segment]:
+    """Cut one block that exceeds max_tokens into windows of whole approximate tokens."""
+    spans = [m.span() for m in _APPROX_TOKENS.finditer(text, start, end)]
+    pieces = []
+    for i in range(0, len(spans), max_tokens):
+        window = spans[i:i + max_tokens]
+        piece_start, piece_end = window[0][0], window[-1][1]
+        pieces.append(Segment(piece_start, piece_end, count_tokens(text[piece_start:piece_end]), kind))
+    return pieces
+
+def iter_segments(text: str, max_tokens: int) -> List[Segment]:
+    segments = []
+    for match in _SEGMENTS.finditer(text):
+        kind = match.lastgroup if match.lastgroup != "tick" else "fence"
+        start, end = match.span()
+        tokens = count_tokens(match.group())
+        if tokens > max_tokens:
+            segments.extend(_split_oversized(text, start, end, max_tokens, kind))
+        else:
+            segments.append(Segment(start, end, tokens, kind))
+    return segments
+
+def chunk_text(text: str, max_tokens: int = DEFAULT_MAX_TOKENS, overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+               min_tokens: Optional[int] = None) -> List[str]:
+    """Split markdown/plain text into chunks of at most max_tokens tokens (see module docstring)."""
+    if not text:
+        return []
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+    min_tokens = max_tokens // 4 if min_tokens is None else min_tokens
+    chunks: List[str] = []
+    current: List[Segment] = []
+    size = 0
+
+    def flush(keep_overlap: bool) -> None:
+        nonlocal current, size
+        chunks.append(text[current[0].start:current[-1].end].strip())
+        tail: List[Segment] = []
+        if keep_overlap and overlap_tokens:
+            tail_size = 0
+            for segment in reversed(current[1:]):
+                if segment.kind != "sentence" or tail_size + segment.tokens > overlap_tokens:
+                    break
+                tail.insert(0, segment)
+                tail_size += segment.tokens
+        current, size = tail, sum(s.tokens for s in tail)
+
+    for segment in iter_segments(text, max_tokens):
+        if current and segment.kind == "heading" and (size >= min_tokens or size + segment.tokens > max_tokens):
+            flush(keep_overlap=False)
+        elif current and size + segment.tokens > max_tokens:
+            flush(keep_overlap=True)
+            # the overlap plus this segment may still not fit
+            if current and size + segment.tokens > max_tokens:
+                current, size = [], 0
+        current.append(segment)
+        size += segment.tokens
+    if current:
+        chunks.append(text[current[0].start:current[-1].end].strip())
+    return chunks
@@ -0,0 +1,237 @@
+"""
+Concurrent, incremental fetcher for Discourse topics over the JSON API.
+
+- one pooled requests.Session for every call (cookies from the browser login
+  are copied in once)
+- topic JSON is downloaded by a thread pool under a shared token-bucket
+  rate limit; 429s are retried after Retry-After
+- posts beyond the first chunk of /t/{id}.json are fetched from
+  /t/{id}/posts.json?post_ids[]=... in chunks
+- topics whose bumped_at and posts_count match the last run are skipped; the
+  state of the last run is kept in a small JSON file
+
+Works against any Discourse instance, including bench/fake_discourse.py.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import requests
+from html_clean import html_to_text
+
+POSTS_CHUNK_SIZE = 20
+
+class TokenBucket:
+    """Allow `rate` acquisitions per second on average, with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def format_thread_content(posts: List[dict]) -> str:
+    """Thread text in the scraper's format: one Author/Date/Content block per post."""
+    blocks = []
+    for post in posts:
+        text_content = html_to_text(post.get('cooked', ''), separator='\n')
+        blocks.append(f"""
+Author: {post.get('username', '')}
+Date: {post.get('created_at', '')}
+Content:
+{text_content}
+-------------------""")
+    return '\n'.join(blocks)
+
+def topic_record(topic: dict, base_url: str) -> dict:
+    """Scraper record for a topic from a category listing (thread_content is added later)."""
+    created_at = topic.get('created_at')
+    if isinstance(created_at, str):
+        date_obj = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
+    else:
+        date_obj = datetime.fromtimestamp(created_at)
+    return {
+        'id': topic.get('id'),
+        'title': topic.get('title'),
+        'author': (topic.get('posters') or [{}])[0].get('user', {}).get('username'),
+        'date': date_obj.strftime('%Y-%m-%d'),
+        'url': f"{base_url}/t/{topic.get('slug')}/{topic.get('id')}",
+        'views': topic.get('views'),
+        'replies': topic.get('posts_count', 1) - 1,  # Subtract 1 for the original post
+        'tags': topic.get('tags', []),
+        # Set by the Discourse "solved" plugin when a reply is marked as the solution
+        'accepted_answer': bool(topic.get('has_accepted_answer')),
+    }
+
+def topic_version(topic: dict) -> dict:
+    return {'bumped_at': topic.get('bumped_at'), 'posts_count': topic.get('posts_count')}
+
+class DiscourseTopicFetcher:
+    def __init__(
+        self,
+        base_url: str,
+        session: Optional[requests.Session] = None,
+        rate: float = 4.0,
+        burst: int = 4,
+        max_workers: int = 8,
+        state_path: Optional[str] = None,
+        max_retries: int = 5,
+        timeout: float = 30.0,
+    ):
+        self.base_url = base_url.rstrip('/')
+        self.session = session or requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.bucket = TokenBucket(rate, burst)
+        self.max_workers = max_workers
+        self.state_path = state_path
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.state: Dict[str, dict] = self._load_state()
+        self.requests_made = 0
+        self._count_lock = threading.Lock()
+
+    def _load_state(self) -> Dict[str, dict]:
+        if self.state_path and os.path.exists(self.state_path):
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {}
+
+    def save_state(self) -> None:
+        if not self.state_path:
+            return
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def get_json(self, path: str, params=None) -> dict:
+        """GET base_url + path under the rate limit, retrying 429/5xx and connection errors."""
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            with self._count_lock:
+                self.requests_made += 1
+            try:
+                response = self.session.get(f"{self.base_url}{path}", params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(min(30, 2 ** attempt))
+                continue
+            if response.status_code == 429 or response.status_code >= 500:
+                if attempt == self.max_retries:
+                    response.raise_for_status()
+                retry_after = response.headers.get('Retry-After', '')
+                time.sleep(float(retry_after) if retry_after.replace('.', '', 1).isdigit() else min(30, 2 ** attempt))
+                continue
+            response.raise_for_status()
+            return response.json()
+        raise RuntimeError(f"Gave up on {path}")
+
+    def iter_topics(self, category_path: str) -> Iterator[dict]:
+        """Topics of a category listing (e.g. "/c/courses/tds-kb/34"), page by page."""
+        page = 0
+        while True:
+            data = self.get_json(f"{category_path}.json", params={'page': page})
+            topics = data.get('topic_list', {}).get('topics', [])
+            if not topics:
+                return
+            yield from topics
+            page += 1
+
+    def fetch_posts(self, topic_id: int) -> List[dict]:
+        """Every post of a topic: the first chunk from /t/{id}.json, the rest via posts.json."""
+        data = self.get_json(f"/t/{topic_id}.json")
+        stream = data.get('post_stream', {})
+        posts = list(stream.get('posts', []))
+        have = {post['id'] for post in posts}
+        missing = [post_id for post_id in stream.get('stream', []) if post_id not in have]
+        for start in range(0, len(missing), POSTS_CHUNK_SIZE):
+            ids = missing[start:start + POSTS_CHUNK_SIZE]
+            more = self.get_json(f"/t/{topic_id}/posts.json", params=[('post_ids[]', i) for i in ids])
+            posts.extend(more.get('post_stream', {}).get('posts', []))
+        posts.sort(key=lambda post: post.get('post_number', 0))
+        return posts
+
+    def is_unchanged(self, topic: dict) -> bool:
+        return self.state.get(str(topic.get('id'))) == topic_version(topic)
+
+    def fetch_topics(
+        self, topics: List[dict], on_topic: Optional[Callable[[dict, List[dict]], None]] = None
+    ) -> Tuple[List[Tuple[dict, List[dict]]], List[dict]]:
+        """Download changed topics concurrently.
+
+        Returns ([(topic, posts), ...] for fetched topics, [skipped unchanged
+        topics]). on_topic, if given, is called from the calling thread as each
+        topic completes. Call save_state() once the results are stored, so a
+        crash before that refetches them next time.
+        """
+        changed = [topic for topic in topics if not self.is_unchanged(topic)]
+        skipped = [topic for topic in topics if self.is_unchanged(topic)]
+        fetched = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self.fetch_posts, topic['id']): topic for topic in changed}
+            for future in as_completed(futures):
+                topic = futures[future]
+                try:
+                    posts = future.result()
+                except Exception as e:
+                    print(f"Error fetching topic {topic.get('id')}: {e}")
+                    continue
+                self.state[str(topic['id'])] = topic_version(topic)
+                fetched.append((topic, posts))
+                if on_topic:
+                    on_topic(topic, posts)
+        return fetched, skipped
+
+def fetch_forum(
+    fetcher: DiscourseTopicFetcher,
+    category_path: str,
+    previous: Dict[int, dict],
+    in_range: Callable[[str], bool] = lambda date: True,
+) -> List[dict]:
+    """Scraper records for every topic of a category, in listing order.
+
+    previous maps topic id -> record from the last run; unchanged topics reuse
+    its thread_content, changed or new ones are fetched.
+    """
+    # A topic can only be skipped if its previous record still exists
+    fetcher.state = {key: value for key, value in fetcher.state.items() if int(key) in previous}
+    topics = []
+    for topic in fetcher.iter_topics(category_path):
+        record = topic_record(topic, fetcher.base_url)
+        if in_range(record['date']):
+            topics.append((topic, record))
+    started = time.monotonic()
+    fetched, skipped = fetcher.fetch_topics([topic for topic, _ in topics])
+    contents = {topic['id']: format_thread_content(posts) for topic, posts in fetched}
+    records = []
+    for topic, record in topics:
+        if topic['id'] in contents:
+            record['thread_content'] = contents[topic['id']]
+        elif topic['id'] in previous and fetcher.is_unchanged(topic):
+            record['thread_content'] = previous[topic['id']].get('thread_content', '')
+        else:
+            continue  # failed to fetch; it is retried next run
+        records.append(record)
+    print(f"Topics: {len(fetched)} fetched, {len(skipped)} unchanged, "
+          f"{len(topics) - len(fetched) - len(skipped)} failed; "
+          f"{fetcher.requests_made} requests in {time.monotonic() - started:.1f}s")
+    return records
@@ -0,0 +1,255 @@
+"""
+Concurrent, resumable embedding job runner for the AI Proxy embeddings endpoint.
+
+- keeps up to max_concurrency requests in flight over one pooled session
+- adapts the batch size (AIMD): grows while responses are fast, halves on
+  429s and on responses slower than target_latency
+- retries transient failures (429, 5xx, timeouts) with jittered exponential
+  backoff, honouring Retry-After
+- appends every finished batch to a checkpoint file, so an interrupted run
+  resumes with only the missing texts
+
+Failed batches are never silently dropped: if texts still fail after all
+retries, EmbeddingJobError is raised after the successful ones are checkpointed.
+"""
+import base64
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+import numpy as np
+import requests
+from tqdm import tqdm
+
+EMBEDDING_ENDPOINT = "https://aiproxy.sanand.workers.dev/openai/v1/embeddings"
+EMBEDDING_MODEL = "text-embedding-3-small"
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+class EmbeddingJobError(Exception):
+    """Some texts could not be embedded; the rest are saved in the checkpoint."""
+
+    def __init__(self, message: str, failed_indices: List[int]):
+        super().__init__(message)
+        self.failed_indices = failed_indices
+
+class _RetryableError(Exception):
+    def __init__(self, message: str, retry_after: Optional[float] = None, throttled: bool = False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.throttled = throttled
+
+def job_fingerprint(texts: List[str], model: str) -> str:
+    """Identify a job by model and exact inputs, so a checkpoint is never applied to different texts."""
+    digest = hashlib.sha256(model.encode("utf-8"))
+    for text in texts:
+        digest.update(hashlib.sha256(text.encode("utf-8")).digest())
+    return digest.hexdigest()
+
+def _encode(vector) -> str:
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+
+def _decode(data: str) -> List[float]:
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32).tolist()
+
+class Checkpoint:
+    """Append-only JSONL of finished batches: a header line, then {"i": [...], "e": [...]} lines."""
+
+    def __init__(self, path: str, fingerprint: str):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.lock = threading.Lock()
+
+    def load(self) -> Dict[int, List[float]]:
+        if not os.path.exists(self.path):
+            return {}
+        done: Dict[int, List[float]] = {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            header = f.readline()
+            try:
+                if json.loads(header).get("fingerprint") != self.fingerprint:
+                    print(f"Checkpoint {self.path} belongs to a different job; starting over")
+                    return {}
+            except json.JSONDecodeError:
+                return {}
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # torn last line from an interrupted write
+                for index, data in zip(record["i"], record["e"]):
+                    done[index] = _decode(data)
+        return done
+
+    def start(self, resumed: bool) -> None:
+        if not resumed:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"fingerprint": self.fingerprint}) + "\n")
+
+    def append(self, indices: List[int], embeddings: List[List[float]]) -> None:
+        line = json.dumps({"i": indices, "e": [_encode(e) for e in embeddings]}) + "\n"
+        with self.lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def remove(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+class EmbeddingJobRunner:
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        endpoint: Optional[str] = None,
+        model: str = EMBEDDING_MODEL,
+        max_concurrency: int = 4,
+        batch_size: int = 32,
+        min_batch_size: int = 1,
+        max_batch_size: int = 256,
+        target_latency: float = 10.0,
+        max_retries: int = 6,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        timeout: float = 120.0,
+    ):
+        self.api_key = api_key or os.environ.get("AIPIPE_API_KEY")
+        if not self.api_key:
+            raise ValueError("AIPIPE_API_KEY environment variable not set. Please add it to your .env file.")
+        self.endpoint = endpoint or os.environ.get("EMBEDDING_ENDPOINT", EMBEDDING_ENDPOINT)
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.batch_size = batch_size
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+
+    def _request(self, texts: List[str]) -> List[List[float]]:
+        # Every worker waits out a shared cooldown after a 429
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"}
+        try:
+            response = self.session.post(self.endpoint, headers=headers,
+                                         json={"model": self.model, "input": texts}, timeout=self.timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise _RetryableError(str(e))
+        if response.status_code == 200:
+            data = sorted(response.json()["data"], key=lambda item: item["index"])
+            return [item["embedding"] for item in data]
+        if response.status_code in RETRYABLE_STATUS:
+            retry_after = response.headers.get("Retry-After")
+            raise _RetryableError(
+                f"HTTP {response.status_code}: {response.text[:200]}",
+                retry_after=float(retry_after) if retry_after and retry_after.replace(".", "", 1).isdigit() else None,
+                throttled=response.status_code == 429,
+            )
+        raise RuntimeError(f"Embedding API error {response.status_code}: {response.text[:200]}")
+
+    def _on_success(self, latency: float) -> None:
+        with self._lock:
+            if latency > self.target_latency:
+                self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+            else:
+                self.batch_size = min(self.max_batch_size, self.batch_size + 8)
+
+    def _on_retry(self, error: _RetryableError, attempt: int) -> float:
+        """Shrink the batch size and return how long to wait before retrying."""
+        with self._lock:
+            self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+            backoff = min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+            if error.retry_after is not None:
+                backoff = max(backoff, error.retry_after)
+            if error.throttled:
+                self._paused_until = max(self._paused_until, time.monotonic() + backoff)
+            return backoff
+
+    def run(self, texts: List[str], checkpoint_path: Optional[str] = None, keep_checkpoint: bool = False,
+            show_progress: bool = True) -> List[List[float]]:
+        """Embed texts in order; resumes from checkpoint_path if it holds part of this job."""
+        checkpoint = Checkpoint(checkpoint_path, job_fingerprint(texts, self.model)) if checkpoint_path else None
+        done: Dict[int, List[float]] = checkpoint.load() if checkpoint else {}
+        if checkpoint:
+            checkpoint.start(resumed=bool(done))
+            if done:
+                print(f"Resuming: {len(done)}/{len(texts)} embeddings already in {checkpoint_path}")
+
+        # Queue of (indices, attempt, not_before); batches are cut at submit time from the current size
+        pending = [i for i in range(len(texts)) if i not in done]
+        retries: List[tuple] = []
+        failed: List[int] = []
+        progress = tqdm(total=len(texts), initial=len(done), unit="text", disable=not show_progress)
+
+        def work(indices: List[int], not_before: float):
+            delay = not_before - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            started = time.monotonic()
+            embeddings = self._request([texts[i] for i in indices])
+            return embeddings, time.monotonic() - started
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            in_flight = {}
+            while pending or retries or in_flight:
+                while len(in_flight) < self.max_concurrency and (pending or retries):
+                    if retries:
+                        indices, attempt, not_before = retries.pop(0)
+                    else:
+                        indices, pending = pending[:self.batch_size], pending[self.batch_size:]
+                        attempt, not_before = 0, 0.0
+                    in_flight[pool.submit(work, indices, not_before)] = (indices, attempt)
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    indices, attempt = in_flight.pop(future)
+                    try:
+                        embeddings, latency = future.result()
+                    except _RetryableError as e:
+                        if attempt >= self.max_retries:
+                            print(f"Giving up on {len(indices)} texts after {attempt + 1} attempts: {e}")
+                            failed.extend(indices)
+                            continue
+                        not_before = time.monotonic() + self._on_retry(e, attempt)
+                        # Retry in smaller pieces so one bad batch shrinks with the rest
+                        size = max(self.min_batch_size, min(self.batch_size, len(indices)))
+                        for start in range(0, len(indices), size):
+                            retries.append((indices[start:start + size], attempt + 1, not_before))
+                        continue
+                    except Exception as e:
+                        print(f"Batch of {len(indices)} texts failed permanently: {e}")
+                        failed.extend(indices)
+                        continue
+                    self._on_success(latency)
+                    if checkpoint:
+                        checkpoint.append(indices, embeddings)
+                    for index, embedding in zip(indices, embeddings):
+                        done[index] = embedding
+                    progress.update(len(indices))
+        progress.close()
+
+        if failed:
+            raise EmbeddingJobError(
+                f"{len(failed)} of {len(texts)} texts could not be embedded; rerun to resume from the checkpoint",
+                sorted(failed),
+            )
+        if checkpoint and not keep_checkpoint:
+            checkpoint.remove()
+        return [done[i] for i in range(len(texts))]
+
+def embed_texts(texts: List[str], checkpoint_path: Optional[str] = None, **options) -> List[List[float]]:
+    """Convenience wrapper: embed texts with a fresh runner."""
+    return EmbeddingJobRunner(**options).run(texts, checkpoint_path=checkpoint_path)
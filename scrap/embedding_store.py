@@ -0,0 +1,96 @@
+"""
+Persistent embedding store keyed by content hash and embedding model.
+
+Chunk ids are derived from the chunk's source and whitespace-normalized text,
+so an unchanged chunk gets the same id on every run and its embedding is
+reused from the store; only new or edited chunks are sent to the API.
+
+    store = EmbeddingStore("embeddings/embedding_store.sqlite", model="text-embedding-3-small")
+    ids = [chunk_id(text, source) for text, source in ...]
+    vectors = store.embed(ids, texts, create_embeddings_batch)
+"""
+import hashlib
+import re
+import sqlite3
+from typing import Callable, Dict, List, Sequence
+import numpy as np
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so re-wrapping a paragraph does not count as a change."""
+    return _WHITESPACE.sub(" ", text).strip()
+
+def chunk_id(text: str, source: str = "") -> str:
+    """Stable id for a chunk: sha256 of its source and normalized text."""
+    digest = hashlib.sha256(f"{source}\0{normalize_text(text)}".encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+class EmbeddingStore:
+    """sqlite table of float32 vectors, one row per (model, chunk_id)."""
+
+    def __init__(self, path: str, model: str):
+        self.path = str(path)
+        self.model = model
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, chunk_id TEXT NOT NULL, dim INTEGER NOT NULL, vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, chunk_id))"
+        )
+        self.conn.commit()
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM embeddings WHERE model = ?", (self.model,)).fetchone()[0]
+
+    def get_many(self, ids: Sequence[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(ids))
+        # sqlite caps bound parameters per statement, so look ids up in slices
+        for start in range(0, len(unique), 500):
+            part = unique[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT chunk_id, vector FROM embeddings WHERE model = ? AND chunk_id IN ({','.join('?' * len(part))})",
+                (self.model, *part),
+            )
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, ids: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        rows = []
+        for key, vector in zip(ids, vectors):
+            array = np.asarray(vector, dtype=np.float32)
+            rows.append((self.model, key, len(array), array.tobytes()))
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+
+    def embed(self, ids: Sequence[str], texts: Sequence[str],
+              embed_fn: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """Vectors for texts in order, calling embed_fn only for ids missing from the store."""
+        cached = self.get_many(ids)
+        missing: Dict[str, str] = {}
+        for key, text in zip(ids, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        reused = sum(1 for key in ids if key in cached)
+        print(f"Embedding store: {reused} chunks reused, {len(missing)} new or changed "
+              f"({len(ids) - reused - len(missing)} duplicates)")
+        if missing:
+            new_vectors = embed_fn(list(missing.values()))
+            self.put_many(list(missing), new_vectors)
+            cached.update(zip(missing, new_vectors))
+        return [cached[key] for key in ids]
+
+    def prune(self, keep_ids: Sequence[str]) -> int:
+        """Drop this model's vectors whose chunks no longer exist; returns how many were removed."""
+        keep = set(keep_ids)
+        stale = [key for (key,) in self.conn.execute("SELECT chunk_id FROM embeddings WHERE model = ?", (self.model,))
+                 if key not in keep]
+        with self.conn:
+            self.conn.executemany("DELETE FROM embeddings WHERE model = ? AND chunk_id = ?",
+                                  [(self.model, key) for key in stale])
+        return len(stale)
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,195 @@
+"""
+Fast HTML-to-text cleaning, identical to
+
+    BeautifulSoup(html, 'html.parser').get_text(separator=separator, strip=True)
+
+Most of BeautifulSoup's time goes into building the parse tree, which
+get_text() then walks only to collect strings. The "fast" backend keeps
+Beautiful Soup's own html.parser front end (so tokenizing, entity and
+character-reference handling are unchanged) but feeds its events into a
+small sink that tracks just the state get_text() depends on: which tags are
+open (script/style/template/rt/rp strings are skipped), void elements, and
+where one string ends and the next begins. Text with no markup at all skips
+parsing entirely.
+
+The first call compares the fast backend with BeautifulSoup on a sample
+document and falls back to BeautifulSoup if they disagree (e.g. after a
+bs4 upgrade changes its internals).
+
+For many documents, clean_html_batch / iter_clean fan the work out over a
+process pool in chunks while keeping the input order.
+"""
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional
+from bs4 import BeautifulSoup
+from bs4.element import CData
+
+try:
+    from bs4.builder import HTMLParserTreeBuilder
+    from bs4.builder._htmlparser import BeautifulSoupHTMLParser
+except ImportError:  # very old or restructured bs4: always use BeautifulSoup
+    HTMLParserTreeBuilder = BeautifulSoupHTMLParser = None
+
+DEFAULT_CHUNKSIZE = 64
+
+class _EmptyTag:
+    is_empty_element = True
+
+class _Tag:
+    is_empty_element = False
+
+class _TextSink:
+    """Stands in for the BeautifulSoup object the parser reports to, keeping only get_text() output."""
+
+    def __init__(self, builder):
+        self.builder = builder
+        self.void_tags = builder.empty_element_tags
+        self.container_tags = set(builder.string_containers)
+        self.contains_replacement_characters = False
+        self.strings: List[str] = []
+        self.current_data: List[str] = []
+        self.tag_stack: List[str] = []
+        self.open_counts: Counter = Counter()
+        # Depths in tag_stack of open script/style/template/rt/rp tags
+        self.container_depths: List[int] = []
+
+    def handle_starttag(self, name, namespace, nsprefix, attrs, sourceline=None, sourcepos=None, namespaces=None):
+        self.endData()
+        if name in self.container_tags:
+            self.container_depths.append(len(self.tag_stack))
+        self.tag_stack.append(name)
+        self.open_counts[name] += 1
+        if self.void_tags is None or name in self.void_tags:
+            return _EmptyTag
+        return _Tag
+
+    def handle_endtag(self, name, nsprefix=None):
+        self.endData()
+        # Like BeautifulSoup._popToTag: close up to the most recent open tag of this name, if any
+        while self.tag_stack and self.open_counts.get(name):
+            popped = self.tag_stack.pop()
+            self.open_counts[popped] -= 1
+            if self.container_depths and self.container_depths[-1] == len(self.tag_stack):
+                self.container_depths.pop()
+            if popped == name:
+                break
+
+    def handle_data(self, data):
+        self.current_data.append(data)
+
+    def endData(self, containerClass=None):
+        if not self.current_data:
+            return
+        data = "".join(self.current_data)
+        self.current_data = []
+        # Plain strings count unless inside a string container; of the special kinds only CDATA does
+        keep = not self.container_depths if containerClass is None else containerClass is CData
+        if keep:
+            stripped = data.strip()
+            if stripped:
+                self.strings.append(stripped)
+
+_builder = None
+
+def _fast_get_text(html: str, separator: str) -> str:
+    global _builder
+    if _builder is None:
+        _builder = HTMLParserTreeBuilder(store_line_numbers=False)
+    sink = _TextSink(_builder)
+    args, kwargs = _builder.parser_args
+    parser = BeautifulSoupHTMLParser(sink, *args, **kwargs)
+    parser.feed(html)
+    parser.close()
+    sink.endData()
+    return separator.join(sink.strings)
+
+def _bs4_get_text(html: str, separator: str) -> str:
+    return BeautifulSoup(html, "html.parser").get_text(separator=separator, strip=True)
+
+_SELF_CHECK = (
+    "<!DOCTYPE html><div class='cooked'><p>Use <code>pip install x</code> &amp; see "
+    "<a href='https://pypi.org'>pypi.org</a>&nbsp;&#8212;&#x41;&bogus; ok.</p><br>"
+    "<script>var a = '<p>no</p>';</script><style>p {}</style><!-- hidden -->"
+    "<template><p>tpl</p></template><ruby>k<rt>r</rt></ruby><![CDATA[cdata]]>"
+    "<pre>  keep\n  lines </pre><img src=x></img><p>unclosed<b>bold</div>tail</p>"
+)
+
+def _choose_backend() -> str:
+    if os.environ.get("HTML_CLEAN_BACKEND"):
+        return os.environ["HTML_CLEAN_BACKEND"]
+    if BeautifulSoupHTMLParser is None:
+        return "bs4"
+    try:
+        for separator in (" ", "\n"):
+            if _fast_get_text(_SELF_CHECK, separator) != _bs4_get_text(_SELF_CHECK, separator):
+                return "bs4"
+    except Exception:
+        return "bs4"
+    return "fast"
+
+_backend: Optional[str] = None
+
+def backend() -> str:
+    """The backend in use: "fast" or "bs4" (override with HTML_CLEAN_BACKEND)."""
+    global _backend
+    if _backend is None:
+        _backend = _choose_backend()
+    return _backend
+
+def html_to_text(html, separator: str = " ") -> str:
+    """Plain text of an HTML fragment; non-strings give ""."""
+    if not isinstance(html, str):
+        return ""
+    if "<" not in html and "&" not in html:
+        # No markup and no references: the parser would return the text unchanged
+        return html.strip()
+    if backend() == "fast":
+        try:
+            return _fast_get_text(html, separator)
+        except Exception:
+            pass  # let BeautifulSoup handle (or report) markup html.parser chokes on
+    return _bs4_get_text(html, separator)
+
+def _clean_chunk(docs: List, separator: str) -> List[str]:
+    return [html_to_text(doc, separator) for doc in docs]
+
+def default_workers() -> int:
+    return os.cpu_count() or 1
+
+def iter_clean(docs: Iterable, separator: str = " ", workers: Optional[int] = None,
+               chunksize: int = DEFAULT_CHUNKSIZE, window: int = 8) -> Iterator[str]:
+    """Clean docs in order, fanning chunks of chunksize docs out over a process pool.
+
+    At most workers * window chunks are read ahead, so a stream of any length
+    is processed in bounded memory. workers=1 cleans in this process.
+    """
+    workers = workers or default_workers()
+    if workers <= 1:
+        for doc in docs:
+            yield html_to_text(doc, separator)
+        return
+    iterator = iter(docs)
+    clean = partial(_clean_chunk, separator=separator)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            chunks = []
+            for _ in range(workers * window):
+                chunk = list(islice(iterator, chunksize))
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            if not chunks:
+                return
+            for texts in pool.map(clean, chunks):
+                yield from texts
+
+def clean_html_batch(docs: List, separator: str = " ", workers: Optional[int] = None,
+                     chunksize: int = DEFAULT_CHUNKSIZE) -> List[str]:
+    """Clean a list of documents; small batches stay in-process, where a pool would cost more than it saves."""
+    if workers is None and len(docs) < 4 * chunksize:
+        workers = 1
+    return list(iter_clean(docs, separator, workers, chunksize))
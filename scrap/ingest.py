@@ -0,0 +1,295 @@
+"""
+One command for the whole ingestion build, run from scrap/:
+
+    python ingest.py                    # refresh course content, rebuild what changed, publish
+    python ingest.py --offline          # no network fetches; rebuild from what is on disk
+    python ingest.py --scrape-forum     # also refresh the forum (scraper2.py --fast, needs a browser login)
+    python ingest.py --dry-run          # show which stages would run
+    python ingest.py --pca-dims 256     # also fit the PCA projections of the reduced retrieval mode
+
+The steps are a small dependency graph:
+
+    course_fetch -> course_embed --\\
+                                     +--> publish
+    forum_scrape -> forum_embed  ---/
+
+With --pca-dims, a project stage between the embed stages and publish fits
+the projections (app/core/projection.py) so they ship in the snapshot.
+
+Each stage has a fingerprint: a hash of its parameters, its code (the
+scripts it runs), its input files and the fingerprints of the stages it
+depends on. A stage whose fingerprint matches the last successful run and
+whose outputs are unchanged on disk is skipped. The course and forum branches
+run in parallel. Fetch/scrape stages talk to the network, so they always run
+(they are cheap when nothing changed: conditional GETs, skipped topics).
+
+publish copies the embedding files into ../embeddings/snapshots/<id>/ and
+then atomically repoints the ../embeddings/current symlink, which the app
+loads (see app/core/snapshot.py). A failed stage publishes nothing.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+STATE_DIR = Path(".ingest")
+STATE_PATH = STATE_DIR / "state.json"
+HASH_CACHE_PATH = STATE_DIR / "hashes.json"
+PUBLISH_DIR = Path("..") / "embeddings"
+CURRENT_LINK = "current"
+
+COURSE_OUTPUTS = ["embeddings/course_embeddings.npy", "embeddings/course_metadata.csv", "embeddings/course_texts.csv"]
+POSTS_OUTPUTS = ["embeddings/posts_embeddings.npy", "embeddings/posts_metadata.csv", "embeddings/posts_aliases.csv"]
+
+class FileHasher:
+    """sha256 of files, cached by (size, mtime) so unchanged files are not read again."""
+
+    def __init__(self, cache_path: Path):
+        self.cache_path = cache_path
+        self.cache: Dict[str, list] = {}
+        if cache_path.exists():
+            with open(cache_path, "r", encoding="utf-8") as f:
+                self.cache = json.load(f)
+
+    def file(self, path: Path) -> Optional[str]:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        key = str(path)
+        cached = self.cache.get(key)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        self.cache[key] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def paths(self, paths: List[str]) -> str:
+        """One hash over files and directories (every file below them, by relative path)."""
+        digest = hashlib.sha256()
+        for entry in paths:
+            path = Path(entry)
+            files = sorted(p for p in path.rglob("*") if p.is_file() and not p.name.startswith(".")) \
+                if path.is_dir() else [path]
+            for file in files:
+                digest.update(f"{file}\0{self.file(file)}\n".encode("utf-8"))
+        return digest.hexdigest()
+
+    def save(self) -> None:
+        write_json(self.cache_path, self.cache)
+
+def write_json(path: Path, data) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp_path, path)
+
+class Stage:
+    """A step of the build: a command, what it reads, what it writes and which stages must run first."""
+
+    def __init__(self, name: str, run: Callable[["Stage", dict], None], deps: List[str] = (),
+                 inputs: List[str] = (), code: List[str] = (), outputs: List[str] = (),
+                 params: Optional[dict] = None, always: bool = False):
+        self.name = name
+        self.run = run
+        self.deps = list(deps)
+        self.inputs = list(inputs)
+        self.code = list(code)
+        self.outputs = list(outputs)
+        self.params = params or {}
+        self.always = always
+        # Fingerprint parts of the current run, set before run() is called
+        self.fingerprint: dict = {}
+
+def run_command(*args: str, cwd: Optional[str] = None) -> None:
+    """Run a sibling script with this interpreter; a non-zero exit fails the stage."""
+    subprocess.run([sys.executable, *args], check=True, cwd=cwd)
+
+class Pipeline:
+    def __init__(self, stages: List[Stage], force: List[str] = (), dry_run: bool = False):
+        self.stages = {stage.name: stage for stage in stages}
+        self.force = set(force)
+        self.dry_run = dry_run
+        self.hasher = FileHasher(HASH_CACHE_PATH)
+        self.state: Dict[str, dict] = {}
+        if STATE_PATH.exists():
+            with open(STATE_PATH, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+        self.results: Dict[str, str] = {}
+        self.fingerprints: Dict[str, str] = {}
+        self.state_lock = threading.Lock()
+
+    def fingerprint(self, stage: Stage) -> dict:
+        parts = {
+            "params": hashlib.sha256(json.dumps(stage.params, sort_keys=True).encode("utf-8")).hexdigest(),
+            "code": self.hasher.paths(stage.code),
+            "inputs": self.hasher.paths(stage.inputs),
+            "deps": hashlib.sha256("".join(self.fingerprints[dep] for dep in stage.deps).encode("utf-8")).hexdigest(),
+        }
+        parts["stage"] = hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+        return parts
+
+    def up_to_date(self, stage: Stage, parts: dict) -> bool:
+        previous = self.state.get(stage.name)
+        return (not stage.always and stage.name not in self.force and previous is not None
+                and previous["fingerprint"]["stage"] == parts["stage"]
+                and previous["outputs"] == self.hasher.paths(stage.outputs))
+
+    def execute(self, stage: Stage) -> str:
+        """Run one stage if it is out of date; returns "ran", "skipped" or "would run"."""
+        parts = self.fingerprint(stage)
+        if self.up_to_date(stage, parts):
+            self.fingerprints[stage.name] = self.state[stage.name]["outputs"]
+            return "skipped"
+        if self.dry_run:
+            self.fingerprints[stage.name] = parts["stage"]
+            return "would run"
+        started = time.perf_counter()
+        stage.fingerprint = parts
+        stage.run(stage, self.state.get(stage.name, {}))
+        outputs = self.hasher.paths(stage.outputs)
+        with self.state_lock:
+            self.state[stage.name] = {"fingerprint": parts, "outputs": outputs,
+                                      "seconds": round(time.perf_counter() - started, 2)}
+            write_json(STATE_PATH, self.state)
+        # Downstream stages see what this stage produced, not just that it ran
+        self.fingerprints[stage.name] = outputs
+        return "ran"
+
+    def run(self) -> bool:
+        """Run the graph, independent branches in parallel; returns whether every stage succeeded."""
+        pending = dict(self.stages)
+        running = {}
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(self.stages)) as pool:
+            while pending or running:
+                for name, stage in list(pending.items()):
+                    if any(self.results.get(dep) == "failed" or self.results.get(dep) == "blocked"
+                           for dep in stage.deps):
+                        self.results[name] = "blocked"
+                        del pending[name]
+                    elif all(dep in self.fingerprints for dep in stage.deps):
+                        print(f"[{name}] checking")
+                        running[pool.submit(self.execute, stage)] = (name, time.perf_counter())
+                        del pending[name]
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, stage_started = running.pop(future)
+                    try:
+                        self.results[name] = future.result()
+                    except Exception as e:
+                        print(f"[{name}] failed: {e}")
+                        self.results[name] = "failed"
+                    print(f"[{name}] {self.results[name]} ({time.perf_counter() - stage_started:.1f}s)")
+        self.hasher.save()
+        print(f"\nIngestion finished in {time.perf_counter() - started:.1f}s")
+        for name in self.stages:
+            print(f"  {name:<14} {self.results.get(name, 'blocked')}")
+        return all(result != "failed" and result != "blocked" for result in self.results.values())
+
+def publish(stage: Stage, previous: dict) -> None:
+    """Copy the outputs into a new snapshot directory, then swap the current symlink to it."""
+    publish_dir = Path(stage.params["publish_dir"])
+    snapshots = publish_dir / "snapshots"
+    snapshot_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{stage.fingerprint['inputs'][:8]}"
+    target = snapshots / snapshot_id
+    if not target.exists():
+        tmp_target = snapshots / f".{snapshot_id}.tmp"
+        shutil.rmtree(tmp_target, ignore_errors=True)
+        tmp_target.mkdir(parents=True)
+        for path in stage.inputs:
+            shutil.copy2(path, tmp_target / Path(path).name)
+        os.replace(tmp_target, target)
+    link = publish_dir / CURRENT_LINK
+    tmp_link = publish_dir / f".{CURRENT_LINK}.tmp"
+    if tmp_link.is_symlink():
+        tmp_link.unlink()
+    os.symlink(Path("snapshots") / snapshot_id, tmp_link)
+    os.replace(tmp_link, link)
+    print(f"Published snapshot {target.resolve()}")
+    # Keep the newest few snapshots; processes still serving an older one have it memory-mapped
+    old = sorted(p for p in snapshots.iterdir() if p.is_dir() and not p.name.startswith("."))[:-stage.params["keep"]]
+    for path in old:
+        if path != target:
+            shutil.rmtree(path, ignore_errors=True)
+
+def build_stages(args) -> List[Stage]:
+    def course_embed(stage, previous):
+        # The fetch manifest lists the files to re-chunk, but only while chunking code is unchanged
+        same_code = previous.get("fingerprint", {}).get("code") == stage.fingerprint["code"]
+        run_command("md_to_embeddings.py", *(["--changed-only"] if same_code else []))
+
+    stages = [
+        Stage("course_fetch", lambda stage, previous: run_command("sidebar_to_content_fetcher.py"),
+              outputs=["content_md"], always=True),
+        Stage("course_embed", course_embed, deps=["course_fetch"],
+              inputs=["content_md"],
+              code=["md_to_embeddings.py", "chunking.py", "embedding_store.py", "embed_runner.py"],
+              outputs=COURSE_OUTPUTS),
+        Stage("forum_embed", lambda stage, previous: run_command("create_embeddings.py", "--only", "posts"),
+              inputs=["data/tds_posts.jsonl" if os.path.exists("data/tds_posts.jsonl") else "data/tds_posts.json"],
+              code=["create_embeddings.py", "chunking.py", "dedup.py", "html_clean.py", "records.py",
+                    "embed_runner.py"],
+              outputs=POSTS_OUTPUTS),
+        Stage("publish", publish, deps=["course_embed", "forum_embed"],
+              inputs=COURSE_OUTPUTS + POSTS_OUTPUTS,
+              outputs=[str(args.publish_dir / CURRENT_LINK)],
+              params={"publish_dir": str(args.publish_dir), "keep": args.keep}),
+    ]
+    by_name = {stage.name: stage for stage in stages}
+    if args.offline:
+        stages.remove(by_name["course_fetch"])
+        by_name["course_embed"].deps = []
+    if args.pca_dims:
+        # The projection code lives in the app, so it runs from the repo root
+        outputs = [f"embeddings/{name}_pca{args.pca_dims}.npz" for name in ("course", "posts")]
+        stages.insert(len(stages) - 1, Stage(
+            "project", lambda stage, previous: run_command(
+                "-m", "app.core.projection", "--embeddings-dir", os.path.abspath("embeddings"),
+                "--dims", str(args.pca_dims), cwd=".."),
+            deps=["course_embed", "forum_embed"], code=["../app/core/projection.py"], outputs=outputs,
+            params={"dims": args.pca_dims}))
+        by_name["publish"].deps.append("project")
+        by_name["publish"].inputs += outputs
+    if args.scrape_forum:
+        stages.insert(0, Stage("forum_scrape", lambda stage, previous: run_command("scraper2.py", "--fast"),
+                               outputs=["data/tds_posts.jsonl"], always=True))
+        by_name["forum_embed"].deps = ["forum_scrape"]
+    return stages
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the ingestion build, skipping stages whose inputs are unchanged")
+    parser.add_argument("--offline", action="store_true", help="Skip fetching course content")
+    parser.add_argument("--scrape-forum", action="store_true", help="Refresh the forum with scraper2.py --fast first")
+    parser.add_argument("--force", nargs="*", default=[], metavar="STAGE", help="Run these stages even if up to date")
+    parser.add_argument("--dry-run", action="store_true", help="Only report which stages are out of date")
+    parser.add_argument("--publish-dir", type=Path, default=PUBLISH_DIR,
+                        help="Embeddings directory the app serves (snapshots/ and current are created in it)")
+    parser.add_argument("--keep", type=int, default=3, help="Published snapshots to keep")
+    parser.add_argument("--pca-dims", type=int, default=None,
+                        help="Fit PCA projections of this width for RETRIEVAL_MODE=reduced and publish them")
+    args = parser.parse_args()
+
+    pipeline = Pipeline(build_stages(args), force=args.force, dry_run=args.dry_run)
+    unknown = set(args.force) - set(pipeline.stages)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+    if not pipeline.run():
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,79 +1,63 @@
 import os
-import requests
+import json
+import argparse
 import numpy as np
 import pandas as pd
 from pathlib import Path
-from tqdm import tqdm
-import uuid
+from chunking import chunk_text
+from embed_runner import EMBEDDING_MODEL, EmbeddingJobRunner
+from embedding_store import EmbeddingStore, chunk_id as make_chunk_id
 
 CONTENT_DIR = Path("content_md")
 EMBEDDINGS_DIR = Path("embeddings")
 EMBEDDINGS_DIR.mkdir(exist_ok=True)
+# Written by sidebar_to_content_fetcher.py: files changed since the last build
+MANIFEST_PATH = CONTENT_DIR / ".fetch_manifest.json"
+METADATA_PATH = EMBEDDINGS_DIR / "course_metadata.csv"
+
+parser = argparse.ArgumentParser(description="Chunk and embed the course markdown files")
+parser.add_argument("--changed-only", action="store_true",
+                    help="Re-chunk only files listed in the fetch manifest; reuse the previous metadata for the rest")
+args = parser.parse_args()
 
-EMBEDDING_ENDPOINT = "https://aiproxy.sanand.workers.dev/openai/v1/embeddings"
 # Load API key from environment variable
 AIPIPE_API_KEY = os.environ.get("AIPIPE_API_KEY")
 if not AIPIPE_API_KEY:
     raise ValueError("AIPIPE_API_KEY environment variable not set. Please add it to your .env file.")
 
-# Chunking function
-def chunk_text(text, max_chunk_size=512):
-    if not text:
-        return []
-    sentences = text.split('.')
-    chunks = []
-    current_chunk = []
-    current_size = 0
-    for sentence in sentences:
-        sentence = sentence.strip() + '.'
-        sentence_size = len(sentence.split())
-        if current_size + sentence_size > max_chunk_size:
-            if current_chunk:
-                chunks.append(' '.join(current_chunk))
-                current_chunk = [sentence]
-                current_size = sentence_size
-            else:
-                chunks.append(sentence)
-        else:
-            current_chunk.append(sentence)
-            current_size += sentence_size
-    if current_chunk:
-        chunks.append(' '.join(current_chunk))
-    return chunks
+def create_embeddings_batch(texts, batch_size=32, checkpoint_path=None):
+    runner = EmbeddingJobRunner(api_key=AIPIPE_API_KEY, batch_size=batch_size)
+    return runner.run(texts, checkpoint_path=checkpoint_path)
 
-# Embedding function
-def create_embeddings_batch(texts, batch_size=32):
-    embeddings = []
-    for i in tqdm(range(0, len(texts), batch_size)):
-        batch = texts[i:i + batch_size]
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {AIPIPE_API_KEY}"
-        }
-        data = {
-            "model": "text-embedding-3-small",
-            "input": batch
-        }
-        try:
-            response = requests.post(EMBEDDING_ENDPOINT, headers=headers, json=data)
-            if response.status_code == 200:
-                batch_embeddings = [item['embedding'] for item in response.json()['data']]
-                embeddings.extend(batch_embeddings)
-            else:
-                print(f"Error in batch {i}: {response.text}")
-                embeddings.extend([None] * len(batch))
-        except Exception as e:
-            print(f"Exception in batch {i}: {str(e)}")
-            embeddings.extend([None] * len(batch))
-    return embeddings
+# Previous chunks per file, for files the manifest says are unchanged
+previous_rows = {}
+if args.changed_only:
+    if MANIFEST_PATH.exists() and METADATA_PATH.exists():
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            rebuild = set(json.load(f)["changed"])
+        df_prev = pd.read_csv(METADATA_PATH, keep_default_na=False)
+        for filename, rows in df_prev.groupby("filename", sort=False):
+            if filename not in rebuild:
+                previous_rows[filename] = rows.sort_values("chunk_index").to_dict("records")
+        print(f"Manifest: {len(rebuild)} files to rebuild")
+    else:
+        print("No fetch manifest or previous metadata; rebuilding every file")
 
 # Main processing
 metadata_rows = []
 texts = []
 section_names = []
+chunk_ids = []
 
 for md_file in CONTENT_DIR.glob("*.md"):
     section = md_file.stem
+    if md_file.name in previous_rows:
+        for row in previous_rows[md_file.name]:
+            metadata_rows.append(row)
+            texts.append(row["text"])
+            section_names.append(section)
+            chunk_ids.append(row["chunk_id"])
+        continue
     print(f"Processing: {md_file.name}")
     with open(md_file, "r", encoding="utf-8") as f:
         md_text = f.read()
@@ -86,7 +70,8 @@ for md_file in CONTENT_DIR.glob("*.md"):
     # Construct URL for the section
     url = f"https://tds.s-anand.net/#/{section.replace('_', '-')}"
     for i, chunk in enumerate(chunks):
-        chunk_id = str(uuid.uuid4())
+        # Content-derived id: unchanged chunks keep their id (and stored embedding) across runs
+        chunk_id = make_chunk_id(chunk, md_file.name)
         metadata_rows.append({
             "section": section,
             "chunk_index": i,
@@ -97,20 +82,34 @@ for md_file in CONTENT_DIR.glob("*.md"):
         })
         texts.append(chunk)
         section_names.append(section)
+        chunk_ids.append(chunk_id)
 
-# Generate embeddings
-embeddings = create_embeddings_batch(texts)
+# Generate embeddings: only chunks missing from the store hit the API
+# (and an interrupted run resumes from the checkpoint)
+store = EmbeddingStore(EMBEDDINGS_DIR / "course_embedding_store.sqlite", model=EMBEDDING_MODEL)
+embeddings = store.embed(
+    chunk_ids, texts,
+    lambda missing: create_embeddings_batch(missing, checkpoint_path=EMBEDDINGS_DIR / ".course_embeddings.ckpt.jsonl"),
+)
+removed = store.prune(chunk_ids)
+if removed:
+    print(f"Embedding store: dropped {removed} chunks that no longer exist")
+store.close()
 
-# Save embeddings
-embeddings_array = np.array([e for e in embeddings if e is not None])
+# Save embeddings; the runner returns one vector per text or raises, so rows stay aligned with metadata
+embeddings_array = np.array(embeddings)
 np.save(EMBEDDINGS_DIR / "course_embeddings.npy", embeddings_array)
 
 # Save metadata
 df_meta = pd.DataFrame(metadata_rows)
-df_meta.to_csv(EMBEDDINGS_DIR / "course_metadata.csv", index=False)
+df_meta.to_csv(METADATA_PATH, index=False)
 
 # Save texts
 df_texts = pd.DataFrame({"text": texts, "section": section_names})
 df_texts.to_csv(EMBEDDINGS_DIR / "course_texts.csv", index=False)
 
+# Every change in the manifest is now built in
+if MANIFEST_PATH.exists():
+    MANIFEST_PATH.unlink()
+
 print("Embeddings, metadata, and texts saved in the 'embeddings' folder.") 
@@ -0,0 +1,190 @@
+"""
+Streaming readers/writers for scraped records.
+
+Records are stored as JSONL (one JSON object per line) so producers can
+append as they go and consumers can read them back one at a time. Older
+outputs that are a single JSON array are streamed element by element too,
+so neither format is ever loaded whole.
+
+JsonlAppender lets a long-running producer (the scrapers) append records as
+it goes and resume from a cursor after a crash.
+"""
+import json
+import os
+import time
+from typing import Iterable, Iterator, Optional, Set
+
+READ_CHUNK_SIZE = 1 << 16
+
+def iter_json_array(path: str, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[dict]:
+    """Yield the elements of a top-level JSON array file without loading it whole."""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"{path} is not a JSON array")
+        buffer = buffer[1:]
+        eof = False
+        while True:
+            buffer = buffer.lstrip().lstrip(",").lstrip()
+            if buffer.startswith("]"):
+                return
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                # Element straddles the read boundary: read more and try again
+                if eof:
+                    raise
+                more = f.read(chunk_size)
+                eof = not more
+                buffer += more
+                continue
+            yield item
+            buffer = buffer[end:]
+
+def iter_jsonl(path: str) -> Iterator[dict]:
+    """Yield records from a JSONL file, skipping blank lines and a torn last line."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                if not line.endswith("\n"):
+                    print(f"Ignoring incomplete last line {line_no} of {path}")
+                    return
+                raise
+
+def iter_records(path: str) -> Iterator[dict]:
+    """Stream records from .jsonl, or from a legacy .json array."""
+    if path.endswith(".jsonl"):
+        return iter_jsonl(path)
+    return iter_json_array(path)
+
+def write_jsonl(path: str, records: Iterable[dict]) -> int:
+    """Write records to path atomically (via a temp file); returns how many were written."""
+    tmp_path = f"{path}.tmp"
+    count = 0
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return count
+
+def read_cursor(path: str) -> dict:
+    """The cursor saved at path, or {} if there is none."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def write_cursor(path: str, cursor: dict) -> None:
+    """Replace the cursor file atomically, so a crash leaves the old or the new one."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cursor, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class JsonlAppender:
+    """Append-only JSONL output for long scrapes, with a cursor to resume from.
+
+    Each record is written and flushed as soon as it is appended, and fsync'd
+    every sync_every records or sync_seconds. checkpoint(**cursor) fsyncs the
+    records before replacing the cursor file, so the cursor never points past
+    what is on disk; finish() marks the run complete.
+
+    If the cursor of an unfinished run exists, the file is reopened for
+    appending (a torn last line from a crash is cut off), self.cursor holds
+    the saved position and records whose key was already written are
+    skipped. Otherwise, or with resume=False, the file starts over.
+    """
+
+    def __init__(self, path: str, cursor_path: Optional[str] = None, key: str = "id", resume: bool = True,
+                 sync_every: int = 20, sync_seconds: float = 5.0):
+        self.path = path
+        self.cursor_path = cursor_path or f"{path}.cursor.json"
+        self.key = key
+        self.sync_every = sync_every
+        self.sync_seconds = sync_seconds
+        self.cursor = read_cursor(self.cursor_path) if resume else {}
+        if self.cursor.get("complete"):
+            self.cursor = {}
+        self.keys: Set = set()
+        if self.cursor and os.path.exists(path):
+            self._reopen()
+            self.file = open(path, "a", encoding="utf-8")
+        else:
+            self.cursor = {}
+            self.file = open(path, "w", encoding="utf-8")
+            write_cursor(self.cursor_path, {"complete": False})
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def _reopen(self) -> None:
+        """Collect the keys already written and cut off a torn last line."""
+        end = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    print(f"Dropping incomplete last line of {self.path}")
+                    break
+                end += len(line)
+                if line.strip():
+                    self.keys.add(json.loads(line).get(self.key))
+        with open(self.path, "rb+") as f:
+            f.truncate(end)
+        print(f"Resuming {self.path}: {len(self.keys)} records already written, cursor {self.cursor}")
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, key) -> bool:
+        return key in self.keys
+
+    def append(self, record: dict) -> bool:
+        """Write record unless its key was already written; returns whether it was written."""
+        key = record.get(self.key)
+        if key in self.keys:
+            return False
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+        self.keys.add(key)
+        self.unsynced += 1
+        if self.unsynced >= self.sync_every or time.monotonic() - self.last_sync >= self.sync_seconds:
+            self.sync()
+        return True
+
+    def sync(self) -> None:
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def checkpoint(self, **cursor) -> None:
+        """Make the records durable, then save cursor as the position to resume from."""
+        self.sync()
+        self.cursor = {**cursor, "complete": False}
+        write_cursor(self.cursor_path, self.cursor)
+
+    def finish(self) -> None:
+        """Mark the run complete: the next run starts a fresh file."""
+        self.close()
+        self.cursor = {"complete": True, "records": len(self.keys)}
+        write_cursor(self.cursor_path, self.cursor)
+
+    def close(self) -> None:
+        if not self.file.closed:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
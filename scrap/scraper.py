@@ -2,6 +2,7 @@ import os  #helps with file paths
 import time #helps with waiting for pages to load
 import json #helps with saving data
 from pathlib import Path #more modern way to handle file paths
+from records import JsonlAppender, iter_jsonl #append-only output that survives crashes
 from selenium import webdriver #automates browser interactions to scrape content from websites that rely on JScript
 from selenium.webdriver.common.by import By 
 from selenium.webdriver.support.ui import WebDriverWait #helps with waiting for elements to load
@@ -126,8 +127,16 @@ class TDSScraper:
             print(f"Error getting content for {href}: {e}")
             return ""
 
-    def scrape(self):
-        """Main scraping function"""
+    def scrape(self, restart=False):
+        """Main scraping function.
+
+        Each section is appended to data/tds_course_content.jsonl as soon as it
+        is scraped; if the run dies, running again skips the sections already
+        there (restart=True starts over). tds_course_content.json is built
+        from the JSONL once every section is done.
+        """
+        output = JsonlAppender(str(self.data_dir / "tds_course_content.jsonl"), key="path", resume=not restart)
+        finished = False
         try:
             print(f"Starting scrape of {self.url}")
             self.driver.get(self.url)
@@ -141,43 +150,58 @@ class TDSScraper:
                 print("No sections found")
                 return
             
-            # Process each section and its content
-            course_content = {}
-            section_paths = []
-            
+            # Process each section and its content, appending one record per section
             def scrape_recursive(sections):
                 for section in sections:
                     path_str = " > ".join(section["path"])
-                    print(f"Processing: {path_str}")
-                    section_paths.append(path_str)
-                    content = self.get_section_content(section["href"])
-                    # Store content at full path
-                    d = course_content
-                    for p in section["path"][:-1]:
-                        d = d.setdefault(p, {"subsections": {}})["subsections"]
-                    d[section["path"][-1]] = {
-                        "content": content,
-                        "subsections": {}
-                    }
+                    if path_str in output:
+                        print(f"Already scraped: {path_str}")
+                    else:
+                        print(f"Processing: {path_str}")
+                        content = self.get_section_content(section["href"])
+                        output.append({"path": path_str, "parts": section["path"], "content": content})
+                        output.checkpoint(section=path_str)
                     if section["subsections"]:
                         scrape_recursive(section["subsections"])
             
             scrape_recursive(structure)
-            
-            # Save the data
-            with open(self.data_dir / "tds_course_content.json", "w", encoding="utf-8") as f:
-                json.dump({
-                    "sections": section_paths,
-                    "content": course_content
-                }, f, ensure_ascii=False, indent=4)
-                
-            print("\nScraping completed successfully!")
+            finished = True
             
         except Exception as e:
             print(f"Error during scraping: {e}")
         finally:
             self.driver.quit()
+            output.close()
+        
+        if not finished:
+            print(f"\nScrape stopped after {len(output)} sections; run again to resume")
+            return
+        # Save the data
+        output.finish()
+        self.save_course_content(output.path)
+        print("\nScraping completed successfully!")
+
+    def save_course_content(self, records_path):
+        """Build tds_course_content.json (section list + nested content) from the section records"""
+        course_content = {}
+        section_paths = []
+        for record in iter_jsonl(records_path):
+            section_paths.append(record["path"])
+            # Store content at full path
+            d = course_content
+            for p in record["parts"][:-1]:
+                d = d.setdefault(p, {"subsections": {}})["subsections"]
+            d[record["parts"][-1]] = {
+                "content": record["content"],
+                "subsections": {}
+            }
+        with open(self.data_dir / "tds_course_content.json", "w", encoding="utf-8") as f:
+            json.dump({
+                "sections": section_paths,
+                "content": course_content
+            }, f, ensure_ascii=False, indent=4)
 
 if __name__ == "__main__":
+    import sys
     scraper = TDSScraper()
-    scraper.scrape() 
\ No newline at end of file
+    scraper.scrape(restart="--restart" in sys.argv) 
\ No newline at end of file
@@ -9,12 +9,13 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
-from bs4 import BeautifulSoup
 import requests
 from dotenv import load_dotenv
 from selenium.webdriver.chrome.service import Service
 import getpass
 import re
+from discourse_fetch import DiscourseTopicFetcher, fetch_forum, format_thread_content
+from records import JsonlAppender, iter_records, write_cursor, write_jsonl
 
 class DiscourseForumScraper:
     def __init__(self):
@@ -51,6 +52,15 @@ class DiscourseForumScraper:
         self.start_date = datetime(2025, 1, 1)
         self.end_date = datetime(2025, 4, 14)
         self.posts_data = []
+        self.session = None
+
+    def make_session(self, driver):
+        """One requests session, with the cookies from the Selenium login, reused for every API call"""
+        if self.session is None:
+            self.session = requests.Session()
+            for cookie in driver.get_cookies():
+                self.session.cookies.set(cookie['name'], cookie['value'])
+        return self.session
 
     def setup_driver(self):
         """Initialize and return the Chrome WebDriver"""
@@ -290,11 +300,7 @@ class DiscourseForumScraper:
         try:
             print(f"\nFetching complete thread for topic {topic_id}")
             
-            # Create session with cookies from Selenium
-            session = requests.Session()
-            cookies = driver.get_cookies()
-            for cookie in cookies:
-                session.cookies.set(cookie['name'], cookie['value'])
+            session = self.make_session(driver)
             
             # Get the topic JSON data
             topic_json_url = f"{self.base_url}/t/{topic_id}.json"
@@ -313,32 +319,24 @@ class DiscourseForumScraper:
                 return ""
             
             # Process all posts in the thread
-            thread_content = []
-            for post in posts:
-                username = post.get('username', '')
-                created_at = post.get('created_at', '')
-                content = post.get('cooked', '')  # 'cooked' contains the HTML content
-                
-                # Convert HTML to plain text
-                soup = BeautifulSoup(content, 'html.parser')
-                text_content = soup.get_text(separator='\n', strip=True)
-                
-                post_info = f"""
-Author: {username}
-Date: {created_at}
-Content:
-{text_content}
--------------------"""
-                thread_content.append(post_info)
-            
-            return '\n'.join(thread_content)
+            return format_thread_content(posts)
             
         except Exception as e:
             print(f"Error scraping topic content: {str(e)}")
             return ""
 
-    def scrape_forum(self):
-        """Main method to scrape the forum"""
+    def scrape_forum(self, restart=False):
+        """Main method to scrape the forum.
+
+        Topics are appended to data/tds_posts.jsonl as they are scraped, and the
+        listing page reached is saved to data/tds_posts.cursor.json. If a run
+        dies (crash, expired login), running again resumes from that page and
+        skips topics already in the file; restart=True starts over.
+        """
+        os.makedirs('data', exist_ok=True)
+        output = JsonlAppender(os.path.join('data', 'tds_posts.jsonl'),
+                               cursor_path=os.path.join('data', 'tds_posts.cursor.json'), resume=not restart)
+        finished = False
         try:
             driver = self.setup_driver()
             print("Chrome WebDriver initialized successfully")
@@ -346,14 +344,11 @@ Content:
             if not self.login(driver):
                 raise Exception("Failed to login")
 
-            page = 0  # Discourse API uses 0-based page numbers
+            page = output.cursor.get('page', 0)  # Discourse API uses 0-based page numbers
             has_more_pages = True
             
             # Create a session with cookies from Selenium
-            session = requests.Session()
-            cookies = driver.get_cookies()
-            for cookie in cookies:
-                session.cookies.set(cookie['name'], cookie['value'])
+            session = self.make_session(driver)
             
             while has_more_pages:
                 print(f"\nScraping page {page + 1}...")
@@ -382,6 +377,7 @@ Content:
                     if not topics:
                         print("No more topics found.")
                         has_more_pages = False
+                        finished = True
                         continue
                     
                     print(f"Found {len(topics)} topics on page {page + 1}")
@@ -391,6 +387,9 @@ Content:
                             # Extract post data from JSON
                             created_at = topic.get('created_at')
                             topic_id = topic.get('id')
+                            if topic_id in output:
+                                print(f"Already scraped topic {topic_id}, skipping")
+                                continue
                             
                             if isinstance(created_at, str):
                                 # Parse ISO format date string
@@ -416,9 +415,9 @@ Content:
                             if self.is_post_in_date_range(post_data['date']):
                                 # Get the complete thread content including replies
                                 post_data['thread_content'] = self.scrape_post_content(post_data['url'], driver, topic_id)
-                                self.posts_data.append(post_data)
+                                output.append(post_data)
                                 print(f"Added post: {post_data['title']} by {post_data['author']} on {post_data['date']}")
-                                print(f"Total posts collected: {len(self.posts_data)}")
+                                print(f"Total posts collected: {len(output)}")
                                 
                                 # Add delay to avoid overwhelming the server
                                 time.sleep(1)
@@ -428,6 +427,7 @@ Content:
                             continue
                     
                     page += 1
+                    output.checkpoint(page=page)
                     
                 except requests.exceptions.RequestException as e:
                     print(f"Error making request: {str(e)}")
@@ -442,13 +442,45 @@ Content:
         finally:
             if 'driver' in locals():
                 driver.quit()
-            self.save_data()
+            if finished:
+                output.finish()
+                print(f"\nScraped data saved to {output.path}")
+            else:
+                output.close()
+                print(f"\nScrape interrupted; run again to resume from page {output.cursor.get('page', 0) + 1}")
+            print(f"Total posts collected: {len(output)}")
+
+    def fetch_forum_fast(self, rate=4.0, max_workers=8):
+        """Fetch topics concurrently over the JSON API, skipping topics unchanged since the last run"""
+        output_file = os.path.join('data', 'tds_posts.jsonl')
+        previous = {}
+        if os.path.exists(output_file):
+            previous = {record['id']: record for record in iter_records(output_file)}
+        try:
+            driver = self.setup_driver()
+            if not self.login(driver):
+                raise Exception("Failed to login")
+            session = self.make_session(driver)
+        finally:
+            if 'driver' in locals():
+                driver.quit()
+
+        os.makedirs('data', exist_ok=True)
+        fetcher = DiscourseTopicFetcher(self.base_url, session=session, rate=rate, max_workers=max_workers,
+                                        state_path=os.path.join('data', 'discourse_state.json'))
+        self.posts_data = fetch_forum(fetcher, self.forum_url[len(self.base_url):], previous,
+                                      in_range=self.is_post_in_date_range)
+        self.save_data()
+        # Only remember topic versions once their content is on disk
+        fetcher.save_state()
 
     def save_data(self):
-        """Save scraped data to a JSON file"""
-        output_file = "tds_posts.json"
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(self.posts_data, f, ensure_ascii=False, indent=2)
+        """Save scraped data as JSONL (one post per line) for the streaming embedding pipeline"""
+        os.makedirs('data', exist_ok=True)
+        output_file = os.path.join('data', 'tds_posts.jsonl')
+        write_jsonl(output_file, self.posts_data)
+        # The file is complete now, so an interrupted full scrape must not resume into it
+        write_cursor(os.path.join('data', 'tds_posts.cursor.json'), {'complete': True, 'records': len(self.posts_data)})
         print(f"\nScraped data saved to {output_file}")
         print(f"Total posts collected: {len(self.posts_data)}")
 
@@ -459,11 +491,20 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Scrape TDS Discourse Forum')
     parser.add_argument('--username', help='Discourse forum username')
     parser.add_argument('--password', help='Discourse forum password')
+    parser.add_argument('--fast', action='store_true',
+                        help='Fetch topics concurrently over the JSON API and skip topics unchanged since the last run')
+    parser.add_argument('--rate', type=float, default=4.0, help='Max API requests per second in --fast mode')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent topic downloads in --fast mode')
+    parser.add_argument('--restart', action='store_true',
+                        help='Start a fresh scrape instead of resuming an interrupted one')
     args = parser.parse_args()
     
     try:
         scraper = DiscourseForumScraper()
-        scraper.scrape_forum()
+        if args.fast:
+            scraper.fetch_forum_fast(rate=args.rate, max_workers=args.workers)
+        else:
+            scraper.scrape_forum(restart=args.restart)
     except ValueError as e:
         print(f"Error: {str(e)}")
         print("Please provide credentials either through environment variables (DISCOURSE_USERNAME and DISCOURSE_PASSWORD)")
@@ -1,20 +1,54 @@
+"""
+Download the course markdown files linked from _sidebar.md into content_md/.
+
+Files are fetched concurrently over one pooled requests.Session. The ETag and
+Last-Modified of every file are kept in content_md/.fetch_cache.json and sent
+back as If-None-Match / If-Modified-Since, so files that have not changed cost
+a 304 and are not rewritten. Files that changed, were added or disappeared
+from the sidebar are listed in content_md/.fetch_manifest.json; the manifest
+accumulates across runs until md_to_embeddings.py --changed-only consumes it.
+
+    python sidebar_to_content_fetcher.py
+    python sidebar_to_content_fetcher.py --base-url http://127.0.0.1:8000/   # e.g. python -m http.server
+"""
+import argparse
+import hashlib
+import json
 import os
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
 from pathlib import Path
 import re
 
-# URL to the raw _sidebar.md file in the GitHub repo
-SIDEBAR_MD_URL = "https://raw.githubusercontent.com/sanand0/tools-in-data-science-public/main/_sidebar.md"
-# Base URL for raw markdown files in the repo
+# Base URL for raw markdown files in the repo (the sidebar is _sidebar.md under it)
 RAW_BASE_URL = "https://raw.githubusercontent.com/sanand0/tools-in-data-science-public/main/"
 # Directory to save downloaded markdown files
 CONTENT_DIR = Path("content_md")
-CONTENT_DIR.mkdir(exist_ok=True)
+CACHE_FILE = ".fetch_cache.json"
+MANIFEST_FILE = ".fetch_manifest.json"
+
+def make_session(max_workers=8):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
-def fetch_sidebar_md():
-    resp = requests.get(SIDEBAR_MD_URL)
-    resp.raise_for_status()
-    return resp.text
+def conditional_get(session, url, entry, timeout=30):
+    """GET url, sending the validators from a cache entry; returns the response (304 if unchanged)."""
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    resp = session.get(url, headers=headers, timeout=timeout)
+    if resp.status_code != 304:
+        resp.raise_for_status()
+    return resp
+
+def validators(resp):
+    return {"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}
 
 def extract_links(sidebar_md):
     # Match markdown links: [Title](link)
@@ -22,7 +56,9 @@ def extract_links(sidebar_md):
     links = pattern.findall(sidebar_md)
     return links
 
-def fetch_and_save_content(links):
+def markdown_files(links):
+    """{filename: path in the repo} for the local .md links of the sidebar"""
+    files = {}
     for title, link in links:
         # Ignore external links (http/https)
         if link.startswith("http"): continue
@@ -30,23 +66,107 @@ def fetch_and_save_content(links):
         clean_link = link.lstrip('./').lstrip('/')
         # Only process .md files
         if not clean_link.endswith('.md'): continue
-        url = RAW_BASE_URL + clean_link
-        print(f"Fetching: {title} -> {url}")
-        try:
-            resp = requests.get(url)
-            resp.raise_for_status()
-            # Save content to file named after the markdown file
-            out_path = CONTENT_DIR / os.path.basename(clean_link)
-            with open(out_path, "w", encoding="utf-8") as f:
-                f.write(resp.text)
-        except Exception as e:
-            print(f"Failed to fetch {url}: {e}")
+        files.setdefault(os.path.basename(clean_link), clean_link)
+    return files
+
+def write_atomic(path, text):
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def load_json(path, default):
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return default
+
+class ContentFetcher:
+    def __init__(self, base_url=RAW_BASE_URL, content_dir=CONTENT_DIR, max_workers=8, session=None):
+        self.base_url = base_url if base_url.endswith("/") else base_url + "/"
+        self.content_dir = Path(content_dir)
+        self.content_dir.mkdir(exist_ok=True)
+        self.max_workers = max_workers
+        self.session = session or make_session(max_workers)
+        self.cache_path = self.content_dir / CACHE_FILE
+        self.manifest_path = self.content_dir / MANIFEST_FILE
+        self.cache = load_json(self.cache_path, {})
+
+    def fetch_sidebar(self):
+        """_sidebar.md text; the last copy is kept in the cache so a 304 still gives the links"""
+        entry = self.cache.get("_sidebar.md", {})
+        resp = conditional_get(self.session, self.base_url + "_sidebar.md", entry)
+        if resp.status_code == 304 and "text" in entry:
+            return entry["text"]
+        self.cache["_sidebar.md"] = {**validators(resp), "text": resp.text}
+        return resp.text
+
+    def fetch_file(self, filename, path):
+        """Fetch one file; returns "unchanged", "changed" or "added"."""
+        entry = self.cache.get(filename, {})
+        out_path = self.content_dir / filename
+        if not out_path.exists():
+            entry = {}  # deleted locally: fetch it unconditionally
+        resp = conditional_get(self.session, self.base_url + path, entry)
+        if resp.status_code == 304:
+            return "unchanged"
+        digest = hashlib.sha256(resp.content).hexdigest()
+        status = "unchanged" if digest == entry.get("sha256") else ("changed" if entry else "added")
+        if status != "unchanged":
+            write_atomic(out_path, resp.text)
+        self.cache[filename] = {**validators(resp), "path": path, "sha256": digest}
+        return status
+
+    def run(self):
+        """Fetch every file of the sidebar; returns {status: [filenames]} for this run."""
+        files = markdown_files(extract_links(self.fetch_sidebar()))
+        result = {"added": [], "changed": [], "unchanged": [], "removed": [], "failed": []}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self.fetch_file, name, path): name for name, path in files.items()}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    result[future.result()].append(name)
+                except Exception as e:
+                    print(f"Failed to fetch {self.base_url + files[name]}: {e}")
+                    result["failed"].append(name)
+        # Files this fetcher downloaded before that the sidebar no longer links
+        for name in [n for n in self.cache if n != "_sidebar.md" and n not in files]:
+            del self.cache[name]
+            (self.content_dir / name).unlink(missing_ok=True)
+            result["removed"].append(name)
+        for names in result.values():
+            names.sort()
+        write_atomic(self.cache_path, json.dumps(self.cache, indent=1))
+        self.update_manifest(result)
+        return result
+
+    def update_manifest(self, result):
+        """Merge this run into the pending manifest of files downstream steps have to rebuild."""
+        manifest = load_json(self.manifest_path, {"changed": [], "removed": []})
+        changed = (set(manifest["changed"]) | set(result["added"]) | set(result["changed"])) - set(result["removed"])
+        removed = (set(manifest["removed"]) | set(result["removed"])) - changed
+        manifest = {
+            "updated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "base_url": self.base_url,
+            "changed": sorted(changed),
+            "removed": sorted(removed),
+        }
+        write_atomic(self.manifest_path, json.dumps(manifest, indent=1))
 
 def main():
-    sidebar_md = fetch_sidebar_md()
-    links = extract_links(sidebar_md)
-    fetch_and_save_content(links)
-    print("\nAll content files downloaded to:", CONTENT_DIR.resolve())
+    parser = argparse.ArgumentParser(description="Fetch the course markdown files linked from _sidebar.md")
+    parser.add_argument("--base-url", default=RAW_BASE_URL, help="Where _sidebar.md and the .md files are served")
+    parser.add_argument("--out", default=str(CONTENT_DIR), help="Directory to save the markdown files in")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent downloads")
+    args = parser.parse_args()
+    fetcher = ContentFetcher(args.base_url, args.out, args.workers)
+    result = fetcher.run()
+    print(", ".join(f"{len(names)} {status}" for status, names in result.items()))
+    for status in ("added", "changed", "removed", "failed"):
+        for name in result[status]:
+            print(f"  {status}: {name}")
+    print("\nAll content files downloaded to:", fetcher.content_dir.resolve())
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()